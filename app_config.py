@@ -1,39 +1,191 @@
 import json
 import os
-from langchain.output_parsers import CommaSeparatedListOutputParser
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+import threading
+import httpx
 
-# Load model configuration from JSON file
-def load_model_config():
-    config_path = os.path.join(os.path.dirname(__file__), "model_config.json")
+# Default number of LLM requests a tool may have in flight at once
+DEFAULT_MAX_CONCURRENCY = 4
+# Default in-flight limit for tools on the asyncio engine (no thread per request)
+DEFAULT_MAX_ASYNC_CONCURRENCY = 20
+# Idle pooled connections are kept open this long so consecutive batches skip the TLS handshake
+HTTP_KEEPALIVE_SECONDS = 60
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "model_config.json")
+
+# Load the full configuration dictionary from JSON file
+def load_config():
     try:
-        with open(config_path, 'r') as f:
-            config = json.load(f)
-        return config.get("openai_model", "o1-mini"), config.get("temperature", 1)
+        with open(CONFIG_PATH, 'r') as f:
+            return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         # Fallback to defaults if config file doesn't exist or is invalid
-        return "o1-mini", 1
+        return {}
+
+def save_config(config):
+    """Write the full configuration dictionary back to model_config.json"""
+    global _model_settings
+    with open(CONFIG_PATH, 'w') as f:
+        json.dump(config, f, indent=4)
+    _model_settings = None
+
+# Load model configuration from JSON file
+def load_model_config():
+    config = load_config()
+    return config.get("openai_model", "o1-mini"), config.get("temperature", 1)
+
+def load_max_concurrency():
+    """Number of concurrent LLM requests the batch tools may send"""
+    try:
+        return max(1, int(load_config().get("max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_CONCURRENCY
+
+def load_max_async_concurrency():
+    """Number of concurrent LLM requests the asyncio-based tools may send"""
+    try:
+        return max(1, int(load_config().get("max_async_concurrency", DEFAULT_MAX_ASYNC_CONCURRENCY)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_ASYNC_CONCURRENCY
+
+def http_pool_limits(max_in_flight):
+    """Keep-alive connection pool sized to the configured request concurrency.
+
+    Idle connections are kept for as many requests as the tools send at once.
+    The pool may open up to the rate limiter's ``max_in_flight``, which already
+    caps requests in flight, so no request ever waits for a connection.
+    """
+    keepalive = max(load_max_concurrency(), load_max_async_concurrency())
+    return httpx.Limits(max_connections=max(keepalive, max_in_flight), max_keepalive_connections=keepalive,
+                        keepalive_expiry=HTTP_KEEPALIVE_SECONDS)
 
 # Load current configuration
 current_model, current_temperature = load_model_config()
 
-# Common model configuration - use 'model' parameter for newer LangChain versions
-model = ChatOpenAI(model=current_model, temperature=current_temperature)
+# Chat models, response cache, rate limiter and HTTP clients are created on
+# first use rather than at import, so importing this module (for its config
+# helpers or prompts) doesn't initialise LangChain or the OpenAI client
+_lock = threading.RLock()
+_models = {}
+_shared = {}
+# Backend, model and temperature used by get_model, read once until save_config writes the file
+_model_settings = None
+
+def _shared_clients():
+    """Response cache, rate limiter and keep-alive HTTP clients shared by every model instance"""
+    with _lock:
+        if not _shared:
+            from llm_cache import build_llm_cache
+            from rate_limiter import AsyncRateLimitedTransport, RateLimitedTransport, build_rate_limiter
+            config = load_config()
+            limiter = build_rate_limiter(config)
+            limits = http_pool_limits(limiter.max_in_flight)
+            _shared.update(
+                # Persistent response cache (None when disabled)
+                llm_cache=build_llm_cache(config),
+                # Client-side RPM/TPM limiter shared by every model, including those
+                # built after a configuration change
+                rate_limiter=limiter,
+                http_client=httpx.Client(transport=RateLimitedTransport(limiter, httpx.HTTPTransport(limits=limits))),
+                http_async_client=httpx.AsyncClient(transport=AsyncRateLimitedTransport(limiter, limits=limits)),
+            )
+        return _shared
+
+def get_llm_cache():
+    """The shared response cache, or None when caching is disabled"""
+    return _shared_clients()["llm_cache"]
+
+def build_chat_model(model_name, temperature):
+    """Create a chat model wired to the shared response cache, rate limiter and usage tracker.
+
+    With ``"backend": "fake"`` in model_config.json the deterministic stand-in
+    from fake_llm is returned instead, so pipelines run offline.
+    """
+    from telemetry import call_telemetry, usage_tracker
+    config = load_config()
+    if config.get("backend") == "fake":
+        from fake_llm import FakeChatModel
+        fake_config = config.get("fake_llm", {})
+        return FakeChatModel(
+            latency_seconds=fake_config.get("latency_ms", 0) / 1000,
+            latency_jitter_seconds=fake_config.get("latency_jitter_ms", 0) / 1000,
+            callbacks=[usage_tracker, call_telemetry],
+        )
+    from langchain_openai import ChatOpenAI
+    shared = _shared_clients()
+    return ChatOpenAI(
+        model=model_name,
+        temperature=temperature,
+        cache=shared["llm_cache"],
+        http_client=shared["http_client"],
+        http_async_client=shared["http_async_client"],
+        # Report token usage on streamed responses too
+        stream_usage=True,
+        callbacks=[usage_tracker, call_telemetry],
+    )
+
+def _configured_model_settings():
+    """(backend, model, temperature) from model_config.json, cached until ``save_config`` runs"""
+    global _model_settings
+    settings = _model_settings
+    if settings is None:
+        configured_model, configured_temperature = load_model_config()
+        settings = _model_settings = (load_config().get("backend", "openai"), configured_model,
+                                      configured_temperature)
+    return settings
+
+def get_model(model_name=None, temperature=None):
+    """Shared chat model for ``model_name`` and ``temperature`` (the configured ones by default).
+
+    Built on first use and cached per backend, model and temperature; safe to
+    call from worker threads. The configuration is read once, not per call.
+    """
+    backend, configured_model, configured_temperature = _configured_model_settings()
+    model_name = configured_model if model_name is None else model_name
+    temperature = configured_temperature if temperature is None else temperature
+    key = (backend, model_name, temperature)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = _models[key] = build_chat_model(model_name, temperature)
+    return model
 
 def reinitialize_model():
     """Reinitialize the model with current configuration"""
-    global model, current_model, current_temperature
+    global current_model, current_temperature
     current_model, current_temperature = load_model_config()
-    model = ChatOpenAI(model=current_model, temperature=current_temperature)
-    return model
+    return get_model(current_model, current_temperature)
+
+def get_comma_list_parser():
+    """Output parser for comma-separated list answers"""
+    from langchain.output_parsers import CommaSeparatedListOutputParser
+    return CommaSeparatedListOutputParser()
+
+def __getattr__(name):
+    # Prompts, and module attributes that used to be built at import, are created on first access
+    name = _ALIASES.get(name, name)
+    if name in _PROMPTS:
+        from langchain_core.prompts import PromptTemplate
+        with _lock:
+            if name not in globals():
+                globals()[name] = PromptTemplate(**_PROMPTS[name])
+        return globals()[name]
+    if name == "model":
+        return get_model()
+    if name in ("llm_cache", "rate_limiter", "http_client", "http_async_client"):
+        return _shared_clients()[name]
+    if name in ("comma_list_parser", "output_parser"):
+        return get_comma_list_parser()
+    if name in ("comma_format_instructions", "format_instructions"):
+        return get_comma_list_parser().get_format_instructions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Output parsers
-comma_list_parser = CommaSeparatedListOutputParser()
-comma_format_instructions = comma_list_parser.get_format_instructions()
+# Prompt templates by attribute name; ``app_config.<name>`` builds the PromptTemplate on first access
+_PROMPTS = {}
 
 # PAIN POINT EXTRACTION PROMPT
-pain_point_extraction_prompt = PromptTemplate(
+_PROMPTS["pain_point_extraction_prompt"] = dict(
     template="""You are a senior management consultant (MBA) and organisational psychologist (PhD).
 Extract every distinct pain point from the text and return them as clear, single sentences.
 
@@ -59,7 +211,7 @@ Text to analyse:
 )
 
 # THEME CREATION PROMPT
-theme_creation_prompt = PromptTemplate(
+_PROMPTS["theme_creation_prompt"] = dict(
     template="""You are a management consultant specialising in organisational analysis and strategic planning. \
     I will provide you with a list of extracted pain points from an organisation. \
     Your task is to analyse these pain points and group them into meaningful themes or categories.
@@ -88,7 +240,7 @@ theme_creation_prompt = PromptTemplate(
 )
 
 # CAPABILITY MAPPING PROMPT  
-capability_mapping_prompt = PromptTemplate(
+_PROMPTS["capability_mapping_prompt"] = dict(
     template="""You are a management consultant with expertise in organisational capabilities and business architecture. \
     I will provide you with pain points and/or themes from an organisation. \
     Your task is to map these pain points to the organisational capabilities that need to be developed, improved, or acquired to address them.
@@ -120,7 +272,7 @@ capability_mapping_prompt = PromptTemplate(
 )
 
 # CAPABILITY DESCRIPTION PROMPT
-capability_description_prompt = PromptTemplate(
+_PROMPTS["capability_description_prompt"] = dict(
     template="""
 You are a management consultant and business architect with deep expertise in organisational capabilities.
 Write a single-sentence description for each capability provided.
@@ -148,7 +300,7 @@ Capabilities to describe:
 )
 
 # REVISED PAIN-POINT IMPACT ESTIMATION PROMPT
-pain_point_impact_estimation_prompt = PromptTemplate(
+_PROMPTS["pain_point_impact_estimation_prompt"] = dict(
     template="""
 You are a senior business analyst specialising in enterprise-level impact assessment.
 Evaluate each pain point **only** in terms of its likely effect on:
@@ -171,8 +323,9 @@ Evaluate each pain point **only** in terms of its likely effect on:
 
 If evidence is ambiguous, err toward the lower category.
 
-Respond with **only** the impact level (High, Medium, or Low) for each pain point,
-in the order provided. {context_instruction}
+Respond with **only** a JSON object whose keys are the pain point IDs exactly as given
+and whose values are the impact level (High, Medium, or Low), e.g.
+{{"PP-01": "High", "PP-02": "Low"}}. Include every pain point. {context_instruction}
 
 Pain points to assess:
 {pain_points}
@@ -180,7 +333,5 @@ Pain points to assess:
     input_variables=["context_section", "context_instruction", "pain_points"]
 )
 
-# Legacy exports for backward compatibility
-output_parser = comma_list_parser
-format_instructions = comma_format_instructions
-prompt = pain_point_extraction_prompt
+# Legacy exports for backward compatibility (output_parser and format_instructions via __getattr__)
+_ALIASES = {"prompt": "pain_point_extraction_prompt"}
@@ -0,0 +1,262 @@
+"""Asyncio engine for tools that make many independent LLM calls.
+
+Thread pools need one OS thread per in-flight request. ``run_async_tasks``
+instead runs coroutine workers (built on ``model.ainvoke``) on a single event
+loop, so hundreds of requests can be in flight at once. The loop runs on the
+calling thread: progress and error callbacks therefore execute on the
+Streamlit script thread and may update the page directly, while the workers
+themselves never touch Streamlit.
+
+Slow requests can be hedged: once a worker has run longer than the rolling
+95th percentile latency of its tool, a duplicate is started and whichever
+finishes first is used and the other is cancelled, so no request outlives its
+slot in the concurrency limit. Hedges are capped at a share of the items in
+each run (at least one). How often they fired and won, the latency saved when
+the duplicate won and the duplicates' tokens are added to the tool run's
+telemetry. Settings live in the ``hedging`` section of model_config.json.
+
+With a ``checkpoint`` each completed item is saved as it finishes, so an
+interrupted run resumes with the items still outstanding (see checkpoints.py).
+Items whose model raises ``AnswerPending`` are handled as in batch_executor.py.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+from app_config import load_config, load_max_async_concurrency
+from batch_executor import AnswerPending
+from checkpoints import open_checkpoint
+from run_context import current_tool, hedge_attempt, record_hedging
+
+# Latencies kept per tool for the rolling percentile
+LATENCY_WINDOW = 200
+DEFAULT_HEDGE_PERCENTILE = 0.95
+# Completed calls needed before the percentile is trusted
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+# Duplicate requests allowed per run, as a share of its items
+DEFAULT_HEDGE_MAX_EXTRA_SHARE = 0.1
+# Never hedge a call sooner than this
+DEFAULT_HEDGE_MIN_DELAY_SECONDS = 2.0
+
+# on_progress(completed_items, total_items)
+ProgressCallback = Callable[[int, int], None]
+# on_error(item_index, item, exception) -> replacement result
+ErrorCallback = Callable[[int, Any, Exception], Any]
+
+
+class HedgePolicy:
+    """When to send a duplicate of a slow request"""
+
+    def __init__(self, percentile=DEFAULT_HEDGE_PERCENTILE, min_samples=DEFAULT_HEDGE_MIN_SAMPLES,
+                 max_extra_share=DEFAULT_HEDGE_MAX_EXTRA_SHARE, min_delay_seconds=DEFAULT_HEDGE_MIN_DELAY_SECONDS):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_extra_share = max_extra_share
+        self.min_delay_seconds = min_delay_seconds
+
+
+def load_hedge_policy():
+    """``HedgePolicy`` from the ``hedging`` config section, or None when hedging is disabled"""
+    config = load_config().get("hedging", {})
+    if not config.get("enabled", False):
+        return None
+    try:
+        return HedgePolicy(
+            percentile=min(0.999, max(0.5, float(config.get("percentile", DEFAULT_HEDGE_PERCENTILE)))),
+            min_samples=max(1, int(config.get("min_samples", DEFAULT_HEDGE_MIN_SAMPLES))),
+            max_extra_share=max(0.0, float(config.get("max_extra_share", DEFAULT_HEDGE_MAX_EXTRA_SHARE))),
+            min_delay_seconds=max(0.0, float(config.get("min_delay_seconds", DEFAULT_HEDGE_MIN_DELAY_SECONDS))),
+        )
+    except (TypeError, ValueError):
+        return HedgePolicy()
+
+
+class LatencyWindow:
+    """Latencies of a tool's most recent calls"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, share, min_samples):
+        """Latency below which ``share`` of calls finished, or None with fewer than ``min_samples``"""
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(share * len(ordered)) - 1)]
+
+
+_latency_windows = {}
+_latency_windows_lock = threading.Lock()
+
+
+def latency_window(tool):
+    """Shared ``LatencyWindow`` for ``tool``, kept across runs"""
+    with _latency_windows_lock:
+        return _latency_windows.setdefault(tool, LatencyWindow())
+
+
+class HedgeStats:
+    """Hedging counters for one run"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.fired = 0
+        self.won = 0
+        self.saved_seconds = 0.0
+
+
+def run_async_tasks(
+    items: Sequence[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    max_concurrency: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    on_error: Optional[ErrorCallback] = None,
+    hedging: Optional[bool] = None,
+    checkpoint: Optional[str] = None,
+) -> List[Any]:
+    """Await ``worker(item)`` for every item with at most ``max_concurrency`` in flight.
+
+    Blocks until all items are done and returns one result per item, in the
+    same order as ``items``. When a worker raises, the value returned by
+    ``on_error`` is used as its result; without ``on_error`` the exception is
+    re-raised after the remaining work is cancelled.
+
+    With hedging on (``hedging=None`` follows model_config.json) a worker
+    running past its tool's rolling latency percentile is started a second
+    time and the first result wins, so ``worker`` must be safe to repeat.
+
+    ``checkpoint`` is a settings fingerprint (``checkpoints.job_settings``):
+    items that succeeded in an earlier run with the same settings and items
+    are reused instead of being sent again.
+    """
+    if not items:
+        return []
+    if max_concurrency is None:
+        max_concurrency = load_max_async_concurrency()
+    policy = load_hedge_policy() if hedging is not False else None
+    if hedging and policy is None:
+        policy = HedgePolicy()
+    store = open_checkpoint(checkpoint, items)
+    return asyncio.run(_run_all(items, worker, max(1, int(max_concurrency)), on_progress, on_error, policy, store))
+
+
+async def _timed(worker, item, window):
+    """``worker(item)``, recording its latency when it succeeds"""
+    started = time.perf_counter()
+    result = await worker(item)
+    window.add(time.perf_counter() - started)
+    return result
+
+
+async def _duplicate(worker, item, window):
+    """``_timed`` for a hedged duplicate, whose calls telemetry counts as extra tokens"""
+    with hedge_attempt():
+        return await _timed(worker, item, window)
+
+
+async def _hedged(worker, item, policy, window, stats):
+    """``worker(item)``, started again if it outlives the tool's latency percentile"""
+    primary_started = time.perf_counter()
+    primary = asyncio.ensure_future(_timed(worker, item, window))
+    delay = window.percentile(policy.percentile, policy.min_samples)
+    if delay is None or stats.fired >= stats.budget:
+        return await primary
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=max(delay, policy.min_delay_seconds))
+        if done or stats.fired >= stats.budget:
+            return await primary
+
+        stats.fired += 1
+        hedge_started = time.perf_counter()
+        hedge = asyncio.ensure_future(_duplicate(worker, item, window))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if not task.cancelled() and task.exception() is None), None)
+            if winner is None:
+                continue
+            if winner is hedge and primary in pending:
+                stats.won += 1
+                # The original had run this much longer than the duplicate took
+                now = time.perf_counter()
+                stats.saved_seconds += (now - primary_started) - (now - hedge_started)
+            return winner.result()
+        # Both attempts failed: report the original request's error
+        return primary.result()
+    finally:
+        # The loser is cancelled rather than left running outside the concurrency limit
+        for task in pending:
+            task.cancel()
+
+
+async def _run_all(items, worker, max_concurrency, on_progress, on_error, policy=None, store=None):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    total = len(items)
+    results: List[Any] = [None] * total
+    saved = store.load() if store is not None else {}
+    for index, result in saved.items():
+        results[index] = result
+    window = latency_window(current_tool())
+    budget = 0
+    if policy is not None and policy.max_extra_share > 0:
+        # Small runs still get one hedge, or they could never hedge at all
+        budget = max(1, math.ceil(total * policy.max_extra_share))
+    stats = HedgeStats(budget)
+
+    async def run_one(index):
+        async with semaphore:
+            try:
+                if policy is None:
+                    return index, await _timed(worker, items[index], window), None
+                return index, await _hedged(worker, items[index], policy, window, stats), None
+            except Exception as e:
+                return index, None, e
+
+    tasks = [asyncio.create_task(run_one(index)) for index in range(total) if index not in saved]
+    completed = len(saved)
+    if completed and on_progress is not None:
+        on_progress(completed, total)
+    failed = False
+    answer_pending = None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result, error = await next_done
+            if isinstance(error, AnswerPending):
+                # Left unanswered until the next round; the other items still run
+                answer_pending = error
+                failed = True
+            elif error is not None:
+                if on_error is None:
+                    raise error
+                result = on_error(index, items[index], error)
+                failed = True
+            elif store is not None:
+                store.save(index, result)
+            results[index] = result
+
+            completed += 1
+            if on_progress is not None:
+                on_progress(completed, total)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if stats.fired:
+            record_hedging(stats.fired, stats.won, stats.saved_seconds)
+
+    if answer_pending is not None:
+        raise answer_pending
+    # Items with errors keep the file so a rerun tries them again
+    if store is not None and not failed:
+        store.complete()
+    return results
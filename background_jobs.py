@@ -0,0 +1,285 @@
+"""Background jobs that keep running across Streamlit script reruns.
+
+A page that runs a long tool inline loses the run as soon as the user clicks a
+breadcrumb or touches a widget, because Streamlit stops the script to rerun
+it. Pages instead ``submit`` the work to ``job_manager``, keep the returned
+job ID in session state and poll the job's progress and result on later
+reruns. Jobs run on a process-wide pool of ``max_jobs`` worker threads from
+the ``background_jobs`` section of model_config.json; further jobs queue, and
+every job's model calls share the same rate limiter.
+
+``track_job``, ``render_job_outcome`` and ``render_jobs_strip`` are the
+Streamlit side: the page's own progress panel and outcome, and a strip above
+every page listing the session's jobs so they can be followed from any tool.
+Every long batch tool page runs this way.
+
+Each job runs inside its own ``tool_run``, kept on the job as ``job.run``, so
+its calls are recorded under the submitting tool and a workbook built from
+``job.run`` gets the Run Metrics sheet for that invocation.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from run_context import tool_run
+
+DEFAULT_MAX_JOBS = 2
+# Seconds between status refreshes while a session has jobs in progress
+JOB_POLL_SECONDS = 2
+# Finished jobs kept for pages to collect; older ones are forgotten
+MAX_FINISHED_JOBS = 20
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's progress callback once the job has been cancelled"""
+
+
+def load_max_jobs():
+    """Number of background jobs that may run at once"""
+    # Imported on first submit so the page strip doesn't load the model stack at startup
+    from app_config import load_config
+    try:
+        return max(1, int(load_config().get("background_jobs", {}).get("max_jobs", DEFAULT_MAX_JOBS)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_JOBS
+
+
+class Job:
+    """Status, progress and result of one submitted run"""
+
+    def __init__(self, tool, title, unit="batches"):
+        self.id = uuid.uuid4().hex[:12]
+        self.tool = tool
+        self.title = title
+        # What ``completed`` and ``total`` count, for the progress text
+        self.unit = unit
+        self.status = QUEUED
+        self.completed = 0
+        self.total = 0
+        self.result = None
+        # The job's ToolRun, set once it starts
+        self.run = None
+        self.error = None
+        self.messages = []
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def progress(self, completed, total):
+        """``on_progress`` callback for the pipelines; stops the run once the job is cancelled"""
+        with self._lock:
+            self.completed = completed
+            self.total = total
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def report(self, message):
+        """Keep a warning (such as a failed batch) to show with the result"""
+        with self._lock:
+            self.messages.append(message)
+
+    def cancel(self):
+        """Ask the job to stop at its next progress update; a queued job never starts"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished_state(self):
+        return self.status in FINISHED_STATES
+
+    @property
+    def fraction(self):
+        if self.status == DONE:
+            return 1.0
+        return self.completed / self.total if self.total else 0.0
+
+    @property
+    def elapsed(self):
+        """Seconds the job has been running, or ran for"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def snapshot_messages(self):
+        with self._lock:
+            return list(self.messages)
+
+
+class JobManager:
+    """Registry of background jobs and the worker pool that runs them"""
+
+    def __init__(self, max_jobs=None):
+        self.max_jobs = max_jobs
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, tool, title, fn, *args, unit="batches", **kwargs):
+        """Queue ``fn(job, *args, **kwargs)`` and return its ``Job``; the job's result is what ``fn`` returns"""
+        job = Job(tool, title, unit)
+        with self._lock:
+            if self._executor is None:
+                self.max_jobs = self.max_jobs or load_max_jobs()
+                self._executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="background-job")
+            self._jobs[job.id] = job
+            self._forget_old()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            job.status = CANCELLED
+            job.finished = time.time()
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            with tool_run(job.tool) as run:
+                job.run = run
+                job.result = fn(job, *args, **kwargs)
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, job_ids=None):
+        """Jobs with the given IDs (or all of them), newest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job_ids is None or job.id in job_ids]
+        return sorted(jobs, key=lambda job: job.submitted, reverse=True)
+
+    def _forget_old(self):
+        finished = sorted((job for job in self._jobs.values() if job.finished_state), key=lambda job: job.submitted)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+
+job_manager = JobManager()
+
+
+SESSION_JOBS_KEY = "background_job_ids"
+
+
+def track_job(key, job):
+    """Remember ``job`` in the session under ``key`` and in the session's job list"""
+    st.session_state[key] = job.id
+    st.session_state.setdefault(SESSION_JOBS_KEY, []).append(job.id)
+
+
+def tracked_job(key):
+    """The session's job stored under ``key``, or None"""
+    job_id = st.session_state.get(key)
+    return job_manager.get(job_id) if job_id else None
+
+
+def _progress_text(job):
+    if job.status == QUEUED:
+        return "⏳ Waiting for a free job slot..."
+    if not job.total:
+        return f"🔄 Starting... ({job.elapsed:.0f}s)"
+    return f"🔄 Processed {job.completed} of {job.total} {job.unit} ({job.elapsed:.0f}s)"
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _job_progress(job_id):
+    job = job_manager.get(job_id)
+    if job is None or job.finished_state:
+        # Rerun the whole page so it shows the result
+        st.rerun()
+    st.progress(job.fraction)
+    st.text(_progress_text(job))
+    if st.button("Cancel", key=f"cancel_job_{job_id}", disabled=job.cancelled):
+        job.cancel()
+
+
+def render_job_status(job):
+    """Progress panel for ``job`` while it runs; True once it has finished"""
+    if job.finished_state:
+        return True
+    st.info("This run continues in the background. You can use other tools and come back for the results.")
+    _job_progress(job.id)
+    return False
+
+
+def render_job_outcome(job, label):
+    """Progress panel for ``job``, then its reported errors and any failure; True once it has a result"""
+    if not render_job_status(job):
+        return False
+    for message in job.snapshot_messages():
+        st.error(message)
+    if job.status == FAILED:
+        st.error(f"❌ {label} failed: {job.error}")
+        return False
+    if job.status == CANCELLED:
+        st.warning(f"⏹️ {label} was cancelled. Start it again with the same inputs to resume from the finished "
+                   f"{job.unit}.")
+        return False
+    return True
+
+
+def _session_jobs():
+    return job_manager.jobs(st.session_state.get(SESSION_JOBS_KEY, []))
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _active_jobs_strip():
+    jobs = _session_jobs()
+    if not any(not job.finished_state for job in jobs):
+        # Last job finished; redraw without polling
+        st.rerun()
+    _jobs_strip(jobs)
+
+
+def _jobs_strip(jobs):
+    for job in jobs:
+        if job.finished_state and job.tool == st.session_state.get("page"):
+            continue  # The page itself shows the result
+        label = f"{job.tool}: {job.title}"
+        if job.status == DONE:
+            text = f"✅ {label} finished"
+        elif job.status == FAILED:
+            text = f"❌ {label} failed"
+        elif job.status == CANCELLED:
+            text = f"⏹️ {label} cancelled"
+        else:
+            text = f"{_progress_text(job)} {label}"
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.caption(text)
+        with col2:
+            if job.tool != st.session_state.get("page") \
+                    and st.button("Open", key=f"open_job_{job.id}", use_container_width=True):
+                st.session_state.page = job.tool
+                st.rerun(scope="app")
+
+
+def render_jobs_strip():
+    """Status of the session's background jobs, refreshed while any are running"""
+    jobs = _session_jobs()
+    if any(not job.finished_state for job in jobs):
+        _active_jobs_strip()
+    elif jobs:
+        _jobs_strip(jobs)
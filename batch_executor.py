@@ -0,0 +1,171 @@
+"""Concurrent execution of batched LLM calls.
+
+The batch tools split their input into batches and send each batch to the
+model. ``run_batches`` keeps several of those requests in flight at once on a
+thread pool, returns the results in input order and reports progress from the
+calling thread, so Streamlit elements can be updated safely from the callbacks.
+
+A failing batch can be retried with exponential backoff and then split in
+half recursively, so one malformed or overlong row costs only itself rather
+than the results of the whole batch.
+
+With a ``checkpoint`` each completed batch is saved as it finishes, so a run
+that is interrupted resumes from the batches still outstanding (see
+checkpoints.py).
+
+A batch whose model raises ``AnswerPending`` is left unanswered: it is not
+retried, split or passed to ``on_error``, and the run raises ``AnswerPending``
+once every other batch has finished, so all of a round's prompts are queued.
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, List, Optional, Sequence
+
+from app_config import load_max_concurrency
+from checkpoints import open_checkpoint
+from run_context import batch_rows
+
+# Retries of a failing batch before it is split, and the delay before the first retry
+DEFAULT_BATCH_RETRIES = 2
+DEFAULT_RETRY_BACKOFF_SECONDS = 1.0
+
+# on_progress(completed_batches, total_batches)
+ProgressCallback = Callable[[int, int], None]
+# on_error(batch_index, batch, exception) -> replacement result
+ErrorCallback = Callable[[int, Any, Exception], Any]
+# combine([result, ...]) -> one result for the pieces of a split batch, in order
+CombineCallback = Callable[[List[Any]], Any]
+
+
+class AnswerPending(Exception):
+    """Raised by a model that has queued a prompt to be answered later, such as a Batch API job round"""
+
+
+def split_batches(df, batch_size: int) -> list:
+    """Split a DataFrame into consecutive row slices of at most ``batch_size`` rows"""
+    batch_size = max(int(batch_size), 1)
+    return [df.iloc[start:start + batch_size] for start in range(0, len(df), batch_size)]
+
+
+def concat_results(results: List[list]) -> list:
+    """``combine`` for batches whose result is a list of rows"""
+    return [row for result in results for row in result]
+
+
+def _process_with_recovery(batch, process_batch, retries, backoff_seconds, split):
+    """Pieces of ``batch`` in order, each as (piece, result, exception)"""
+    for attempt in range(retries + 1):
+        try:
+            with batch_rows(len(batch)):
+                return [(batch, process_batch(batch), None)]
+        except AnswerPending as e:
+            return [(batch, None, e)]
+        except Exception as e:
+            error = e
+            if attempt < retries:
+                time.sleep(backoff_seconds * 2 ** attempt)
+    if not split or len(batch) <= 1:
+        return [(batch, None, error)]
+    # Halves are split straight away; retrying every level would multiply the delays
+    middle = len(batch) // 2
+    rows = batch.iloc if hasattr(batch, "iloc") else batch
+    return (_process_with_recovery(rows[:middle], process_batch, 0, backoff_seconds, split)
+            + _process_with_recovery(rows[middle:], process_batch, 0, backoff_seconds, split))
+
+
+def run_batches(
+    batches: Sequence[Any],
+    process_batch: Callable[[Any], Any],
+    max_workers: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    on_error: Optional[ErrorCallback] = None,
+    combine: Optional[CombineCallback] = None,
+    retries: int = 0,
+    retry_backoff_seconds: float = DEFAULT_RETRY_BACKOFF_SECONDS,
+    checkpoint: Optional[str] = None,
+) -> List[Any]:
+    """Run ``process_batch`` over ``batches`` concurrently.
+
+    ``process_batch`` runs on worker threads and must not call Streamlit.
+    ``on_progress`` and ``on_error`` are always called on the calling thread.
+    When a batch raises, the value returned by ``on_error`` is used as its
+    result; without ``on_error`` the exception is re-raised.
+
+    A failing batch is retried ``retries`` times, waiting ``retry_backoff_seconds``
+    and doubling. With ``combine`` it is then split in half recursively: the
+    pieces that still fail (down to single rows) each go to ``on_error``, and
+    ``combine`` merges the results of all pieces of the batch.
+
+    ``checkpoint`` is a settings fingerprint (``checkpoints.job_settings``):
+    batches that succeeded in an earlier run with the same settings and
+    batches are reused instead of being sent again.
+
+    Returns one result per batch, in the same order as ``batches``.
+    """
+    total = len(batches)
+    results: List[Any] = [None] * total
+    if total == 0:
+        return results
+
+    store = open_checkpoint(checkpoint, batches)
+    saved = store.load() if store is not None else {}
+    for index, result in saved.items():
+        results[index] = result
+    pending = [index for index in range(total) if index not in saved]
+    completed = total - len(pending)
+    if completed and on_progress is not None:
+        on_progress(completed, total)
+    if not pending:
+        store.complete()
+        return results
+
+    if max_workers is None:
+        max_workers = load_max_concurrency()
+    max_workers = max(1, min(int(max_workers), len(pending)))
+
+    failed = False
+    answer_pending = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Worker threads start with an empty context; copy the caller's so calls
+        # are attributed to the running tool
+        future_to_index = {
+            executor.submit(contextvars.copy_context().run, _process_with_recovery, batches[index], process_batch,
+                            retries, retry_backoff_seconds, combine is not None): index
+            for index in pending
+        }
+        try:
+            for future in as_completed(future_to_index):
+                index = future_to_index[future]
+                piece_results = []
+                batch_failed = False
+                for piece, result, error in future.result():
+                    if isinstance(error, AnswerPending):
+                        answer_pending = error
+                        batch_failed = True
+                    elif error is not None:
+                        if on_error is None:
+                            raise error
+                        result = on_error(index, piece, error)
+                        batch_failed = True
+                    piece_results.append(result)
+                results[index] = piece_results[0] if len(piece_results) == 1 else combine(piece_results)
+                # Batches with failed rows are left out so a rerun tries them again
+                if store is not None and not batch_failed:
+                    store.save(index, results[index])
+                failed = failed or batch_failed
+
+                completed += 1
+                if on_progress is not None:
+                    on_progress(completed, total)
+        except BaseException:
+            # Don't start batches that are still queued if the run is aborted
+            for future in future_to_index:
+                future.cancel()
+            raise
+
+    if answer_pending is not None:
+        raise answer_pending
+    if store is not None and not failed:
+        store.complete()
+    return results
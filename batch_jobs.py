@@ -0,0 +1,375 @@
+"""Offline bulk jobs through the provider's asynchronous Batch API.
+
+A batch job runs a pipeline in rounds against ``BatchReplayModel``, which
+answers the prompts the Batch API has already completed and records the rest,
+raising ``AnswerPending`` so the pipeline doesn't treat them as empty answers
+and send follow-ups for them. The recorded prompts are written to a JSONL
+request file, submitted and polled until the batch is done, and their answers
+feed the next round. When a round records no new prompts the pipeline's output
+is final; follow-up requests, such as re-queries for rows missing from a real
+answer, simply take another round.
+
+Job files live under ``.cache/batch_jobs/<job name>``, so rerunning an
+interrupted job resumes polling its open batch instead of resubmitting. The
+usage of every request in the output files is recorded by call telemetry and
+kept with the job, so the run's Run Metrics cover the whole job.
+``LocalBatchClient`` is a file-based stand-in for the provider that answers
+with the fake model, so the whole flow runs offline.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from app_config import load_config
+from batch_executor import AnswerPending
+from fake_llm import fake_response
+from llm_cache import CACHE_DIR
+from telemetry import call_telemetry, estimate_cost, usage_tracker
+
+BATCH_JOBS_DIR = os.path.join(CACHE_DIR, "batch_jobs")
+LOCAL_BATCH_DIR = os.path.join(CACHE_DIR, "batch_local")
+BATCH_ENDPOINT = "/v1/chat/completions"
+DEFAULT_POLL_SECONDS = 60
+# Rounds of submissions per job: the first pass plus follow-up requests
+DEFAULT_MAX_ROUNDS = 4
+# Provider discount on Batch API requests against the synchronous price
+BATCH_PRICE_SHARE = 0.5
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+# Batch states after which polling stops without output
+_FAILED_STATES = ("failed", "expired", "cancelled", "cancelling")
+
+
+def message_dicts(messages: List[BaseMessage]) -> List[dict]:
+    """Chat messages in the provider's request format"""
+    return [{"role": _ROLES.get(message.type, "user"), "content": str(message.content)} for message in messages]
+
+
+def request_key(messages: List[dict]) -> str:
+    """Stable custom ID for one request, derived from its messages"""
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_batch_api_config() -> dict:
+    """Backend, polling interval and round limit from the ``batch_api`` config section"""
+    config = load_config().get("batch_api", {})
+    try:
+        return {
+            "backend": config.get("backend", "openai"),
+            "poll_seconds": max(1.0, float(config.get("poll_seconds", DEFAULT_POLL_SECONDS))),
+            "max_rounds": max(1, int(config.get("max_rounds", DEFAULT_MAX_ROUNDS))),
+        }
+    except (TypeError, ValueError):
+        return {"backend": "openai", "poll_seconds": DEFAULT_POLL_SECONDS, "max_rounds": DEFAULT_MAX_ROUNDS}
+
+
+class BatchReplayModel(BaseChatModel):
+    """Answers prompts from completed batch results and records the ones still unanswered.
+
+    An unanswered prompt raises ``AnswerPending``, or with ``final`` gets an
+    empty answer so the pipeline falls back as it would for an unusable one.
+    """
+
+    model_name: str = "gpt-4o-mini"
+    final: bool = False
+
+    _answers: Dict[str, str] = PrivateAttr(default_factory=dict)
+    _pending: Dict[str, List[dict]] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, answers: Optional[Dict[str, str]] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._answers = dict(answers or {})
+
+    @property
+    def _llm_type(self) -> str:
+        return "batch-replay"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        request = message_dicts(messages)
+        key = request_key(request)
+        answer = self._answers.get(key)
+        if answer is None:
+            with self._lock:
+                self._pending.setdefault(key, request)
+            if not self.final:
+                raise AnswerPending(key)
+            answer = ""
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    def pending_requests(self) -> Dict[str, List[dict]]:
+        """Messages of every prompt asked this round without a batch answer, by custom ID"""
+        with self._lock:
+            return dict(self._pending)
+
+
+def write_request_file(path, requests: Dict[str, List[dict]], model_name, temperature):
+    """Write one Batch API request line per prompt"""
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, messages in requests.items():
+            f.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {"model": model_name, "temperature": temperature, "messages": messages},
+            }) + "\n")
+
+
+def _output_records(text):
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _request_error(record) -> Optional[str]:
+    """Why one request of a Batch API output file failed, or None if it succeeded"""
+    error = record.get("error")
+    if error:
+        return f"{error.get('code')}: {error.get('message')}" if isinstance(error, dict) else str(error)
+    response = record.get("response") or {}
+    if response.get("status_code") != 200:
+        message = ((response.get("body") or {}).get("error") or {}).get("message")
+        return f"HTTP {response.get('status_code')}: {message}" if message else f"HTTP {response.get('status_code')}"
+    return None
+
+
+def parse_batch_output(text) -> Dict[str, str]:
+    """Answer text of each successful request in a Batch API output file, by custom ID"""
+    answers = {}
+    for record in _output_records(text):
+        if _request_error(record):
+            continue  # Failed requests are asked again in the next round
+        choices = (record.get("response") or {}).get("body", {}).get("choices") or []
+        if choices:
+            answers[record["custom_id"]] = choices[0].get("message", {}).get("content") or ""
+    return answers
+
+
+def parse_batch_usage(text, model_name, latency_seconds) -> List[dict]:
+    """Model, tokens, cost and error of each request in a Batch API output file.
+
+    ``latency_seconds`` is the time from submitting the batch to its output,
+    which every request in the batch waited.
+    """
+    calls = []
+    for record in _output_records(text):
+        body = (record.get("response") or {}).get("body") or {}
+        usage = body.get("usage") or {}
+        details = usage.get("prompt_tokens_details") or {}
+        tokens = {
+            "calls": 1,
+            "input_tokens": int(usage.get("prompt_tokens") or 0),
+            "cached_tokens": int(details.get("cached_tokens") or 0),
+            "output_tokens": int(usage.get("completion_tokens") or 0),
+        }
+        model = body.get("model") or model_name
+        error = _request_error(record)
+        cost = None if error else estimate_cost(model, tokens)
+        calls.append(dict(tokens, model=model, latency_seconds=latency_seconds, error=error,
+                          cost_usd=None if cost is None else cost * BATCH_PRICE_SHARE))
+    return calls
+
+
+def record_batch_call(call, append=True):
+    """Record one Batch API request with call telemetry and the current tool run.
+
+    ``append=False`` is for requests answered by an earlier invocation of the
+    job, which are already in the telemetry file and the earlier process's totals.
+    """
+    if append:
+        usage_tracker.record(call)
+    call_telemetry.record_completed(call["model"], call, call["latency_seconds"], call["cost_usd"],
+                                    error=call["error"], append=append)
+
+
+class OpenAIBatchClient:
+    """Submits request files to the OpenAI Batch API"""
+
+    def __init__(self):
+        from openai import OpenAI
+        self.client = OpenAI()
+
+    def submit(self, request_path) -> str:
+        with open(request_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window="24h")
+        return batch.id
+
+    def poll(self, batch_id):
+        """(status, output file text once completed)"""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            return batch.status, None
+        if not batch.output_file_id:
+            return batch.status, ""
+        return batch.status, self.client.files.content(batch.output_file_id).text
+
+
+class LocalBatchClient:
+    """File-based stand-in for the Batch API that answers with the fake model"""
+
+    def __init__(self, directory=LOCAL_BATCH_DIR):
+        self.directory = directory
+
+    def submit(self, request_path) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(request_path, "rb") as f:
+            content = f.read()
+        batch_id = f"local-{hashlib.sha256(content).hexdigest()[:16]}"
+        with open(os.path.join(self.directory, f"{batch_id}.input.jsonl"), "wb") as f:
+            f.write(content)
+        return batch_id
+
+    def poll(self, batch_id):
+        output_path = os.path.join(self.directory, f"{batch_id}.output.jsonl")
+        if not os.path.exists(output_path):
+            lines = []
+            with open(os.path.join(self.directory, f"{batch_id}.input.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    request = json.loads(line)
+                    prompt = "\n".join(message["content"] for message in request["body"]["messages"])
+                    content = fake_response(prompt)
+                    # Rough token counts, as the fake model reports them
+                    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                             "total_tokens": len(prompt) // 4 + len(content) // 4}
+                    lines.append(json.dumps({
+                        "id": f"{batch_id}-{len(lines)}",
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 200,
+                                     "body": {"model": request["body"]["model"], "usage": usage,
+                                              "choices": [{"message": {"role": "assistant",
+                                                                       "content": content}}]}},
+                        "error": None,
+                    }))
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        with open(output_path, encoding="utf-8") as f:
+            return "completed", f.read()
+
+
+def batch_client(backend):
+    if backend == "local":
+        return LocalBatchClient()
+    if backend == "openai":
+        return OpenAIBatchClient()
+    raise ValueError(f"Unknown batch backend: {backend}")
+
+
+class BatchJob:
+    """State of one named job on disk: collected answers, request usage and the batch in progress"""
+
+    def __init__(self, name, directory=BATCH_JOBS_DIR):
+        self.directory = os.path.join(directory, name)
+        self.answers_path = os.path.join(self.directory, "answers.jsonl")
+        self.calls_path = os.path.join(self.directory, "calls.jsonl")
+        self.state_path = os.path.join(self.directory, "state.json")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load_answers(self) -> Dict[str, str]:
+        answers = {}
+        if os.path.exists(self.answers_path):
+            with open(self.answers_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        answers[record["custom_id"]] = record["content"]
+        return answers
+
+    def add_answers(self, answers: Dict[str, str]):
+        with open(self.answers_path, "a", encoding="utf-8") as f:
+            for custom_id, content in answers.items():
+                f.write(json.dumps({"custom_id": custom_id, "content": content}) + "\n")
+
+    def load_calls(self) -> List[dict]:
+        if not os.path.exists(self.calls_path):
+            return []
+        with open(self.calls_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def add_calls(self, calls: List[dict]):
+        with open(self.calls_path, "a", encoding="utf-8") as f:
+            for call in calls:
+                f.write(json.dumps(call) + "\n")
+
+    def load_state(self) -> dict:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"rounds": []}
+
+    def save_state(self, state):
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(temp_path, self.state_path)
+
+
+def run_batch_job(name, run_pipeline, client, model_name, temperature,
+                  poll_seconds=DEFAULT_POLL_SECONDS, max_rounds=DEFAULT_MAX_ROUNDS, on_status=None,
+                  directory=BATCH_JOBS_DIR):
+    """Run ``run_pipeline(model)`` to completion through the Batch API and return its result.
+
+    ``client`` is an ``OpenAIBatchClient`` or ``LocalBatchClient``; ``on_status``
+    receives progress messages. Prompts still unanswered after ``max_rounds``
+    submissions keep the pipeline's usual fallbacks.
+    """
+    report = on_status or (lambda message: None)
+    job = BatchJob(name, directory)
+    state = job.load_state()
+    answers = job.load_answers()
+    for call in job.load_calls():
+        record_batch_call(call, append=False)
+
+    for round_number in range(max_rounds + 1):
+        model = BatchReplayModel(answers=answers, model_name=model_name, final=round_number == max_rounds)
+        try:
+            result = run_pipeline(model)
+        except AnswerPending:
+            result = None
+        pending = model.pending_requests()
+        if not pending:
+            return result
+        if round_number == max_rounds:
+            report(f"{len(pending)} requests still unanswered after {max_rounds} rounds; using fallbacks")
+            return result
+
+        open_batch = state.get("open_batch")
+        if open_batch is None:
+            request_path = os.path.join(job.directory, f"requests_{len(state['rounds']) + 1}.jsonl")
+            write_request_file(request_path, pending, model_name, temperature)
+            open_batch = {"id": client.submit(request_path), "requests": len(pending), "submitted": time.time()}
+            state["open_batch"] = open_batch
+            job.save_state(state)
+            report(f"Submitted batch {open_batch['id']} with {len(pending)} requests")
+        else:
+            report(f"Resuming batch {open_batch['id']}")
+
+        while True:
+            status, output = client.poll(open_batch["id"])
+            if output is not None:
+                break
+            if status in _FAILED_STATES:
+                raise RuntimeError(f"Batch {open_batch['id']} ended with status '{status}'")
+            report(f"Batch {open_batch['id']} is {status}; checking again in {poll_seconds:.0f}s")
+            time.sleep(poll_seconds)
+
+        completed = parse_batch_output(output)
+        calls = parse_batch_usage(output, model_name, time.time() - open_batch.get("submitted", time.time()))
+        job.add_calls(calls)
+        for call in calls:
+            record_batch_call(call)
+        job.add_answers(completed)
+        answers.update(completed)
+        state["rounds"].append(dict(open_batch, answered=len(completed)))
+        state["open_batch"] = None
+        job.save_state(state)
+        report(f"Batch {open_batch['id']} completed: {len(completed)} of {open_batch['requests']} answered")
@@ -0,0 +1,301 @@
+"""Benchmark suite for the toolkit pipelines.
+
+Runs every core pipeline against synthetic 100 / 1,000 / 10,000-row inputs
+with the deterministic ``FakeChatModel`` and reports, per pipeline and size:
+wall time, simulated LLM wait (summed across concurrent calls), local CPU time,
+peak Python memory and the share of input tokens served from the simulated
+prompt cache. Workbook writing is included, so the numbers cover the
+whole run a consultant would wait for.
+
+Results can be saved and compared against a previous run; the comparison exits
+non-zero when wall or CPU time grows beyond the tolerance. ``--check-requery``
+also confirms that the follow-up requests for rows a model leaves out reach
+the model rather than being answered from the response cache.
+
+Example:
+    python benchmark.py --sizes 100 1000 --latency-ms 50 --save baseline.json
+    python benchmark.py --sizes 100 1000 --latency-ms 50 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from core import (
+    application_capability_mapping, application_categorisation, data_application_mapping,
+    impact_estimation, pain_point_capability_mapping, strategy_capability_mapping, theme_mapping,
+    use_case_evaluation,
+)
+from core.retrieval import embedding_warning, embeddings_usable, load_fast_mode_threshold
+from core.structured_output import MAX_REQUERY_ROUNDS
+from core.workbook import workbook_bytes
+from fake_llm import FakeChatModel
+from llm_cache import SQLiteLLMCache
+
+DEFAULT_SIZES = [100, 1000, 10000]
+# Reference lists stay a realistic size whatever the input size
+CAPABILITY_COUNT = 60
+DATA_ENTITY_COUNT = 40
+FAST_PIPELINE = "pain-point-capability-fast-mapping"
+
+_WORDS = ("manual", "approval", "supplier", "invoice", "customer", "schedule", "site", "report",
+          "data", "delay", "system", "handover", "compliance", "budget", "workflow", "portal")
+
+
+def _sentence(index, length=18):
+    return " ".join(_WORDS[(index * 7 + offset * 3) % len(_WORDS)] for offset in range(length))
+
+
+def synthetic_items(rows, prefix):
+    """``rows`` records with an ID, a name and a description"""
+    return pd.DataFrame({
+        "ID": [f"{prefix}{i:05d}" for i in range(1, rows + 1)],
+        "Name": [f"{prefix} item {i}" for i in range(1, rows + 1)],
+        "Description": [_sentence(i) for i in range(1, rows + 1)],
+    })
+
+
+def _capabilities():
+    return synthetic_items(CAPABILITY_COUNT, "CAP")
+
+
+def bench_impact_estimation(model, rows, args):
+    results_df = impact_estimation.run_impact_estimation(
+        model, synthetic_items(rows, "PP"), "ID", ["Name", "Description"], "",
+        args.batch_size, max_workers=args.max_concurrency)
+    return impact_estimation.impact_workbook_sheets(results_df)
+
+
+def bench_pain_point_capability_mapping(model, rows, args):
+    mappings_df = pain_point_capability_mapping.run_pain_point_capability_mapping(
+        model, synthetic_items(rows, "PP"), "ID", ["Description"],
+        _capabilities(), "ID", ["Name", "Description"], "",
+        args.batch_size, max_workers=args.max_concurrency, shortlist_k=args.shortlist_k)
+    return {"Sheet1": mappings_df}
+
+
+def bench_pain_point_capability_fast_mapping(model, rows, args):
+    mappings_df = pain_point_capability_mapping.run_pain_point_capability_fast_mapping(
+        model, synthetic_items(rows, "PP"), "ID", ["Description"],
+        _capabilities(), "ID", ["Name", "Description"], "", args.fast_threshold,
+        args.batch_size, max_workers=args.max_concurrency, shortlist_k=args.shortlist_k)
+    return {"Sheet1": mappings_df}
+
+
+def bench_theme_mapping(model, rows, args):
+    mappings_df, _ = theme_mapping.run_theme_perspective_mapping(
+        model, synthetic_items(rows, "PP"), "ID", ["Description"], "",
+        args.batch_size, max_workers=args.max_concurrency)
+    return {"Sheet1": mappings_df}
+
+
+def bench_application_capability_mapping(model, rows, args):
+    results_df = application_capability_mapping.run_application_capability_mapping(
+        model, synthetic_items(rows, "APP"), "ID", ["Name", "Description"],
+        _capabilities(), "ID", ["Name", "Description"], "",
+        args.batch_size, max_workers=args.max_concurrency, shortlist_k=args.shortlist_k)
+    return application_capability_mapping.mapping_workbook_sheets(results_df)
+
+
+def bench_application_categorisation(model, rows, args):
+    results_df, _ = application_categorisation.run_application_categorisation(
+        model, synthetic_items(rows, "APP"), "ID", ["Name", "Description"], "",
+        args.batch_size, max_workers=args.max_concurrency)
+    return application_categorisation.categorisation_workbook_sheets(results_df)
+
+
+def bench_strategy_capability_mapping(model, rows, args):
+    mappings_df = strategy_capability_mapping.run_strategy_capability_mapping(
+        model, synthetic_items(rows, "STR"), "ID", ["Description"],
+        _capabilities(), "ID", ["Name", "Description"], "",
+        args.batch_size, max_workers=args.max_concurrency, shortlist_k=args.shortlist_k)
+    return {"Sheet1": mappings_df}
+
+
+def bench_data_application_mapping(model, rows, args):
+    entity_context, valid_entity_ids = data_application_mapping.build_entity_context(
+        synthetic_items(DATA_ENTITY_COUNT, "DE"), "ID", ["Name", "Description"])
+    applications = data_application_mapping.build_applications(
+        synthetic_items(rows, "APP"), "ID", ["Name", "Description"])
+    mappings_df = data_application_mapping.run_data_application_mapping(
+        model, applications, entity_context, valid_entity_ids, max_concurrency=args.max_async_concurrency)
+    return data_application_mapping.mapping_workbook_sheets(mappings_df)
+
+
+def bench_use_case_evaluation(model, rows, args):
+    use_cases = use_case_evaluation.build_use_cases(synthetic_items(rows, "UC"), "ID", ["Name", "Description"])
+    results = use_case_evaluation.evaluate_use_cases(
+        model, _sentence(0, 120), use_cases, max_concurrency=args.max_async_concurrency)
+    return {"Evaluations": pd.DataFrame(results)}
+
+
+PIPELINES = {
+    "impact-estimation": bench_impact_estimation,
+    "pain-point-capability-mapping": bench_pain_point_capability_mapping,
+    FAST_PIPELINE: bench_pain_point_capability_fast_mapping,
+    "theme-mapping": bench_theme_mapping,
+    "application-capability-mapping": bench_application_capability_mapping,
+    "application-categorisation": bench_application_categorisation,
+    "strategy-capability-mapping": bench_strategy_capability_mapping,
+    "data-application-mapping": bench_data_application_mapping,
+    "use-case-evaluation": bench_use_case_evaluation,
+}
+
+
+def run_benchmark(name, rows, args):
+    """Run one pipeline at one size and return its measurements"""
+    model = FakeChatModel(latency_seconds=args.latency_ms / 1000,
+                          latency_jitter_seconds=args.latency_jitter_ms / 1000)
+    tracemalloc.start()
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    sheets = PIPELINES[name](model, rows, args)
+    workbook_bytes(sheets)
+    wall, cpu = time.perf_counter() - started_wall, time.process_time() - started_cpu
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    usage = model.usage()
+    return {
+        "pipeline": name,
+        "rows": rows,
+        "llm_calls": usage["calls"],
+        "wall_seconds": round(wall, 3),
+        "llm_wait_seconds": round(usage["wait_seconds"], 3),
+        "cpu_seconds": round(cpu, 3),
+        "peak_memory_mb": round(peak / (1024 * 1024), 1),
+        "input_tokens": usage["input_tokens"],
+        "cached_tokens": usage["cached_tokens"],
+    }
+
+
+def check_requery(rows=20, batch_size=5):
+    """Problem found when re-asking for missing rows, or None when every follow-up reached the model.
+
+    A cached model that never answers makes every batch use all its follow-up
+    rounds for the same rows; each round must still be a new model call.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SQLiteLLMCache(os.path.join(directory, "llm_cache.sqlite"))
+        model = FakeChatModel(omit_share=1.0, cache=cache)
+        impact_estimation.run_impact_estimation(
+            model, synthetic_items(rows, "PP"), "ID", ["Name", "Description"], "", batch_size, max_workers=1)
+    expected = -(-rows // batch_size) * (MAX_REQUERY_ROUNDS + 1)
+    calls = model.usage()["calls"]
+    if calls != expected:
+        return f"expected {expected} model calls for {rows} unanswered rows, made {calls}"
+    return None
+
+
+def print_results(results):
+    header = (f"{'Pipeline':<36}{'Rows':>7}{'Calls':>7}{'Wall s':>9}{'LLM wait s':>12}{'CPU s':>8}"
+              f"{'Peak MB':>9}{'Cached %':>10}")
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['pipeline']:<36}{result['rows']:>7}{result['llm_calls']:>7}"
+              f"{result['wall_seconds']:>9.2f}{result['llm_wait_seconds']:>12.2f}"
+              f"{result['cpu_seconds']:>8.2f}{result['peak_memory_mb']:>9.1f}"
+              f"{result['cached_tokens'] / max(1, result['input_tokens']) * 100:>10.0f}")
+
+
+def find_regressions(results, baseline, tolerance):
+    """Describe every result whose wall or CPU time exceeds the baseline by more than ``tolerance``"""
+    previous = {(result["pipeline"], result["rows"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["pipeline"], result["rows"]))
+        if before is None:
+            continue
+        for metric in ("wall_seconds", "cpu_seconds"):
+            # Ignore sub-100ms noise on tiny runs
+            if result[metric] > max(before[metric] * (1 + tolerance), before[metric] + 0.1):
+                regressions.append(f"{result['pipeline']} ({result['rows']} rows): {metric} "
+                                   f"{before[metric]:.2f} -> {result[metric]:.2f}")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the toolkit pipelines with a simulated LLM.")
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES), default=list(PIPELINES),
+                        help="Pipelines to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Input row counts")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated latency per LLM call")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0, help="Extra random latency per call")
+    parser.add_argument("--batch-size", type=int,
+                        help="Rows sent to the model per request (default: sized from the model's token limits)")
+    parser.add_argument("--max-concurrency", type=int, help="Threads for the batch tools")
+    parser.add_argument("--shortlist-k", type=int, help="Embedding shortlist size for the capability mappings")
+    parser.add_argument("--fast-threshold", type=float,
+                        help="Similarity threshold for the fast pain point mapping "
+                             "(default: the threshold calibrated for the embedding model)")
+    parser.add_argument("--max-async-concurrency", type=int, help="In-flight calls for the asyncio tools")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--check-requery", action="store_true",
+                        help="Also check that follow-up requests for missing rows bypass the response cache")
+    return parser
+
+
+def embedding_pipelines(args):
+    """Selected pipelines that embed text"""
+    return [name for name in args.pipelines
+            if name == FAST_PIPELINE or (args.shortlist_k and "capability" in name)]
+
+
+def fast_pipeline_skip_reason(args):
+    """Why the fast mapping can't be benchmarked here, or None"""
+    if not embeddings_usable():
+        return "no embedding model"
+    if args.fast_threshold is None:
+        return "no calibrated threshold (pass --fast-threshold)"
+    return None
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if embedding_pipelines(args) and embedding_warning():
+        if args.shortlist_k and not embeddings_usable():
+            parser.error(embedding_warning())
+        print(f"Warning: {embedding_warning()}", file=sys.stderr)
+    if FAST_PIPELINE in args.pipelines:
+        if args.fast_threshold is None and embeddings_usable():
+            args.fast_threshold = load_fast_mode_threshold()
+        reason = fast_pipeline_skip_reason(args)
+        if reason:
+            args.pipelines = [name for name in args.pipelines if name != FAST_PIPELINE]
+            print(f"Skipping {FAST_PIPELINE}: {reason}", file=sys.stderr)
+    results = []
+    for name in args.pipelines:
+        for rows in args.sizes:
+            results.append(run_benchmark(name, rows, args))
+            print(f"{name}: {rows} rows in {results[-1]['wall_seconds']:.2f}s", file=sys.stderr, flush=True)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    if args.check_requery:
+        problem = check_requery()
+        if problem:
+            print(f"Re-query check failed: {problem}", file=sys.stderr)
+            return 1
+        print("Re-query check passed", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Incremental checkpoints for long batch runs.
+
+``run_batches`` and ``run_async_tasks`` append each completed batch (or item)
+to a job file under ``.cache/checkpoints`` as soon as it finishes. The file is
+named after a fingerprint of the input rows and the settings the pipeline
+passes in (prompt, columns and model), so running the same job again after a
+refresh, rerun or crash loads the finished batches and sends only the rest.
+The file is removed once every batch has succeeded.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from llm_cache import CACHE_DIR
+
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "checkpoints")
+# Job files untouched for this long are abandoned and deleted
+MAX_CHECKPOINT_AGE_SECONDS = 7 * 24 * 3600
+# Models whose answers are persisted elsewhere (the Batch API job files)
+UNCHECKPOINTED_MODEL_TYPES = {"batch-replay"}
+
+
+def _json_default(value):
+    # numpy scalars from DataFrame rows
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _update(digest, part):
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        digest.update(json.dumps([str(column) for column in getattr(part, "columns", [])]).encode("utf-8"))
+    else:
+        digest.update(json.dumps(part, sort_keys=True, default=_json_default).encode("utf-8"))
+    digest.update(b"\0")
+
+
+def fingerprint(*parts):
+    """Stable hash of DataFrames, strings and other JSON-like values"""
+    digest = hashlib.sha256()
+    for part in parts:
+        _update(digest, part)
+    return digest.hexdigest()
+
+
+def model_identity(model):
+    """Model name and temperature, which change the answers a job would get"""
+    name = getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+    return [str(name), getattr(model, "temperature", None)]
+
+
+def job_settings(model, *settings):
+    """Checkpoint settings for a pipeline run on ``model``, or None when it shouldn't be checkpointed"""
+    if getattr(model, "_llm_type", None) in UNCHECKPOINTED_MODEL_TYPES:
+        return None
+    return fingerprint(model_identity(model), *settings)
+
+
+class Checkpoint:
+    """Append-only file of the results of one job's completed batches"""
+
+    def __init__(self, key, directory=CHECKPOINT_DIR):
+        self.path = os.path.join(directory, f"{key}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        _remove_stale(directory)
+
+    def load(self):
+        """Results saved so far, by batch index"""
+        results = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Line cut short by a crash; that batch is simply run again
+                    results[record["index"]] = record["result"]
+        except FileNotFoundError:
+            pass
+        return results
+
+    def save(self, index, result):
+        line = json.dumps({"index": index, "result": result}, default=_json_default)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def complete(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale(directory):
+    cutoff = time.time() - MAX_CHECKPOINT_AGE_SECONDS
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def open_checkpoint(settings, items):
+    """``Checkpoint`` for running ``items`` with ``settings``, or None when ``settings`` is None"""
+    if settings is None:
+        return None
+    return Checkpoint(fingerprint(settings, *items))
@@ -0,0 +1,376 @@
+"""Headless command-line runner for the batch tools.
+
+Runs a toolkit pipeline straight from a spreadsheet, without Streamlit, and
+writes the same workbook the page offers for download. Progress is streamed to
+stdout so long runs can be scheduled on a server and split across machines.
+
+Example:
+    python cli.py application-capability-mapping \\
+        --input applications.xlsx --id-column "App ID" --text-columns Name Description \\
+        --capabilities capabilities.xlsx --capability-id-column "Cap ID" \\
+        --capability-text-columns Name --batch-size 10 --output mappings.xlsx
+"""
+import argparse
+import sys
+import time
+
+from app_config import current_model, current_temperature, get_model
+from batch_jobs import batch_client, load_batch_api_config, run_batch_job
+from core import (
+    application_capability_mapping, application_categorisation, data_application_mapping,
+    impact_estimation, pain_point_capability_mapping, strategy_capability_mapping, theme_mapping,
+)
+from core.retrieval import (
+    DEFAULT_TARGET_PRECISION, active_embedding_model, embedding_warning, embeddings_usable, load_fast_mode_threshold,
+    save_fast_mode_threshold,
+)
+from core.workbook import write_workbook
+from model_routing import model_route, routing_summary
+from run_context import hedging_summary, tool_run
+from telemetry import cache_summary, usage_between, usage_tracker
+from uploads import read_columns, sheet_columns
+
+
+def read_table(path, sheet=None, columns=None):
+    """Load a CSV or Excel sheet (first sheet unless ``sheet`` is given), reading only ``columns`` when given"""
+    if columns is None:
+        return read_columns(path, sheet or 0)
+    headers = sheet_columns(path, sheet or 0)
+    check_columns(headers, columns, path)
+    return read_columns(path, sheet or 0, columns, headers)
+
+
+def check_columns(available, columns, source):
+    missing = [column for column in columns if column not in available]
+    if missing:
+        raise SystemExit(f"Column(s) not found in {source}: {', '.join(missing)}")
+
+
+def progress_printer(unit):
+    """Progress callback that streams ``completed/total`` lines to stdout"""
+    started = time.time()
+
+    def on_progress(completed, total):
+        print(f"Processed {completed} of {total} {unit} ({time.time() - started:.1f}s)", flush=True)
+
+    return on_progress
+
+
+def report_batch_error(index, error, item_ids=None):
+    rows = f" (rows {', '.join(str(item_id) for item_id in item_ids)})" if item_ids else ""
+    print(f"Error processing batch {index + 1}{rows}: {error}", file=sys.stderr, flush=True)
+
+
+def tool_route(args):
+    """Fast/strong model route for the tool when ``--route-models`` is given"""
+    return model_route(args.tool) if args.route_models else None
+
+
+def print_routing_summary(results_df):
+    summary = routing_summary(results_df)
+    if summary:
+        print(summary, flush=True)
+
+
+def read_reference(path, sheet, id_column, text_columns):
+    return read_table(path, sheet, [id_column] + text_columns)
+
+
+def read_capabilities(args):
+    return read_reference(args.capabilities, args.capabilities_sheet,
+                          args.capability_id_column, args.capability_text_columns)
+
+
+def run_impact_estimation(args, df, model):
+    results_df = impact_estimation.run_impact_estimation(
+        model, df, args.id_column, args.text_columns, args.context, args.batch_size,
+        on_progress=progress_printer("batches"),
+        on_batch_error=report_batch_error,
+        max_workers=args.max_concurrency,
+        route=tool_route(args),
+    )
+    print_routing_summary(results_df)
+    return impact_estimation.impact_workbook_sheets(results_df)
+
+
+def fast_mode_threshold(args):
+    """Fast-mode threshold requested on the command line (calibrated unless overridden), or None"""
+    if args.fast_threshold is not None:
+        return args.fast_threshold
+    return load_fast_mode_threshold() if args.fast_mode else None
+
+
+def run_pain_point_capability_mapping(args, df, model):
+    threshold = fast_mode_threshold(args)
+    if threshold is not None:
+        mappings_df = pain_point_capability_mapping.run_pain_point_capability_fast_mapping(
+            model, df, args.id_column, args.text_columns,
+            read_capabilities(args), args.capability_id_column, args.capability_text_columns,
+            args.context, threshold, args.batch_size,
+            on_progress=progress_printer("batches"),
+            max_workers=args.max_concurrency,
+            shortlist_k=args.shortlist_k,
+        )
+    else:
+        mappings_df = pain_point_capability_mapping.run_pain_point_capability_mapping(
+            model, df, args.id_column, args.text_columns,
+            read_capabilities(args), args.capability_id_column, args.capability_text_columns,
+            args.context, args.batch_size,
+            on_progress=progress_printer("batches"),
+            max_workers=args.max_concurrency,
+            shortlist_k=args.shortlist_k,
+        )
+    return {'Sheet1': mappings_df}
+
+
+def run_theme_mapping(args, df, model):
+    mappings_df, _ = theme_mapping.run_theme_perspective_mapping(
+        model, df, args.id_column, args.text_columns, args.context, args.batch_size,
+        on_progress=progress_printer("batches"),
+        max_workers=args.max_concurrency,
+        route=tool_route(args),
+    )
+    print_routing_summary(mappings_df)
+    return {'Sheet1': mappings_df}
+
+
+def run_application_capability_mapping(args, df, model):
+    results_df = application_capability_mapping.run_application_capability_mapping(
+        model, df, args.id_column, args.text_columns,
+        read_capabilities(args), args.capability_id_column, args.capability_text_columns,
+        args.context, args.batch_size,
+        on_progress=progress_printer("batches"),
+        on_batch_error=report_batch_error,
+        max_workers=args.max_concurrency,
+        shortlist_k=args.shortlist_k,
+    )
+    return application_capability_mapping.mapping_workbook_sheets(results_df)
+
+
+def run_application_categorisation(args, df, model):
+    results_df, unparsed_lines = application_categorisation.run_application_categorisation(
+        model, df, args.id_column, args.text_columns, args.context, args.batch_size,
+        on_progress=progress_printer("batches"),
+        on_batch_error=report_batch_error,
+        max_workers=args.max_concurrency,
+        route=tool_route(args),
+    )
+    for line in unparsed_lines:
+        print(f"Could not parse response line: {line}", file=sys.stderr)
+    print_routing_summary(results_df)
+    return application_categorisation.categorisation_workbook_sheets(results_df)
+
+
+def run_strategy_capability_mapping(args, df, model):
+    mappings_df = strategy_capability_mapping.run_strategy_capability_mapping(
+        model, df, args.id_column, args.text_columns,
+        read_capabilities(args), args.capability_id_column, args.capability_text_columns,
+        args.context, args.batch_size,
+        on_progress=progress_printer("batches"),
+        max_workers=args.max_concurrency,
+        shortlist_k=args.shortlist_k,
+    )
+    return {'Sheet1': mappings_df}
+
+
+def run_data_application_mapping(args, df, model):
+    data_df = read_reference(args.data_entities, args.data_entities_sheet,
+                             args.entity_id_column, args.entity_text_columns)
+    entity_context, valid_entity_ids = data_application_mapping.build_entity_context(
+        data_df, args.entity_id_column, args.entity_text_columns
+    )
+    mappings_df = data_application_mapping.run_data_application_mapping(
+        model,
+        data_application_mapping.build_applications(df, args.id_column, args.text_columns),
+        entity_context, valid_entity_ids,
+        on_progress=progress_printer("applications"),
+        on_app_error=lambda app_info, error: print(
+            f"Error processing {app_info['id']}: {error}", file=sys.stderr, flush=True
+        ),
+        max_concurrency=args.max_concurrency,
+    )
+    return data_application_mapping.mapping_workbook_sheets(mappings_df)
+
+
+def add_catalogue_arguments(parser):
+    parser.add_argument("--capabilities", required=True, help="Capabilities spreadsheet (Excel or CSV)")
+    parser.add_argument("--capabilities-sheet", help="Sheet name in the capabilities workbook")
+    parser.add_argument("--capability-id-column", required=True, help="Capability ID column")
+    parser.add_argument("--capability-text-columns", nargs="+", required=True,
+                        help="Capability description columns (concatenated)")
+
+
+def add_capability_arguments(parser):
+    add_catalogue_arguments(parser)
+    parser.add_argument("--shortlist-k", type=int,
+                        help="Send each batch only the K nearest capabilities per row (embedding shortlist)")
+
+
+def add_pain_point_capability_arguments(parser):
+    add_capability_arguments(parser)
+    parser.add_argument("--fast-mode", action="store_true",
+                        help="Take the most similar capability when its embedding similarity reaches the threshold "
+                             "calibrated for the embedding model, and send only the rest to the model")
+    parser.add_argument("--fast-threshold", type=float,
+                        help="Fast mode with this similarity threshold instead of the calibrated one "
+                             "(0 skips the model)")
+
+
+def add_routing_arguments(parser):
+    parser.add_argument("--route-models", action="store_true",
+                        help="Send rows to the fast model first and escalate only low-confidence answers to the "
+                             "strong model (models and threshold in model_config.json)")
+
+
+def add_data_entity_arguments(parser):
+    parser.add_argument("--data-entities", required=True, help="Data entities spreadsheet (Excel or CSV)")
+    parser.add_argument("--data-entities-sheet", help="Sheet name in the data entities workbook")
+    parser.add_argument("--entity-id-column", required=True, help="Data entity ID column")
+    parser.add_argument("--entity-text-columns", nargs="*", default=[],
+                        help="Data entity description columns")
+
+
+# name: (description, extra argument builder, runner)
+TOOLS = {
+    "impact-estimation": (
+        "Estimate the business impact of pain points", add_routing_arguments, run_impact_estimation),
+    "pain-point-capability-mapping": (
+        "Map pain points to capabilities", add_pain_point_capability_arguments,
+        run_pain_point_capability_mapping),
+    "theme-mapping": (
+        "Map pain points to themes and perspectives", add_routing_arguments, run_theme_mapping),
+    "application-capability-mapping": (
+        "Map applications to capabilities", add_capability_arguments, run_application_capability_mapping),
+    "application-categorisation": (
+        "Categorise applications as Application, Technology or Platform", add_routing_arguments,
+        run_application_categorisation),
+    "strategy-capability-mapping": (
+        "Map strategic initiatives to capabilities", add_capability_arguments, run_strategy_capability_mapping),
+    "data-application-mapping": (
+        "Map applications to data entities", add_data_entity_arguments, run_data_application_mapping),
+}
+
+
+CALIBRATE_COMMAND = "calibrate-fast-mode"
+
+
+def add_calibration_parser(subparsers):
+    description = ("Calibrate the pain point fast-mode threshold for the embedding model against trusted "
+                   "mappings, such as a reviewed pain point capability mapping export")
+    parser = subparsers.add_parser(CALIBRATE_COMMAND, help="Calibrate the fast-mode similarity threshold",
+                                   description=description)
+    parser.add_argument("--input", required=True, help="Pain points spreadsheet (Excel or CSV)")
+    parser.add_argument("--sheet", help="Sheet name in the input workbook")
+    parser.add_argument("--id-column", required=True, help="ID column in the input")
+    parser.add_argument("--text-columns", nargs="+", required=True,
+                        help="Description column(s) in the input (concatenated)")
+    add_catalogue_arguments(parser)
+    parser.add_argument("--reference", required=True,
+                        help="Spreadsheet of trusted mappings with Pain_Point_ID and Capability_ID columns")
+    parser.add_argument("--reference-sheet", help="Sheet name in the reference workbook")
+    parser.add_argument("--target-precision", type=float, default=DEFAULT_TARGET_PRECISION,
+                        help="Share of fast-mode matches that must agree with the reference (default 0.9)")
+    parser.add_argument("--save", action="store_true",
+                        help="Store the threshold for the embedding model in model_config.json")
+
+
+def calibrate_fast_mode(args):
+    df = read_table(args.input, args.sheet, [args.id_column] + args.text_columns)
+    reference_df = read_table(args.reference, args.reference_sheet, ["Pain_Point_ID", "Capability_ID"])
+    result = pain_point_capability_mapping.calibrate_fast_mapping(
+        df, args.id_column, args.text_columns,
+        read_capabilities(args), args.capability_id_column, args.capability_text_columns,
+        reference_df, args.target_precision,
+    )
+    print(f"Compared {result['rows']} pain points with {args.reference} using {result['embedding_model']}", flush=True)
+    if result["threshold"] is None:
+        print(f"No threshold reaches {args.target_precision:.0%} agreement; leave fast mode off for this model",
+              file=sys.stderr)
+        return 1
+    print(f"Threshold {result['threshold']:.4f}: {result['precision']:.0%} of fast-mode matches agree with the "
+          f"reference and {result['coverage']:.0%} of pain points skip the model", flush=True)
+    if args.save:
+        save_fast_mode_threshold(result["embedding_model"], result["threshold"])
+        print(f"Saved the threshold for {result['embedding_model']} to model_config.json", flush=True)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run Consulting Toolkit batch tools without the web UI.")
+    subparsers = parser.add_subparsers(dest="tool", required=True)
+    for name, (description, add_arguments, _) in TOOLS.items():
+        subparser = subparsers.add_parser(name, help=description, description=description)
+        subparser.add_argument("--input", required=True, help="Input spreadsheet (Excel or CSV)")
+        subparser.add_argument("--sheet", help="Sheet name in the input workbook")
+        subparser.add_argument("--id-column", required=True, help="ID column in the input")
+        subparser.add_argument("--text-columns", nargs="+", required=True,
+                               help="Description column(s) in the input (concatenated)")
+        subparser.add_argument("--batch-size", type=int,
+                               help="Rows sent to the model per request (default: sized from the model's token limits)")
+        subparser.add_argument("--context", default="", help="Additional context for the prompt")
+        subparser.add_argument("--max-concurrency", type=int,
+                               help="Requests in flight at once (defaults to model_config.json)")
+        subparser.add_argument("--output", required=True, help="Output workbook (.xlsx)")
+        subparser.add_argument("--batch-job",
+                               help="Run as an offline job through the provider's Batch API under this name; "
+                                    "rerun with the same name to resume")
+        subparser.add_argument("--batch-backend", choices=["openai", "local"],
+                               help="Batch API to use: openai, or local for the offline stand-in "
+                                    "(defaults to model_config.json)")
+        if add_arguments is not None:
+            add_arguments(subparser)
+    add_calibration_parser(subparsers)
+    return parser
+
+
+def run_as_batch_job(args, run_pipeline):
+    """Run a tool through the Batch API, waiting for each submitted batch to finish"""
+    config = load_batch_api_config()
+    return run_batch_job(
+        args.batch_job, run_pipeline, batch_client(args.batch_backend or config["backend"]),
+        current_model, current_temperature,
+        poll_seconds=config["poll_seconds"], max_rounds=config["max_rounds"],
+        on_status=lambda message: print(message, flush=True),
+    )
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "route_models", False) and args.batch_job:
+        parser.error("--route-models can't be combined with --batch-job")
+    fast_mode = getattr(args, "fast_mode", False) or getattr(args, "fast_threshold", None) is not None
+    if args.tool == CALIBRATE_COMMAND or getattr(args, "shortlist_k", None) or fast_mode:
+        if not embeddings_usable():
+            parser.error(embedding_warning())
+        if embedding_warning():
+            print(f"Warning: {embedding_warning()}", file=sys.stderr, flush=True)
+    if args.tool == CALIBRATE_COMMAND:
+        return calibrate_fast_mode(args)
+    if fast_mode and fast_mode_threshold(args) is None:
+        parser.error(f"No fast-mode threshold has been calibrated for {active_embedding_model()}; "
+                     f"run `python cli.py {CALIBRATE_COMMAND}` first or pass --fast-threshold")
+    _, _, runner = TOOLS[args.tool]
+
+    df = read_table(args.input, args.sheet, [args.id_column] + args.text_columns)
+    print(f"{args.tool}: {len(df)} rows from {args.input}", flush=True)
+
+    started, usage_before = time.time(), usage_tracker.snapshot()
+    with tool_run(args.tool) as run:
+        if args.batch_job:
+            sheets = run_as_batch_job(args, lambda job_model: runner(args, df, job_model))
+        else:
+            sheets = runner(args, df, get_model())
+        write_workbook(args.output, sheets, run)
+    if hedging_summary(run):
+        print(hedging_summary(run), flush=True)
+    rows = sum(len(sheet) for sheet in sheets.values())
+    print(f"Wrote {rows} rows to {args.output} in {time.time() - started:.1f}s", flush=True)
+    usage = usage_between(usage_before, usage_tracker.snapshot())
+    if usage["calls"]:
+        print(cache_summary(usage), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# UI-independent tool pipelines shared by the Streamlit pages and the CLI
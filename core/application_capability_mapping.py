@@ -0,0 +1,182 @@
+"""Application to capability mapping pipeline."""
+import pandas as pd
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from batch_executor import DEFAULT_BATCH_RETRIES, concat_results, run_batches
+from checkpoints import job_settings
+from core.retrieval import CapabilityIndex, shortlisted_capabilities
+from core.structured_output import item_key, request_keyed_results
+from core.token_budget import batches_for
+from prompts import APPLICATION_CAPABILITY_MAPPING_BATCH_PROMPT, APPLICATION_CAPABILITY_MAPPING_SYSTEM_PROMPT
+
+# Expected answer length per application, for automatic batch sizing
+OUTPUT_TOKENS_PER_ROW = 30
+
+
+def build_mapping_prompt_header(capabilities_df, cap_id_column, cap_description_columns, additional_context):
+    """System prompt listing every capability; sent unchanged before each batch of applications"""
+    capabilities_text = ""
+    for _, cap_row in capabilities_df.iterrows():
+        cap_id = cap_row[cap_id_column]
+        cap_parts = []
+        for col in cap_description_columns:
+            if pd.notna(cap_row[col]) and str(cap_row[col]).strip():
+                cap_parts.append(str(cap_row[col]).strip())
+
+        cap_description = " | ".join(cap_parts)
+        capabilities_text += f"{cap_id}: {cap_description}\n"
+
+    context_section = ""
+    if additional_context and additional_context.strip():
+        context_section = f"\nAdditional Context:\n{additional_context}\n"
+
+    return APPLICATION_CAPABILITY_MAPPING_SYSTEM_PROMPT.format(
+        capabilities=capabilities_text,
+        context_section=context_section,
+    )
+
+
+def application_batch_text(batch_df, app_id_column, app_description_columns):
+    """One "ID: description" line per application"""
+    batch_text = ""
+    for _, row in batch_df.iterrows():
+        # Combine application description columns
+        app_parts = []
+        for col in app_description_columns:
+            if pd.notna(row[col]) and str(row[col]).strip():
+                app_parts.append(str(row[col]).strip())
+
+        app_description = " | ".join(app_parts)
+        batch_text += f"{row[app_id_column]}: {app_description}\n"
+    return batch_text
+
+
+def capability_id_validator(valid_capability_ids):
+    """Validator for one application's answer: a list of known capability IDs (empty for none)"""
+    known = {item_key(cap_id) for cap_id in valid_capability_ids}
+
+    def validate(value):
+        if isinstance(value, str):
+            value = [] if value.strip().upper() in ('', 'NONE') else value.split(',')
+        if not isinstance(value, list):
+            return None
+        capability_ids = [item_key(cap_id) for cap_id in value if item_key(cap_id)]
+        matched = [cap_id for cap_id in capability_ids if cap_id in known]
+        # Answers naming only unknown capabilities are re-asked rather than dropped
+        if capability_ids and not matched:
+            return None
+        return matched
+
+    return validate
+
+
+def map_application_batch(model, batch_df, app_id_column, app_description_columns, mapping_prompt_header,
+                          valid_capability_ids):
+    """Map one batch of applications to capabilities.
+
+    The model answers with a JSON object keyed by application ID; applications
+    it leaves out or answers with unknown capability IDs are asked again.
+    """
+    def ask(rows_df, note):
+        batch_prompt = APPLICATION_CAPABILITY_MAPPING_BATCH_PROMPT.format(
+            applications=application_batch_text(rows_df, app_id_column, app_description_columns))
+        messages = [
+            SystemMessage(content=mapping_prompt_header),
+            HumanMessage(content=f"{note}\n\n{batch_prompt}" if note else batch_prompt),
+        ]
+        return model.invoke(messages).content
+
+    answers = request_keyed_results(ask, batch_df, app_id_column, capability_id_validator(valid_capability_ids))
+
+    results = []
+    for app_id in batch_df[app_id_column]:
+        capability_ids = answers.get(item_key(app_id))
+        if capability_ids:
+            for cap_id in capability_ids:
+                results.append({'Application ID': app_id, 'Capability ID': cap_id})
+        else:
+            results.append({'Application ID': app_id, 'Capability ID': 'No mapping found'})
+
+    return results
+
+
+def run_application_capability_mapping(model, applications_df, app_id_column, app_description_columns,
+                                       capabilities_df, cap_id_column, cap_description_columns,
+                                       additional_context, batch_size=10,
+                                       on_progress=None, on_batch_error=None, max_workers=None,
+                                       shortlist_k=None):
+    """Map every application to capabilities.
+
+    A failing batch is retried and then split in half until the failing
+    applications are isolated; ``on_batch_error(batch_index, exception, app_ids)``
+    is told about each, and they are recorded as 'Processing error'. With ``shortlist_k``
+    each batch prompt lists only the capabilities among the ``shortlist_k``
+    nearest (by embedding) to one of its applications. A ``batch_size`` of None
+    sizes batches from the model's token limits. Returns the results DataFrame.
+    """
+    valid_capability_ids = capabilities_df[cap_id_column].tolist()
+    # Full catalogue header: an upper bound on the prompt when shortlisting
+    mapping_prompt_header = build_mapping_prompt_header(
+        capabilities_df, cap_id_column, cap_description_columns, additional_context
+    )
+    if shortlist_k:
+        capability_index = CapabilityIndex.from_dataframe(capabilities_df, cap_id_column, cap_description_columns)
+
+        def batch_prompt_header(batch_df):
+            return build_mapping_prompt_header(
+                shortlisted_capabilities(capability_index, capabilities_df, batch_df,
+                                         app_description_columns, shortlist_k),
+                cap_id_column, cap_description_columns, additional_context,
+            )
+    else:
+        def batch_prompt_header(batch_df):
+            return mapping_prompt_header
+
+    def handle_batch_error(index, batch_df, error):
+        if on_batch_error is not None:
+            on_batch_error(index, error, batch_df[app_id_column].tolist())
+        return [
+            {'Application ID': app_id, 'Capability ID': 'Processing error'}
+            for app_id in batch_df[app_id_column]
+        ]
+
+    # Send batches to the model concurrently; results come back in input order
+    batch_results = run_batches(
+        batches_for(applications_df, batch_size, app_description_columns, mapping_prompt_header,
+                    OUTPUT_TOKENS_PER_ROW, model),
+        lambda batch_df: map_application_batch(
+            model, batch_df, app_id_column, app_description_columns, batch_prompt_header(batch_df),
+            valid_capability_ids,
+        ),
+        max_workers=max_workers,
+        on_progress=on_progress,
+        on_error=handle_batch_error,
+        combine=concat_results,
+        retries=DEFAULT_BATCH_RETRIES,
+        checkpoint=job_settings(model, "application-capability-mapping", mapping_prompt_header, app_id_column,
+                                app_description_columns, capabilities_df, cap_id_column, cap_description_columns,
+                                shortlist_k),
+    )
+    return pd.DataFrame(concat_results(batch_results), columns=['Application ID', 'Capability ID'])
+
+
+def mapping_summary(results_df):
+    """Headline counts shown on the page and in the Summary sheet"""
+    return {
+        'Total Mappings': len(results_df),
+        'Applications Processed': results_df['Application ID'].nunique(),
+        'Capabilities Matched': results_df[results_df['Capability ID'].notna()]['Capability ID'].nunique(),
+        'No Mappings Found': len(results_df[results_df['Capability ID'] == 'No mapping found']),
+    }
+
+
+def mapping_workbook_sheets(results_df):
+    """Sheets of the application mapping download"""
+    summary = mapping_summary(results_df)
+    summary_df = pd.DataFrame({'Metric': list(summary.keys()), 'Count': list(summary.values())})
+    app_mapping_counts = results_df.groupby('Application ID').size().reset_index(name='Mapping Count')
+    return {
+        'Application Mappings': results_df,
+        'Summary': summary_df,
+        'Applications Overview': app_mapping_counts,
+    }
@@ -0,0 +1,182 @@
+"""Application categorisation pipeline (Application / Technology / Platform)."""
+import re
+
+import pandas as pd
+from langchain_core.messages import HumanMessage
+
+from batch_executor import DEFAULT_BATCH_RETRIES, run_batches
+from checkpoints import job_settings
+from core.token_budget import batches_for
+from core.workbook import percentage
+from model_routing import CONFIDENCE_COLUMN, CONFIDENCE_TOKENS_PER_ROW, parse_confidence, run_routed
+
+CATEGORIES = ['Application', 'Technology', 'Platform']
+# Expected answer length per application, for automatic batch sizing
+OUTPUT_TOKENS_PER_ROW = 12
+
+
+def build_categorisation_prompt(additional_context, batch_text, with_confidence=False):
+    """Categorisation prompt for the "ID: x | Description: y" lines in ``batch_text``
+
+    With ``with_confidence`` the model also rates its confidence in each category.
+    """
+    context_section = f"Additional Context: {additional_context}\n\n" if additional_context.strip() else ""
+    if with_confidence:
+        answer_format = ("ApplicationID,Category,Confidence\n"
+                         "where Confidence is your confidence in the category, from 0 to 1")
+    else:
+        answer_format = "ApplicationID,Category"
+
+    return f"""You are a senior enterprise architect with expertise in application portfolio management and technology categorisation.
+
+Analyse each application/system and categorise it as exactly one of: Application, Technology, or Platform.
+
+{context_section}Definitions:
+- Application: A discrete software solution that delivers specific business functions to defined user groups. Has its own data, user interface, and logic. Maps to business capabilities (e.g., payroll processing, incident management).
+- Technology: Underlying technical building blocks—languages, frameworks, protocols, databases, devices, infrastructure services. Typically abstracted from end-users.
+- Platform: A managed environment bundling multiple technologies and shared services. Provides stable foundation for developing, deploying, and operating applications. Standardises common concerns like identity, integration, observability.
+
+Return ONLY the results in this exact format (one line per application):
+{answer_format}
+
+Applications to categorise:
+{batch_text}"""
+
+
+def categorise_application_batch(model, batch_df, id_column, additional_context, valid_app_ids,
+                                 with_confidence=False):
+    """Categorise one batch of applications
+
+    Returns the parsed categorisations and any response lines that could not be parsed.
+    With ``with_confidence`` each categorisation also carries the model's ``Confidence``.
+    """
+    # Prepare batch data for AI
+    batch_data = []
+    for _, row in batch_df.iterrows():
+        app_id = row[id_column]
+        description = row['combined_description']
+        batch_data.append(f"ID: {app_id} | Description: {description}")
+
+    batch_text = "\n".join(batch_data)
+
+    prompt = build_categorisation_prompt(additional_context, batch_text, with_confidence)
+
+    # Call AI model
+    message = HumanMessage(content=prompt)
+    response = model.invoke([message])
+    ai_response = response.content.strip()
+
+    # Parse results
+    results = []
+    unparsed_lines = []
+    for line in ai_response.split('\n'):
+        line = line.strip()
+        if line and ',' in line:
+            try:
+                parts = line.split(',', 2)
+                if len(parts) >= 2:
+                    app_id = parts[0].strip()
+                    category = parts[1].strip()
+
+                    # Clean app_id - remove any leading characters
+                    app_id = re.sub(r'^[^a-zA-Z0-9]*', '', app_id)
+                    app_id = re.sub(r'[^a-zA-Z0-9_\-\.]*$', '', app_id)
+
+                    # Validate category
+                    if category in ['Application', 'Technology', 'Platform']:
+                        # Validate application ID exists in source data
+                        if app_id in valid_app_ids:
+                            result = {
+                                'Application_ID': app_id,
+                                'Category': category
+                            }
+                            if with_confidence:
+                                result[CONFIDENCE_COLUMN] = parse_confidence(parts[2]) if len(parts) == 3 else None
+                            results.append(result)
+            except Exception:
+                unparsed_lines.append(line)
+                continue
+
+    return results, unparsed_lines
+
+
+def combine_categorisations(batch_results):
+    """Merge the (categories, unparsed lines) results of the pieces of a split batch"""
+    return ([category for categories, _ in batch_results for category in categories],
+            [line for _, unparsed_lines in batch_results for line in unparsed_lines])
+
+
+def run_application_categorisation(model, df, id_column, description_columns, additional_context,
+                                   batch_size=10, on_progress=None, on_batch_error=None, max_workers=None,
+                                   route=None):
+    """Categorise every application in ``df``.
+
+    A failing batch is retried and then split in half until the failing
+    applications are isolated; ``on_batch_error(batch_index, exception, app_ids)``
+    is told about each, and they are skipped. A ``batch_size`` of None sizes batches from the
+    model's token limits. With a ``model_routing.ModelRoute`` as ``route``
+    applications go to its fast model first, and only those it is unsure of, or
+    leaves out, are escalated to the strong model; ``model`` is then unused.
+    Returns the results DataFrame and the response lines that could not be parsed.
+    """
+    # Prepare data
+    df_clean = df.copy()
+
+    # Combine description columns
+    df_clean['combined_description'] = df_clean[description_columns].fillna('').astype(str).agg(' | '.join, axis=1)
+
+    # Application IDs from the source data, used to validate the AI output
+    valid_app_ids = set(df_clean[id_column].astype(str).values)
+    unparsed = []
+
+    def run_tier(tier_model, rows_df, with_confidence):
+        def handle_batch_error(index, batch_df, error):
+            # Failures on the fast model are escalated rather than reported
+            if on_batch_error is not None and not with_confidence:
+                on_batch_error(index, error, batch_df[id_column].tolist())
+            return [], []
+
+        output_tokens = OUTPUT_TOKENS_PER_ROW + (CONFIDENCE_TOKENS_PER_ROW if with_confidence else 0)
+        # Send batches to the model concurrently; results come back in input order
+        batch_results = run_batches(
+            batches_for(rows_df, batch_size, ['combined_description'],
+                        build_categorisation_prompt(additional_context, "", with_confidence), output_tokens,
+                        tier_model),
+            lambda batch_df: categorise_application_batch(
+                tier_model, batch_df, id_column, additional_context, valid_app_ids, with_confidence
+            ),
+            max_workers=max_workers,
+            on_progress=on_progress,
+            on_error=handle_batch_error,
+            combine=combine_categorisations,
+            retries=DEFAULT_BATCH_RETRIES,
+            checkpoint=job_settings(tier_model, "application-categorisation",
+                                    build_categorisation_prompt(additional_context, "", with_confidence),
+                                    id_column, description_columns),
+        )
+        results = []
+        for batch_categories, unparsed_lines in batch_results:
+            results.extend(batch_categories)
+            unparsed.extend(unparsed_lines)
+        columns = ['Application_ID', 'Category'] + ([CONFIDENCE_COLUMN] if with_confidence else [])
+        return pd.DataFrame(results, columns=columns)
+
+    if route is not None:
+        return run_routed(route, df_clean, id_column, 'Application_ID', run_tier), unparsed
+    return run_tier(model, df_clean, False), unparsed
+
+
+def category_counts(results_df):
+    return {category: len(results_df[results_df['Category'] == category]) for category in CATEGORIES}
+
+
+def categorisation_workbook_sheets(results_df):
+    """Sheets of the categorisation download"""
+    counts = category_counts(results_df)
+    total = len(results_df)
+    summary_df = pd.DataFrame({
+        'Category': CATEGORIES + ['Total'],
+        'Count': [counts[category] for category in CATEGORIES] + [total],
+        'Percentage': [percentage(counts[category], total) for category in CATEGORIES] + ["100%"],
+    })
+    return {'Application_Categories': results_df, 'Summary': summary_df}
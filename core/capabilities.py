@@ -0,0 +1,27 @@
+"""Capability catalogue helpers shared by the capability mapping pipelines."""
+import pandas as pd
+
+
+def capability_rows(capabilities_df, cap_id_col, cap_text_cols):
+    """(capability ID, selected text columns joined with spaces) for each row"""
+    rows = []
+    for _, cap_row in capabilities_df.iterrows():
+        cap_text_parts = []
+        for col in cap_text_cols:
+            if pd.notna(cap_row[col]):
+                cap_text_parts.append(str(cap_row[col]))
+        rows.append((cap_row[cap_id_col], " ".join(cap_text_parts)))
+    return rows
+
+
+def capability_text_lookup(capabilities_df, cap_id_col, cap_text_cols):
+    """Map each capability ID to its text"""
+    return dict(capability_rows(capabilities_df, cap_id_col, cap_text_cols))
+
+
+def capabilities_prompt_text(capabilities_df, cap_id_col, cap_text_cols):
+    """Capability list in the "- ID: text" form used by the mapping prompts"""
+    return "\n".join(
+        f"- {cap_id}: {cap_text}"
+        for cap_id, cap_text in capability_rows(capabilities_df, cap_id_col, cap_text_cols)
+    )
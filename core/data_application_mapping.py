@@ -0,0 +1,154 @@
+"""Data entity to application mapping pipeline."""
+import pandas as pd
+from langchain_core.messages import HumanMessage
+
+from async_engine import run_async_tasks
+from checkpoints import job_settings
+
+
+def describe_row(row, description_columns):
+    """"Column: value" pairs joined with " | " (or a placeholder when all are empty)"""
+    descriptions = []
+    for desc_col in description_columns:
+        if pd.notna(row[desc_col]):
+            descriptions.append(f"{desc_col}: {str(row[desc_col])}")
+    return " | ".join(descriptions) if descriptions else "No description available"
+
+
+def build_applications(app_df, app_id_col, app_description_cols):
+    """Application records (id, name, description) to map"""
+    return [
+        {
+            'id': str(row[app_id_col]),
+            'name': str(row[app_id_col]),  # Use ID as name if no other identifier
+            'description': describe_row(row, app_description_cols),
+        }
+        for _, row in app_df.iterrows()
+    ]
+
+
+def build_entity_context(data_df, entity_id_col, entity_description_cols):
+    """Data entity catalogue text (same for all applications) and the valid entity IDs"""
+    entity_context = ""
+    valid_entity_ids = set()
+    for _, row in data_df.iterrows():
+        entity_id = str(row[entity_id_col])
+        valid_entity_ids.add(entity_id)
+        entity_context += f"{entity_id}: {describe_row(row, entity_description_cols)}\n"
+    return entity_context, valid_entity_ids
+
+
+async def map_application_data_entities(model, app_info, entity_context, valid_entity_ids):
+    """Map a single application to the data entities it touches."""
+    # Create application context
+    app_context = f"{app_info['id']}: {app_info['description']}"
+
+    # Create mapping prompt
+    mapping_prompt = f"""Application-to-Data Entity Mapping Analysis
+
+You are a solution architect evaluating how a single application fits into an organisation's enterprise data model. Your task is to identify all data entities that are meaningfully connected to the application based on how it is used in real business operations.
+
+APPLICATION CONTEXT:
+
+{app_context}
+
+DATA ENTITY CATALOGUE:
+
+{entity_context}
+
+TASK:
+
+List all Data Entity IDs that are relevant to this application. For each mapping, explain why the application interacts with or relies on that data entity. You should consider the full range of business functions the application performs—such as capturing user inputs, managing customer interactions, logging activities, supporting marketing efforts, or integrating with other systems.
+
+INSTRUCTIONS:
+
+• Focus only on the current application—do not reference other systems  
+• Include any data entities the application helps create, view, manage, use, or exchange  
+• Your goal is to build a comprehensive picture of how this application fits into the data landscape  
+• Base your reasoning on common enterprise usage patterns, integrations, and practical business processes  
+• If a data entity is not relevant, omit it
+
+OUTPUT FORMAT:
+
+Present each mapping as a single line in the format:
+
+Data Entity ID | Reasoning
+
+EXAMPLE (for Calendly):
+
+DE014 | Calendly captures lead details when a prospect books a meeting, making it an important touchpoint in the sales funnel  
+DE020 | Meeting bookings scheduled via Calendly represent sales activities that should be tracked for performance and forecasting  
+DE033 | Booking actions in Calendly contribute to digital analytics events that measure engagement across channels  
+DE034 | Calendly booking links are often embedded in marketing campaigns, making them relevant to lead source attribution
+
+IMPORTANT:
+- Use only the exact Data Entity IDs from the list above
+- Be thorough and precise in your reasoning"""
+
+    # Call LangChain model
+    response = await model.ainvoke([HumanMessage(content=mapping_prompt)])
+    result = response.content.strip()
+
+    # Parse results into structured data
+    app_mappings = []
+
+    lines = result.split('\n')
+    for line in lines:
+        line = line.strip()
+        if ' | ' in line and not line.startswith('Data Entity ID'):
+            parts = line.split(' | ', 1)  # Split only on first occurrence
+            if len(parts) == 2:
+                data_entity_id = parts[0].strip()
+                reasoning = parts[1].strip()
+
+                # Validate data entity ID exists in our data
+                if data_entity_id in valid_entity_ids:
+                    app_mappings.append({
+                        'Data Entity ID': data_entity_id,
+                        'Application ID': app_info['id'],
+                        'Reasoning': reasoning
+                    })
+
+    return app_mappings
+
+
+def run_data_application_mapping(model, applications, entity_context, valid_entity_ids,
+                                 on_progress=None, on_app_error=None, max_concurrency=None):
+    """Map every application to data entities concurrently.
+
+    ``on_app_error(app_info, exception)`` is told about failed applications,
+    which contribute no mappings. Returns the mappings DataFrame with
+    sequential mapping IDs.
+    """
+    def handle_error(index, app_info, error):
+        if on_app_error is not None:
+            on_app_error(app_info, error)
+        return []
+
+    results = run_async_tasks(
+        applications,
+        lambda app_info: map_application_data_entities(model, app_info, entity_context, valid_entity_ids),
+        max_concurrency=max_concurrency,
+        on_progress=on_progress,
+        on_error=handle_error,
+        checkpoint=job_settings(model, "data-application-mapping", entity_context),
+    )
+
+    # Add mapping IDs to final data
+    mappings = [mapping for app_mappings in results for mapping in app_mappings]
+    for i, mapping in enumerate(mappings, 1):
+        mapping['Mapping ID'] = f"DAM{i:03d}"
+    return pd.DataFrame(mappings, columns=['Data Entity ID', 'Application ID', 'Reasoning', 'Mapping ID'])
+
+
+def mapping_workbook_sheets(mappings_df):
+    """Sheets of the data-application mapping download"""
+    summary_df = pd.DataFrame({
+        'Metric': ['Total Mappings', 'Unique Data Entities', 'Mapped Applications'],
+        'Count': [
+            len(mappings_df),
+            mappings_df['Data Entity ID'].nunique(),
+            mappings_df['Application ID'].nunique()
+        ]
+    })
+    return {'Data-Application Mappings': mappings_df, 'Summary': summary_df}
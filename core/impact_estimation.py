@@ -0,0 +1,166 @@
+"""Pain point business impact estimation pipeline."""
+import pandas as pd
+from langchain_core.messages import HumanMessage
+
+from app_config import pain_point_impact_estimation_prompt
+from batch_executor import DEFAULT_BATCH_RETRIES, concat_results, run_batches
+from checkpoints import job_settings
+from core.structured_output import item_key, request_keyed_results
+from core.token_budget import batches_for
+from core.workbook import percentage
+from model_routing import CONFIDENCE_COLUMN, CONFIDENCE_TOKENS_PER_ROW, parse_confidence, run_routed
+
+IMPACT_LEVELS = ['High', 'Medium', 'Low']
+# Expected answer length per pain point, for automatic batch sizing
+OUTPUT_TOKENS_PER_ROW = 10
+# Answer format when the fast model of a routed run is asked to rate its confidence
+CONFIDENCE_INSTRUCTION = (
+    'Also rate your confidence in each assessment from 0 to 1: make each value an object such as '
+    '{"level": "High", "confidence": 0.9} instead of the level alone.'
+)
+
+
+def build_context(context):
+    """Prompt context section and instruction for optional business context"""
+    if context and context.strip():
+        return (f"Business Context:\n{context}",
+                "Consider the business context provided when making your assessment.")
+    return ("No specific business context provided - use general business impact principles.",
+            "Use general business impact principles for your assessment.")
+
+
+def pain_point_batch_text(batch_df, id_column, description_columns):
+    """One "ID: description" line per pain point"""
+    batch_text = ""
+    for _, row in batch_df.iterrows():
+        # Combine description columns
+        description_parts = []
+        for col in description_columns:
+            if pd.notna(row[col]) and str(row[col]).strip():
+                description_parts.append(str(row[col]).strip())
+
+        combined_description = " | ".join(description_parts)
+        batch_text += f"{row[id_column]}: {combined_description}\n"
+    return batch_text
+
+
+def impact_level(value):
+    """Impact level named in one answer, or None when it is not a valid level"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().capitalize()
+    return value if value in IMPACT_LEVELS else None
+
+
+def rated_impact_level(value):
+    """(impact level, confidence) from one answer with a confidence rating, or None"""
+    if not isinstance(value, dict):
+        return None
+    level = impact_level(value.get("level"))
+    return None if level is None else (level, parse_confidence(value.get("confidence")))
+
+
+def estimate_impact_batch(model, batch_df, id_column, description_columns, context_section, context_instruction,
+                          with_confidence=False):
+    """Estimate the business impact for one batch of pain points.
+
+    The model answers with a JSON object keyed by pain point ID; pain points it
+    leaves out or rates with an unknown level are asked again. With
+    ``with_confidence`` the model also rates its confidence in each answer,
+    which is returned as ``Confidence`` (None for pain points it never answered).
+    """
+    if with_confidence:
+        context_instruction = f"{context_instruction}\n{CONFIDENCE_INSTRUCTION}"
+
+    def ask(rows_df, note):
+        prompt_input = pain_point_impact_estimation_prompt.format(
+            context_section=context_section,
+            context_instruction=f"{context_instruction}\n{note}" if note else context_instruction,
+            pain_points=pain_point_batch_text(rows_df, id_column, description_columns)
+        )
+        return model.invoke([HumanMessage(content=prompt_input)]).content
+
+    if with_confidence:
+        answers = request_keyed_results(ask, batch_df, id_column, rated_impact_level)
+        results = []
+        for pain_point_id in batch_df[id_column]:
+            level, confidence = answers.get(item_key(pain_point_id), ('Medium', None))
+            results.append({'Pain Point ID': pain_point_id, 'Business Impact': level, CONFIDENCE_COLUMN: confidence})
+        return results
+
+    answers = request_keyed_results(ask, batch_df, id_column, impact_level)
+    return [
+        {
+            'Pain Point ID': pain_point_id,
+            'Business Impact': answers.get(item_key(pain_point_id), 'Medium')  # Default fallback
+        }
+        for pain_point_id in batch_df[id_column]
+    ]
+
+
+def run_impact_estimation(model, df, id_column, description_columns, context, batch_size=10,
+                          on_progress=None, on_batch_error=None, max_workers=None, route=None):
+    """Estimate the impact of every pain point in ``df``.
+
+    A failing batch is retried and then split in half until the failing pain
+    points are isolated; ``on_batch_error(batch_index, exception, pain_point_ids)``
+    is told about each, and they fall back to 'Medium'. A ``batch_size`` of None sizes
+    batches from the model's token limits. With a ``model_routing.ModelRoute``
+    as ``route`` pain points go to its fast model first, and only those it is
+    unsure of, or fails on, are escalated to the strong model; ``model`` is then
+    unused. Returns the results DataFrame.
+    """
+    context_section, context_instruction = build_context(context)
+    prompt_header = pain_point_impact_estimation_prompt.format(
+        context_section=context_section, context_instruction=context_instruction, pain_points=""
+    )
+
+    def run_tier(tier_model, rows_df, with_confidence):
+        def handle_batch_error(index, batch_df, error):
+            # Failures on the fast model are escalated rather than reported
+            if on_batch_error is not None and not with_confidence:
+                on_batch_error(index, error, batch_df[id_column].tolist())
+            return [
+                dict({'Pain Point ID': pain_point_id, 'Business Impact': 'Medium'},  # Default fallback
+                     **({CONFIDENCE_COLUMN: None} if with_confidence else {}))
+                for pain_point_id in batch_df[id_column]
+            ]
+
+        output_tokens = OUTPUT_TOKENS_PER_ROW + (CONFIDENCE_TOKENS_PER_ROW if with_confidence else 0)
+        # Send batches to the model concurrently; results come back in input order
+        batch_results = run_batches(
+            batches_for(rows_df, batch_size, description_columns, prompt_header, output_tokens, tier_model),
+            lambda batch_df: estimate_impact_batch(
+                tier_model, batch_df, id_column, description_columns, context_section, context_instruction,
+                with_confidence=with_confidence,
+            ),
+            max_workers=max_workers,
+            on_progress=on_progress,
+            on_error=handle_batch_error,
+            combine=concat_results,
+            retries=DEFAULT_BATCH_RETRIES,
+            checkpoint=job_settings(tier_model, "impact-estimation", prompt_header, id_column, description_columns,
+                                    with_confidence),
+        )
+        columns = ['Pain Point ID', 'Business Impact'] + ([CONFIDENCE_COLUMN] if with_confidence else [])
+        return pd.DataFrame(concat_results(batch_results), columns=columns)
+
+    if route is not None:
+        return run_routed(route, df, id_column, 'Pain Point ID', run_tier)
+    return run_tier(model, df, False)
+
+
+def impact_counts(results_df):
+    counts = results_df['Business Impact'].value_counts()
+    return {level: int(counts.get(level, 0)) for level in IMPACT_LEVELS}
+
+
+def impact_workbook_sheets(results_df):
+    """Sheets of the impact assessment download"""
+    counts = impact_counts(results_df)
+    summary_df = pd.DataFrame({
+        'Impact Level': IMPACT_LEVELS,
+        'Count': [counts[level] for level in IMPACT_LEVELS],
+        'Percentage': [percentage(counts[level], len(results_df)) for level in IMPACT_LEVELS],
+    })
+    return {'Impact Assessment': results_df, 'Summary': summary_df}
@@ -0,0 +1,197 @@
+"""Pain point to capability mapping pipeline."""
+import pandas as pd
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from batch_executor import run_batches
+from checkpoints import job_settings
+from core.capabilities import capabilities_prompt_text, capability_text_lookup
+from core.retrieval import (
+    DEFAULT_TARGET_PRECISION, CapabilityIndex, calibrate_threshold, row_texts, shortlisted_capabilities,
+)
+from core.token_budget import batches_for
+from prompts import PAIN_POINT_CAPABILITY_MAPPING_BATCH_PROMPT, PAIN_POINT_CAPABILITY_MAPPING_SYSTEM_PROMPT
+
+# Expected answer length per pain point, for automatic batch sizing
+OUTPUT_TOKENS_PER_ROW = 15
+
+
+def map_pain_point_batch(model, batch_df, pain_id_col, pain_text_cols, capabilities_text, additional_context):
+    """Map one batch of pain points to capabilities"""
+    # Build prompt using template
+    pain_points_text = ""
+    for _, pain_row in batch_df.iterrows():
+        pain_id = pain_row[pain_id_col]
+        pain_text_parts = []
+        for col in pain_text_cols:
+            if pd.notna(pain_row[col]):
+                pain_text_parts.append(str(pain_row[col]))
+        pain_text = " ".join(pain_text_parts)
+        pain_points_text += f"- {pain_id}: {pain_text}\n"
+
+    # Instructions and capability list first, identical across batches, so the provider can cache them
+    system_prompt = PAIN_POINT_CAPABILITY_MAPPING_SYSTEM_PROMPT.format(
+        capabilities=capabilities_text,
+        additional_context=additional_context,
+    )
+    batch_mapping_prompt = PAIN_POINT_CAPABILITY_MAPPING_BATCH_PROMPT.format(pain_points=pain_points_text)
+
+    # Get AI response for the batch
+    output = model.invoke([SystemMessage(content=system_prompt), HumanMessage(content=batch_mapping_prompt)])
+    batch_results = output.content.strip()
+
+    # Parse the batch results
+    mappings = []
+    for line in batch_results.split('\n'):
+        line = line.strip()
+        if '->' in line:
+            try:
+                pain_point_id, capability_id = line.split('->')
+                pain_point_id = pain_point_id.strip()
+                capability_id = capability_id.strip()
+
+                # Get the pain point text for reference
+                pain_text = ""
+                matching_rows = batch_df[batch_df[pain_id_col].astype(str) == str(pain_point_id)]
+                if not matching_rows.empty:
+                    # Concatenate selected pain point text columns
+                    pain_text_parts = []
+                    for col in pain_text_cols:
+                        if pd.notna(matching_rows.iloc[0][col]):
+                            pain_text_parts.append(str(matching_rows.iloc[0][col]))
+                    pain_text = ' '.join(pain_text_parts)
+
+                mappings.append({
+                    'Pain_Point_ID': pain_point_id,
+                    'Capability_ID': capability_id,
+                    'Pain_Point_Text': pain_text
+                })
+            except ValueError:
+                # Skip malformed lines
+                continue
+
+    return mappings
+
+
+def run_pain_point_capability_mapping(model, pain_points_df, pain_id_col, pain_text_cols,
+                                      capabilities_df, cap_id_col, cap_text_cols,
+                                      additional_context, batch_size=10,
+                                      on_progress=None, max_workers=None, shortlist_k=None):
+    """Map every pain point to capabilities and return the mappings DataFrame.
+
+    With ``shortlist_k`` each batch prompt lists only the capabilities among
+    the ``shortlist_k`` nearest (by embedding) to one of its pain points. A
+    ``batch_size`` of None sizes batches from the model's token limits.
+    """
+    # Capability list is the same for every batch, so build it once
+    capabilities_text = capabilities_prompt_text(capabilities_df, cap_id_col, cap_text_cols)
+    # Full catalogue header: an upper bound on the prompt when shortlisting
+    prompt_header = (
+        PAIN_POINT_CAPABILITY_MAPPING_SYSTEM_PROMPT.format(
+            capabilities=capabilities_text, additional_context=additional_context)
+        + PAIN_POINT_CAPABILITY_MAPPING_BATCH_PROMPT.format(pain_points="")
+    )
+    if shortlist_k:
+        capability_index = CapabilityIndex.from_dataframe(capabilities_df, cap_id_col, cap_text_cols)
+
+        def batch_capabilities_text(batch_df):
+            return capabilities_prompt_text(
+                shortlisted_capabilities(capability_index, capabilities_df, batch_df, pain_text_cols, shortlist_k),
+                cap_id_col, cap_text_cols,
+            )
+    else:
+        def batch_capabilities_text(batch_df):
+            return capabilities_text
+
+    # Send batches to the model concurrently; results come back in input order
+    batch_mappings = run_batches(
+        batches_for(pain_points_df, batch_size, pain_text_cols, prompt_header, OUTPUT_TOKENS_PER_ROW, model),
+        lambda batch_df: map_pain_point_batch(
+            model, batch_df, pain_id_col, pain_text_cols, batch_capabilities_text(batch_df), additional_context
+        ),
+        max_workers=max_workers,
+        on_progress=on_progress,
+        checkpoint=job_settings(model, "pain-point-capability-mapping", prompt_header, pain_id_col, pain_text_cols,
+                                capabilities_df, cap_id_col, cap_text_cols, shortlist_k),
+    )
+    mappings_df = pd.DataFrame(
+        [mapping for batch in batch_mappings for mapping in batch],
+        columns=['Pain_Point_ID', 'Capability_ID', 'Pain_Point_Text'],
+    )
+
+    # Add capability text for reference (concatenate selected columns)
+    cap_lookup = capability_text_lookup(capabilities_df, cap_id_col, cap_text_cols)
+    mappings_df['Capability_Text'] = mappings_df['Capability_ID'].map(cap_lookup)
+    return mappings_df
+
+
+def run_pain_point_capability_fast_mapping(model, pain_points_df, pain_id_col, pain_text_cols,
+                                           capabilities_df, cap_id_col, cap_text_cols,
+                                           additional_context, threshold, batch_size=10,
+                                           on_progress=None, max_workers=None, shortlist_k=None):
+    """Map pain points by embedding similarity, asking the LLM only about low-confidence rows.
+
+    Each pain point takes its most similar capability when the cosine similarity
+    is at least ``threshold``; the rest go through the normal LLM mapping. A
+    threshold of 0 maps everything without the LLM. Returns the same columns as
+    ``run_pain_point_capability_mapping``, in pain point order.
+    """
+    capability_index = CapabilityIndex.from_dataframe(capabilities_df, cap_id_col, cap_text_cols)
+    pain_texts = row_texts(pain_points_df, pain_text_cols)
+    positions, scores = capability_index.best_matches(pain_texts)
+    confident = (scores >= threshold) & (len(capability_index.cap_ids) > 0)
+
+    cap_ids = [str(capability_index.cap_ids[position]) for position in positions[confident]]
+    mappings_df = pd.DataFrame({
+        'Pain_Point_ID': pain_points_df[pain_id_col][confident].astype(str).to_numpy(),
+        'Capability_ID': cap_ids,
+        'Pain_Point_Text': [text for text, keep in zip(pain_texts, confident) if keep],
+        'Capability_Text': [capability_index.cap_texts[position] for position in positions[confident]],
+    })
+
+    uncertain_df = pain_points_df[~confident]
+    if not uncertain_df.empty:
+        llm_mappings_df = run_pain_point_capability_mapping(
+            model, uncertain_df, pain_id_col, pain_text_cols,
+            capabilities_df, cap_id_col, cap_text_cols,
+            additional_context, batch_size,
+            on_progress=on_progress, max_workers=max_workers, shortlist_k=shortlist_k,
+        )
+        mappings_df = pd.concat([mappings_df, llm_mappings_df], ignore_index=True)
+
+    # Restore input order so the export lines up with the uploaded pain points
+    order = {str(pain_id): i for i, pain_id in enumerate(pain_points_df[pain_id_col])}
+    mappings_df = mappings_df.iloc[
+        mappings_df['Pain_Point_ID'].astype(str).map(order).fillna(len(order)).argsort(kind='stable')
+    ]
+    return mappings_df.reset_index(drop=True)
+
+
+def calibrate_fast_mapping(pain_points_df, pain_id_col, pain_text_cols,
+                           capabilities_df, cap_id_col, cap_text_cols,
+                           reference_df, target_precision=DEFAULT_TARGET_PRECISION):
+    """Fast-mode threshold for the active embedding model, calibrated against known mappings.
+
+    ``reference_df`` holds trusted ``Pain_Point_ID``/``Capability_ID`` pairs,
+    such as a reviewed export of the normal mapping. Only pain points that
+    appear in it are scored. Returns the embedding model name, the threshold
+    (None when the target precision can't be reached), the precision and share
+    of rows mapped without the LLM at that threshold, and the rows compared.
+    """
+    reference = (reference_df.dropna(subset=['Pain_Point_ID', 'Capability_ID'])
+                 .astype({'Pain_Point_ID': str, 'Capability_ID': str})
+                 .groupby('Pain_Point_ID')['Capability_ID'].agg(set))
+    sample_df = pain_points_df[pain_points_df[pain_id_col].astype(str).isin(reference.index)]
+    capability_index = CapabilityIndex.from_dataframe(capabilities_df, cap_id_col, cap_text_cols)
+    positions, scores = capability_index.best_matches(row_texts(sample_df, pain_text_cols))
+    correct = [
+        bool(capability_index.cap_ids) and str(capability_index.cap_ids[position]) in reference[str(pain_id)]
+        for pain_id, position in zip(sample_df[pain_id_col], positions)
+    ]
+    threshold, precision, coverage = calibrate_threshold(scores, correct, target_precision)
+    return {
+        'embedding_model': capability_index.embedder.name,
+        'threshold': threshold,
+        'precision': precision,
+        'coverage': coverage,
+        'rows': len(sample_df),
+    }
@@ -0,0 +1,326 @@
+"""Embedding retrieval for shortlisting capabilities before LLM mapping.
+
+Capabilities are embedded once into a NumPy matrix of unit vectors and cached
+on disk under ``.cache/embeddings``, keyed by the embedding model and the
+catalogue text. Each batch of pain points, applications or strategies is then
+embedded and only its nearest capabilities are put in the prompt.
+
+Embeddings come from a local sentence-transformers model. Without that
+package, a hashed bag-of-words embedder can stand in when
+``retrieval.allow_lexical_fallback`` is set; it only matches shared words, so
+the pages and the CLI warn whenever it is in use.
+
+Fast mode's similarity threshold depends on the embedding model, so it is
+calibrated against reference mappings and stored per model under
+``retrieval.fast_mode_thresholds``.
+"""
+import hashlib
+import importlib.util
+import math
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from app_config import load_config, save_config
+from core.capabilities import capability_rows
+from llm_cache import CACHE_DIR
+
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_SHORTLIST_K = 15
+HASHING_DIMENSIONS = 1024
+DEFAULT_TARGET_PRECISION = 0.9
+# Memory for catalogue matrices kept between runs, in megabytes
+DEFAULT_MATRIX_CACHE_MB = 64
+# Query rows scored per matrix multiply, bounding the similarity matrix held in memory
+SIMILARITY_CHUNK_ROWS = 2048
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _normalise(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class EmbeddingsUnavailable(RuntimeError):
+    """sentence-transformers is missing and the lexical fallback is not enabled"""
+
+
+class HashingEmbedder:
+    """Hashed unigram/bigram counts; a dependency-free lexical fallback"""
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def embed(self, texts):
+        rows, columns = [], []
+        for row, text in enumerate(texts):
+            words = _WORD.findall(str(text).lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                rows.append(row)
+                columns.append(zlib.crc32(feature.encode("utf-8")) % self.dimensions)
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)), 1.0)
+        # Dampen repeated words so long descriptions don't dominate
+        return _normalise(np.log1p(vectors))
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model, loaded on first use"""
+
+    def __init__(self, model_name):
+        self.name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.name)
+        vectors = self._model.encode(list(texts), batch_size=64, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def embeddings_available():
+    """Whether the sentence-transformers package is installed"""
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+def lexical_fallback_allowed():
+    """Whether the hashing embedder may stand in when sentence-transformers is missing"""
+    return bool(load_config().get("retrieval", {}).get("allow_lexical_fallback", False))
+
+
+def embeddings_usable():
+    """Whether shortlists and fast mode can run, on a real model or the allowed fallback"""
+    return embeddings_available() or lexical_fallback_allowed()
+
+
+def embedding_warning():
+    """Why embedding matches are unreliable or unavailable here, or None when a real model is used"""
+    if embeddings_available():
+        return None
+    if lexical_fallback_allowed():
+        return ("sentence-transformers is not installed, so capabilities are matched on shared words only "
+                "(lexical fallback). Install it with `pip install sentence-transformers` for semantic matching.")
+    return ("sentence-transformers is not installed, so embedding shortlists and fast mode are unavailable. "
+            "Install it with `pip install sentence-transformers`, or set `allow_lexical_fallback` in the "
+            "`retrieval` section of model_config.json to match on shared words instead.")
+
+
+def active_embedding_model():
+    """Name of the embedder shortlists and fast mode would use, or None when embeddings are unavailable"""
+    if embeddings_available():
+        return load_config().get("retrieval", {}).get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+    if lexical_fallback_allowed():
+        return HashingEmbedder().name
+    return None
+
+
+def get_embedder(model_name=None):
+    """Shared embedder for ``model_name`` (default from the ``retrieval`` config section)"""
+    model_name = model_name or load_config().get("retrieval", {}).get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+    if not embeddings_available():
+        if not lexical_fallback_allowed():
+            raise EmbeddingsUnavailable(embedding_warning())
+        return HashingEmbedder()
+    with _embedders_lock:
+        if model_name not in _embedders:
+            _embedders[model_name] = SentenceTransformerEmbedder(model_name)
+        return _embedders[model_name]
+
+
+def load_matrix_cache_bytes():
+    """Memory the in-process catalogue matrix cache may hold, in bytes"""
+    try:
+        max_mb = float(load_config().get("retrieval", {}).get("matrix_cache_mb", DEFAULT_MATRIX_CACHE_MB))
+    except (TypeError, ValueError):
+        max_mb = DEFAULT_MATRIX_CACHE_MB
+    return max(0, int(max_mb * 1024 * 1024))
+
+
+class MatrixCache:
+    """Least-recently-used cache of catalogue matrices, bounded by their memory size"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        return None
+
+    def put(self, key, vectors):
+        with self._lock:
+            if self.max_bytes is None:
+                self.max_bytes = load_matrix_cache_bytes()
+            if key in self._entries or vectors.nbytes > self.max_bytes:
+                return
+            self._entries[key] = vectors
+            self._bytes += vectors.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_matrix_cache = MatrixCache()
+
+
+def embed_catalogue(texts, embedder):
+    """Embed a reference list, reusing vectors cached in memory or on disk"""
+    digest = hashlib.sha256(embedder.name.encode("utf-8"))
+    for text in texts:
+        digest.update(b"\x00")
+        digest.update(str(text).encode("utf-8"))
+    key = digest.hexdigest()
+    vectors = _matrix_cache.get(key)
+    if vectors is not None:
+        return vectors
+
+    path = os.path.join(EMBEDDING_CACHE_DIR, f"{key}.npy")
+    try:
+        vectors = np.load(path)
+    except (OSError, ValueError):
+        vectors = embedder.embed(texts)
+        try:
+            os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.save(f, vectors)
+            os.replace(temp_path, path)
+        except OSError:
+            pass  # Caching is an optimisation; a read-only disk just means re-embedding
+    _matrix_cache.put(key, vectors)
+    return vectors
+
+
+def row_texts(df, text_columns):
+    """Selected text columns of each row joined with spaces"""
+    return [
+        " ".join(str(value) for value in values if pd.notna(value))
+        for values in df[list(text_columns)].itertuples(index=False, name=None)
+    ]
+
+
+class CapabilityIndex:
+    """Capability catalogue as a matrix of unit vectors for nearest-neighbour lookups"""
+
+    def __init__(self, cap_ids, cap_texts, embedder=None):
+        self.embedder = embedder or get_embedder()
+        self.cap_ids = list(cap_ids)
+        self.cap_texts = list(cap_texts)
+        self.vectors = embed_catalogue(self.cap_texts, self.embedder)
+
+    @classmethod
+    def from_dataframe(cls, capabilities_df, cap_id_col, cap_text_cols, embedder=None):
+        rows = capability_rows(capabilities_df, cap_id_col, cap_text_cols)
+        return cls([cap_id for cap_id, _ in rows], [text for _, text in rows], embedder)
+
+    def similarities(self, texts):
+        """Cosine similarity of each text (rows) to each capability (columns)"""
+        return self.embedder.embed(texts) @ self.vectors.T
+
+    def top_k(self, texts, k):
+        """Positions of the ``k`` most similar capabilities for each text, best first"""
+        scores = self.similarities(texts)
+        k = min(k, scores.shape[1])
+        nearest = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(scores, nearest, axis=1).argsort(axis=1)[:, ::-1]
+        return np.take_along_axis(nearest, order, axis=1)
+
+    def best_matches(self, texts, chunk_size=SIMILARITY_CHUNK_ROWS):
+        """Position of the most similar capability and its cosine similarity for each text"""
+        positions = np.zeros(len(texts), dtype=np.int64)
+        scores = np.full(len(texts), -1.0, dtype=np.float32)
+        if not self.cap_ids:
+            return positions, scores
+        for start in range(0, len(texts), chunk_size):
+            chunk_scores = self.similarities(texts[start:start + chunk_size])
+            chunk_positions = chunk_scores.argmax(axis=1)
+            positions[start:start + len(chunk_positions)] = chunk_positions
+            scores[start:start + len(chunk_positions)] = chunk_scores[np.arange(len(chunk_positions)), chunk_positions]
+        return positions, scores
+
+    def shortlist(self, texts, k):
+        """Catalogue positions within the top ``k`` of any text, in catalogue order"""
+        if not texts or not self.cap_ids:
+            return []
+        return sorted(set(self.top_k(texts, k).ravel().tolist()))
+
+
+def shortlisted_capabilities(capability_index, capabilities_df, batch_df, text_columns, k):
+    """Rows of ``capabilities_df`` nearest to the rows of ``batch_df``"""
+    return capabilities_df.iloc[capability_index.shortlist(row_texts(batch_df, text_columns), k)]
+
+
+def load_shortlist_k():
+    """Default number of capabilities kept per item when shortlisting"""
+    try:
+        return max(1, int(load_config().get("retrieval", {}).get("top_k", DEFAULT_SHORTLIST_K)))
+    except (TypeError, ValueError):
+        return DEFAULT_SHORTLIST_K
+
+
+def load_fast_mode_threshold(model_name=None):
+    """Calibrated fast-mode threshold for ``model_name`` (default the active embedder), or None if uncalibrated"""
+    model_name = model_name or active_embedding_model()
+    thresholds = load_config().get("retrieval", {}).get("fast_mode_thresholds", {})
+    try:
+        return float(thresholds[model_name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def save_fast_mode_threshold(model_name, threshold):
+    """Store a calibrated fast-mode threshold for ``model_name`` in model_config.json"""
+    config = load_config()
+    retrieval = config.setdefault("retrieval", {})
+    # Round down so the rows scoring exactly the threshold still pass it
+    retrieval.setdefault("fast_mode_thresholds", {})[model_name] = math.floor(float(threshold) * 10000) / 10000
+    save_config(config)
+
+
+def calibrate_threshold(scores, correct, target_precision=DEFAULT_TARGET_PRECISION):
+    """Lowest similarity above which best matches are right ``target_precision`` of the time.
+
+    ``correct`` flags whether each row's best match agrees with the reference.
+    Returns the threshold (None when no cut-off reaches the target), the
+    precision above it and the share of rows it would map without the LLM.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if not len(scores):
+        return None, 0.0, 0.0
+    order = np.argsort(-scores, kind="stable")
+    ranked = scores[order]
+    precision = np.cumsum(np.asarray(correct, dtype=bool)[order]) / np.arange(1, len(ranked) + 1)
+    # Only cut between distinct scores: rows tied with the threshold are all taken
+    cut = np.append(ranked[:-1] > ranked[1:], True)
+    candidates = np.nonzero(cut & (precision >= target_precision))[0]
+    if not len(candidates):
+        return None, 0.0, 0.0
+    last = candidates[-1]
+    return float(ranked[last]), float(precision[last]), (last + 1) / len(ranked)
@@ -0,0 +1,140 @@
+"""Strategic initiative to capability mapping pipeline."""
+import re
+
+import pandas as pd
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from batch_executor import run_batches
+from checkpoints import job_settings
+from core.capabilities import capabilities_prompt_text
+from core.retrieval import CapabilityIndex, shortlisted_capabilities
+from core.token_budget import batches_for
+from prompts import STRATEGY_CAPABILITY_MAPPING_BATCH_PROMPT, STRATEGY_CAPABILITY_MAPPING_SYSTEM_PROMPT
+
+# Expected answer length per initiative, for automatic batch sizing
+OUTPUT_TOKENS_PER_ROW = 30
+
+
+def map_strategy_batch(model, batch_df, strategy_id_col, strategy_text_cols, capabilities_text, valid_cap_ids, additional_context):
+    """Map one batch of strategic initiatives to capabilities"""
+    # Build prompt using template
+    strategies_lines = []
+    for _, strategy_row in batch_df.iterrows():
+        strategy_id = strategy_row[strategy_id_col]
+        strategy_text_parts = []
+        for col in strategy_text_cols:
+            if pd.notna(strategy_row[col]):
+                strategy_text_parts.append(str(strategy_row[col]))
+        strategy_text = " ".join(strategy_text_parts)
+        strategies_lines.append(f"- {strategy_id}: {strategy_text}")
+    strategies_text = "\n".join(strategies_lines)
+
+    # Instructions and capability list first, identical across batches, so the provider can cache them
+    system_prompt = STRATEGY_CAPABILITY_MAPPING_SYSTEM_PROMPT.format(
+        capabilities_text=capabilities_text,
+        additional_context=additional_context,
+    )
+    batch_mapping_prompt = STRATEGY_CAPABILITY_MAPPING_BATCH_PROMPT.format(strategies_text=strategies_text)
+
+    # Get AI response for the batch
+    output = model.invoke([SystemMessage(content=system_prompt), HumanMessage(content=batch_mapping_prompt)])
+    batch_results = output.content.strip()
+
+    # Strategy IDs in this batch, used to validate the AI output
+    strategy_ids_in_batch = batch_df[strategy_id_col].astype(str).tolist()
+
+    # Parse the batch results
+    mappings = []
+    for line in batch_results.split('\n'):
+        line = line.strip()
+        if '->' in line:
+            try:
+                strategy_id, capability_ids = line.split('->', 1)
+                strategy_id = strategy_id.strip()
+                capability_ids = capability_ids.strip()
+
+                # Clean strategy_id - remove any leading dashes or other characters
+                # Only keep alphanumeric characters and common ID separators
+                strategy_id = re.sub(r'^[^a-zA-Z0-9]*', '', strategy_id)
+                strategy_id = re.sub(r'[^a-zA-Z0-9_\-\.]*$', '', strategy_id)
+
+                # Validate that this strategy_id exists in our data
+                if strategy_id not in strategy_ids_in_batch:
+                    continue  # Skip if strategy ID doesn't match our data
+
+                # Handle multiple capabilities or NONE
+                if capability_ids.upper() == 'NONE':
+                    # Strategy has no required capabilities - skip
+                    continue
+                else:
+                    # Split by comma for multiple capabilities
+                    cap_list = [cap.strip() for cap in capability_ids.split(',')]
+
+                    # Create one mapping entry for each capability
+                    for capability_id in cap_list:
+                        if capability_id:  # Ensure not empty
+                            # Clean capability_id - remove any leading/trailing characters
+                            capability_id = re.sub(r'^[^a-zA-Z0-9]*', '', capability_id)
+                            capability_id = re.sub(r'[^a-zA-Z0-9_\-\.]*$', '', capability_id)
+
+                            # Validate that this capability_id exists in our data
+                            if capability_id in valid_cap_ids:
+                                mappings.append({
+                                    'Strategic_Initiative_ID': strategy_id,
+                                    'Capability_ID': capability_id
+                                })
+            except ValueError:
+                # Skip malformed lines
+                continue
+
+    return mappings
+
+
+def run_strategy_capability_mapping(model, strategies_df, strategy_id_col, strategy_text_cols,
+                                    capabilities_df, cap_id_col, cap_text_cols, additional_context,
+                                    batch_size=10, on_progress=None, max_workers=None, shortlist_k=None):
+    """Map every strategic initiative to capabilities and return the mappings DataFrame.
+
+    With ``shortlist_k`` each batch prompt lists only the capabilities among
+    the ``shortlist_k`` nearest (by embedding) to one of its initiatives. A
+    ``batch_size`` of None sizes batches from the model's token limits.
+    """
+    # Capability list is the same for every batch, so build it once
+    capabilities_text = capabilities_prompt_text(capabilities_df, cap_id_col, cap_text_cols)
+    # Full catalogue header: an upper bound on the prompt when shortlisting
+    prompt_header = (
+        STRATEGY_CAPABILITY_MAPPING_SYSTEM_PROMPT.format(
+            capabilities_text=capabilities_text, additional_context=additional_context)
+        + STRATEGY_CAPABILITY_MAPPING_BATCH_PROMPT.format(strategies_text="")
+    )
+    if shortlist_k:
+        capability_index = CapabilityIndex.from_dataframe(capabilities_df, cap_id_col, cap_text_cols)
+
+        def batch_capabilities_text(batch_df):
+            return capabilities_prompt_text(
+                shortlisted_capabilities(capability_index, capabilities_df, batch_df, strategy_text_cols, shortlist_k),
+                cap_id_col, cap_text_cols,
+            )
+    else:
+        def batch_capabilities_text(batch_df):
+            return capabilities_text
+
+    # Get valid capability IDs from our data for validation
+    valid_cap_ids = set(capabilities_df[cap_id_col].astype(str).tolist())
+
+    # Send batches to the model concurrently; results come back in input order
+    batch_mappings = run_batches(
+        batches_for(strategies_df, batch_size, strategy_text_cols, prompt_header, OUTPUT_TOKENS_PER_ROW, model),
+        lambda batch_df: map_strategy_batch(
+            model, batch_df, strategy_id_col, strategy_text_cols,
+            batch_capabilities_text(batch_df), valid_cap_ids, additional_context
+        ),
+        max_workers=max_workers,
+        on_progress=on_progress,
+        checkpoint=job_settings(model, "strategy-capability-mapping", prompt_header, strategy_id_col,
+                                strategy_text_cols, capabilities_df, cap_id_col, cap_text_cols, shortlist_k),
+    )
+    return pd.DataFrame(
+        [mapping for batch in batch_mappings for mapping in batch],
+        columns=['Strategic_Initiative_ID', 'Capability_ID'],
+    )
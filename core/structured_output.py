@@ -0,0 +1,71 @@
+"""ID-keyed JSON answers for the batch tools.
+
+The model answers each batch with a JSON object keyed by input ID, so a row it
+skips or reorders affects only that row. Answers are validated against the
+batch, and only the IDs that are missing or invalid are sent again, in a
+smaller follow-up request, instead of re-running the batch. Each follow-up
+names its round and the IDs being asked again, so it is never the same prompt
+as an earlier round and can't be answered from the response cache.
+"""
+import json
+import re
+
+# Follow-up requests for rows missing from a batch answer
+MAX_REQUERY_ROUNDS = 2
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_json_object(text):
+    """The JSON object in a model answer (code fences and surrounding prose allowed), or {}"""
+    text = _FENCE.sub("", text.strip())
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end <= start:
+            return {}
+        try:
+            parsed = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def item_key(item_id):
+    """Key an input ID is matched on in the answer"""
+    return str(item_id).strip()
+
+
+def requery_note(round_number, item_ids):
+    """Instruction added to a follow-up request for the IDs the previous answer missed"""
+    return (f"Follow-up request {round_number}. Your previous answer left out, or gave an unusable answer "
+            f"for, these IDs - {', '.join(item_key(item_id) for item_id in item_ids)}. "
+            "Answer for every one of them in the same JSON format.")
+
+
+def request_keyed_results(ask, batch_df, id_column, validate, max_requery_rounds=MAX_REQUERY_ROUNDS):
+    """Valid answers for the rows of ``batch_df``, keyed by ``item_key`` of their ID.
+
+    ``ask(rows_df, note)`` sends those rows to the model, with ``note`` added to
+    the instructions, and returns the answer text; ``note`` is empty for the
+    first request and a ``requery_note`` for follow-ups. ``validate(value)``
+    returns the cleaned answer for one row, or None when it is unusable. Rows
+    missing or invalid in the answer are re-sent on their own, up to
+    ``max_requery_rounds`` times; rows still unanswered are left out.
+    """
+    results = {}
+    pending_df = batch_df
+    for round_number in range(max_requery_rounds + 1):
+        if pending_df.empty:
+            break
+        note = requery_note(round_number, pending_df[id_column]) if round_number else ""
+        answers = {item_key(key): value for key, value in parse_json_object(ask(pending_df, note)).items()}
+        for item_id in pending_df[id_column]:
+            key = item_key(item_id)
+            if key in answers and key not in results:
+                value = validate(answers[key])
+                if value is not None:
+                    results[key] = value
+        pending_df = pending_df[[item_key(item_id) not in results for item_id in pending_df[id_column]]]
+    return results
@@ -0,0 +1,192 @@
+"""Pain point theme and perspective mapping pipeline."""
+import pandas as pd
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from batch_executor import run_batches
+from checkpoints import job_settings
+from core.token_budget import batches_for
+from model_routing import CONFIDENCE_COLUMN, CONFIDENCE_TOKENS_PER_ROW, parse_confidence, run_routed
+from prompts import THEME_PERSPECTIVE_MAPPING_BATCH_PROMPT, THEME_PERSPECTIVE_MAPPING_SYSTEM_PROMPT
+
+# Predefined themes and perspectives
+PREDEFINED_THEMES = [
+    "Manual Processes", "No Single Source of Truth", "Skills & Capacity",
+    "Technology Limitations", "Vendor Dependency", "Risk & Compliance",
+    "Market Pressures", "Capacity Constraints", "Project Mobilisation",
+    "Governance & Decision-Making", "Integration / Data Silos", "Process Improvement",
+    "Technology Opportunity", "Cross-Service Alignment", "Budget & Investment",
+    "Culture & Change", "Capacity Planning", "Inefficient Governance",
+    "Process Timing", "Process Inconsistencies"
+]
+
+PREDEFINED_PERSPECTIVES = [
+    "Process", "Data / Information", "People", "Technology",
+    "Risk", "Market", "Governance"
+]
+
+# Expected answer length per pain point, for automatic batch sizing
+OUTPUT_TOKENS_PER_ROW = 25
+# Appended to the instructions when the fast model of a routed run rates its confidence
+CONFIDENCE_INSTRUCTION = """
+
+Also rate your confidence in each mapping from 0 to 1 at the end of its line:
+PAIN_POINT_ID -> THEME: [theme_name] | PERSPECTIVE: [perspective_name] | CONFIDENCE: [0-1]"""
+
+def map_theme_perspective_batch(model, batch_df, pain_id_col, pain_text_cols, themes_text, perspectives_text, additional_context,
+                                with_confidence=False):
+    """Map one batch of pain points to themes and perspectives
+
+    Returns the parsed mappings and the raw model response. With
+    ``with_confidence`` each mapping also carries the model's ``Confidence``,
+    None when the theme or perspective is not one of the predefined ones.
+    """
+    # Build prompt using template
+    pain_points_text = ""
+    for _, pain_row in batch_df.iterrows():
+        pain_id = pain_row[pain_id_col]
+        pain_text_parts = []
+        for col in pain_text_cols:
+            if pd.notna(pain_row[col]):
+                pain_text_parts.append(str(pain_row[col]))
+        pain_text = " ".join(pain_text_parts)
+        pain_points_text += f"- {pain_id}: {pain_text}\n"
+
+    # Instructions and theme/perspective lists first, identical across batches, so the provider can cache them
+    system_prompt = THEME_PERSPECTIVE_MAPPING_SYSTEM_PROMPT.format(
+        themes=themes_text,
+        perspectives=perspectives_text,
+        additional_context=additional_context,
+    )
+    if with_confidence:
+        system_prompt += CONFIDENCE_INSTRUCTION
+    batch_mapping_prompt = THEME_PERSPECTIVE_MAPPING_BATCH_PROMPT.format(pain_points=pain_points_text)
+
+    # Get AI response for the batch
+    output = model.invoke([SystemMessage(content=system_prompt), HumanMessage(content=batch_mapping_prompt)])
+    batch_results = output.content.strip()
+
+    # Parse the batch results
+    mappings = []
+    for line in batch_results.split('\n'):
+        line = line.strip()
+
+        # More flexible parsing - look for -> anywhere in the line
+        if '->' in line:
+            try:
+                # Split on '->' to get pain point ID and mapping
+                pain_point_part, mapping_part = line.split('->', 1)
+                pain_point_id = pain_point_part.strip()
+
+                # Clean up pain point ID - remove markdown formatting and extra characters
+                pain_point_id = pain_point_id.replace('**', '').replace('*', '').replace('`', '')
+                pain_point_id = pain_point_id.replace('"', '').replace("'", '').strip()
+
+                # Parse theme and perspective with more flexible approach
+                theme = "Unknown"
+                perspective = "Unknown"
+
+                # Try to find theme
+                if 'THEME:' in mapping_part.upper():
+                    # Find THEME: and extract until | or end
+                    theme_start = mapping_part.upper().find('THEME:') + 6
+                    theme_part = mapping_part[theme_start:]
+                    if '|' in theme_part:
+                        theme = theme_part.split('|')[0].strip()
+                    elif 'PERSPECTIVE:' in theme_part.upper():
+                        theme = theme_part.split('PERSPECTIVE:')[0].strip()
+                    else:
+                        theme = theme_part.strip()
+
+                    # Clean up theme
+                    theme = theme.replace('**', '').replace('*', '').replace('`', '')
+                    theme = theme.replace('"', '').replace("'", '').strip()
+
+                # Try to find perspective
+                if 'PERSPECTIVE:' in mapping_part.upper():
+                    perspective_start = mapping_part.upper().find('PERSPECTIVE:') + 12
+                    perspective = mapping_part[perspective_start:].split('|')[0].strip()
+
+                    # Clean up perspective
+                    perspective = perspective.replace('**', '').replace('*', '').replace('`', '')
+                    perspective = perspective.replace('"', '').replace("'", '').strip()
+
+                # Only add if we found both theme and perspective
+                if theme != "Unknown" and perspective != "Unknown":
+                    # Get the pain point text for reference
+                    pain_text = ""
+                    matching_rows = batch_df[batch_df[pain_id_col].astype(str) == str(pain_point_id)]
+                    if not matching_rows.empty:
+                        # Concatenate selected pain point text columns
+                        pain_text_parts = []
+                        for col in pain_text_cols:
+                            if pd.notna(matching_rows.iloc[0][col]):
+                                pain_text_parts.append(str(matching_rows.iloc[0][col]))
+                        pain_text = ' '.join(pain_text_parts)
+
+                    mapping = {
+                        'Pain_Point_ID': pain_point_id,
+                        'Theme': theme,
+                        'Perspective': perspective,
+                        'Pain_Point_Text': pain_text
+                    }
+                    if with_confidence:
+                        confidence = None
+                        if 'CONFIDENCE:' in mapping_part.upper():
+                            confidence_start = mapping_part.upper().find('CONFIDENCE:') + 11
+                            confidence = parse_confidence(mapping_part[confidence_start:].split('|')[0])
+                        # Off-list answers are treated as unsure so the strong model gets them
+                        if theme not in PREDEFINED_THEMES or perspective not in PREDEFINED_PERSPECTIVES:
+                            confidence = None
+                        mapping[CONFIDENCE_COLUMN] = confidence
+                    mappings.append(mapping)
+
+            except Exception:
+                # Skip malformed lines
+                continue
+
+    return mappings, batch_results
+
+
+def run_theme_perspective_mapping(model, pain_points_df, pain_id_col, pain_text_cols, additional_context,
+                                  batch_size=10, on_progress=None, max_workers=None, route=None):
+    """Map every pain point to a theme and perspective.
+
+    A ``batch_size`` of None sizes batches from the model's token limits. With a
+    ``model_routing.ModelRoute`` as ``route`` pain points go to its fast model
+    first, and only those it is unsure of, or leaves out, are escalated to the
+    strong model; ``model`` is then unused.
+    Returns the mappings DataFrame and the per-batch ``(mappings, raw_response)`` outputs.
+    """
+    themes_text = ", ".join(PREDEFINED_THEMES)
+    perspectives_text = ", ".join(PREDEFINED_PERSPECTIVES)
+    prompt_header = (
+        THEME_PERSPECTIVE_MAPPING_SYSTEM_PROMPT.format(
+            themes=themes_text, perspectives=perspectives_text, additional_context=additional_context)
+        + THEME_PERSPECTIVE_MAPPING_BATCH_PROMPT.format(pain_points="")
+    )
+    batch_outputs = []
+
+    def run_tier(tier_model, rows_df, with_confidence):
+        output_tokens = OUTPUT_TOKENS_PER_ROW + (CONFIDENCE_TOKENS_PER_ROW if with_confidence else 0)
+        # Send batches to the model concurrently; results come back in input order
+        tier_outputs = run_batches(
+            batches_for(rows_df, batch_size, pain_text_cols, prompt_header, output_tokens, tier_model),
+            lambda batch_df: map_theme_perspective_batch(
+                tier_model, batch_df, pain_id_col, pain_text_cols, themes_text, perspectives_text,
+                additional_context, with_confidence
+            ),
+            max_workers=max_workers,
+            on_progress=on_progress,
+            # A batch the fast model fails on is escalated
+            on_error=(lambda index, batch_df, error: ([], "")) if with_confidence else None,
+            checkpoint=job_settings(tier_model, "theme-mapping", prompt_header, pain_id_col, pain_text_cols,
+                                    with_confidence),
+        )
+        batch_outputs.extend(tier_outputs)
+        mappings = [mapping for batch_mappings, _ in tier_outputs for mapping in batch_mappings]
+        columns = ['Pain_Point_ID', 'Theme', 'Perspective', 'Pain_Point_Text']
+        return pd.DataFrame(mappings, columns=columns + ([CONFIDENCE_COLUMN] if with_confidence else []))
+
+    if route is not None:
+        return run_routed(route, pain_points_df, pain_id_col, 'Pain_Point_ID', run_tier), batch_outputs
+    return run_tier(model, pain_points_df, False), batch_outputs
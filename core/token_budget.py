@@ -0,0 +1,145 @@
+"""Token estimates and batch planning against the model's context window.
+
+``plan_batches`` packs consecutive rows into as few batches as possible while
+keeping each request within a share of the model's context window (fixed
+prompt header plus rows plus expected answer) and its answer within a share of
+the model's output limit, so large batches are not truncated. Token counts use
+tiktoken when it is installed and its vocabulary is available, and a
+four-characters-per-token estimate otherwise.
+"""
+import importlib.util
+import threading
+
+import pandas as pd
+
+from app_config import load_config
+from batch_executor import split_batches
+
+# (model name prefix, context window tokens, max output tokens); longest matching prefix wins
+MODEL_LIMITS = [
+    ("gpt-5", 400000, 128000),
+    ("gpt-4.1", 1047576, 32768),
+    ("gpt-4o-mini", 128000, 16384),
+    ("gpt-4o", 128000, 16384),
+    ("gpt-4-turbo", 128000, 4096),
+    ("gpt-4-0125", 128000, 4096),
+    ("gpt-4-1106", 128000, 4096),
+    ("gpt-4", 8192, 4096),
+    ("gpt-3.5-turbo-16k", 16385, 4096),
+    ("gpt-3.5-turbo", 16385, 4096),
+    ("o1-mini", 128000, 65536),
+    ("o1-preview", 128000, 32768),
+    ("o1", 200000, 100000),
+    ("o3", 200000, 100000),
+    ("o4-mini", 200000, 100000),
+]
+DEFAULT_LIMITS = (128000, 4096)
+
+DEFAULT_CONTEXT_SHARE = 0.5
+DEFAULT_OUTPUT_SHARE = 0.5
+# Very long batches degrade answer quality well before they hit the limits
+DEFAULT_MAX_BATCH_ROWS = 50
+# Bullet, ID and separators added around each row's text in the prompts
+ROW_OVERHEAD_TOKENS = 8
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def model_limits(model_name):
+    """(context window, max output tokens) for ``model_name``"""
+    name = (model_name or "").lower()
+    matches = [limits for limits in MODEL_LIMITS if name.startswith(limits[0])]
+    if not matches:
+        return DEFAULT_LIMITS
+    _, context_window, max_output = max(matches, key=lambda limits: len(limits[0]))
+    return context_window, max_output
+
+
+def model_name_of(model):
+    """Model name of a chat model, if it has one"""
+    return getattr(model, "model_name", None) or getattr(model, "model", None)
+
+
+def _encoding(model_name):
+    if importlib.util.find_spec("tiktoken") is None:
+        return None
+    import tiktoken
+    with _encodings_lock:
+        if model_name not in _encodings:
+            try:
+                try:
+                    _encodings[model_name] = tiktoken.encoding_for_model(model_name or "")
+                except KeyError:
+                    _encodings[model_name] = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                # tiktoken downloads its vocabularies on first use; offline, fall back to estimates
+                _encodings[model_name] = None
+        return _encodings[model_name]
+
+
+def count_tokens_batch(texts, model_name=None):
+    """Token count of each text"""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return [len(text) // 4 + 1 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+def count_tokens(text, model_name=None):
+    return count_tokens_batch([text], model_name)[0]
+
+
+def load_token_budget():
+    """Shares of the model limits a batch may use, from the ``token_budget`` config section"""
+    config = load_config().get("token_budget", {})
+    try:
+        return {
+            "context_share": float(config.get("context_share", DEFAULT_CONTEXT_SHARE)),
+            "output_share": float(config.get("output_share", DEFAULT_OUTPUT_SHARE)),
+            "max_batch_rows": max(1, int(config.get("max_batch_rows", DEFAULT_MAX_BATCH_ROWS))),
+        }
+    except (TypeError, ValueError):
+        return {"context_share": DEFAULT_CONTEXT_SHARE, "output_share": DEFAULT_OUTPUT_SHARE,
+                "max_batch_rows": DEFAULT_MAX_BATCH_ROWS}
+
+
+def plan_batches(df, text_columns, header_text, output_tokens_per_row, model_name=None):
+    """Split ``df`` into consecutive batches sized to the model's token limits.
+
+    ``header_text`` is the part of the prompt sent with every batch (instructions
+    and catalogue) and ``output_tokens_per_row`` the expected answer length per row.
+    A row too large for the budget on its own still gets a batch of its own.
+    """
+    if df.empty:
+        return []
+    budget = load_token_budget()
+    context_window, max_output = model_limits(model_name)
+    input_limit = int(context_window * budget["context_share"]) - count_tokens(header_text, model_name)
+    max_rows = min(budget["max_batch_rows"],
+                   max(1, int(max_output * budget["output_share"]) // max(1, output_tokens_per_row)))
+
+    row_texts = [
+        " ".join(str(value) for value in values if pd.notna(value))
+        for values in df[list(text_columns)].itertuples(index=False, name=None)
+    ]
+    row_costs = [tokens + ROW_OVERHEAD_TOKENS + output_tokens_per_row
+                 for tokens in count_tokens_batch(row_texts, model_name)]
+
+    batches = []
+    start, used = 0, 0
+    for position, cost in enumerate(row_costs):
+        rows = position - start
+        if rows and (rows >= max_rows or used + cost > input_limit):
+            batches.append(df.iloc[start:position])
+            start, used = position, 0
+        used += cost
+    batches.append(df.iloc[start:])
+    return batches
+
+
+def batches_for(df, batch_size, text_columns, header_text, output_tokens_per_row, model):
+    """Fixed ``batch_size`` slices, or a token-budget plan when ``batch_size`` is None"""
+    if batch_size:
+        return split_batches(df, batch_size)
+    return plan_batches(df, text_columns, header_text, output_tokens_per_row, model_name_of(model))
@@ -0,0 +1,135 @@
+"""AI use case evaluation pipeline: score each use case against a company context."""
+import re
+
+import pandas as pd
+from langchain_core.messages import HumanMessage
+
+from async_engine import run_async_tasks
+
+
+def build_use_cases(use_cases_df, id_column, desc_columns, separator=" | "):
+    """Use case records with concatenated descriptions; rows without a description are skipped"""
+    use_cases_data = []
+    for _, row in use_cases_df.iterrows():
+        use_case_id = row[id_column]
+
+        # Concatenate description columns
+        if len(desc_columns) == 1:
+            use_case_desc = str(row[desc_columns[0]]) if pd.notna(row[desc_columns[0]]) else ""
+        else:
+            desc_parts = [
+                str(row[col]) for col in desc_columns
+                if pd.notna(row[col]) and str(row[col]).strip()
+            ]
+            use_case_desc = separator.join(desc_parts)
+
+        if use_case_desc.strip():  # Only include if we have a description
+            use_cases_data.append({
+                'id': use_case_id,
+                'description': use_case_desc
+            })
+    return use_cases_data
+
+
+async def evaluate_use_case(model, company_summary, use_case):
+    """Score one use case (1-99) for the company, with reasoning"""
+    prompt = f"""You are an AI strategy consultant with deep expertise in AI implementation and business value assessment. You are evaluating AI use cases for a specific company to determine their potential benefit and strategic fit.
+
+Company Context:
+{company_summary}
+
+Use Case to Evaluate:
+ID: {use_case['id']}
+Description: {use_case['description']}
+
+IMPORTANT SCORING REQUIREMENTS:
+- You must provide a score between 1-100 (no use case can receive exactly 0 or 100)
+- Consider this company's specific context, industry, size, maturity, and strategic objectives
+- Provide nuanced scoring that reflects real-world implementation considerations
+
+Evaluation Criteria (consider all factors):
+1. Strategic Alignment: How well does this use case align with the company's business strategy and objectives?
+2. Industry Relevance: How applicable is this use case to the company's specific industry and market?
+3. Technical Feasibility: Given the company's likely technical maturity, how feasible is implementation?
+4. Business Impact Potential: What is the potential ROI, efficiency gains, or competitive advantage?
+5. Implementation Complexity: How complex would this be to implement given the company context?
+6. Resource Requirements: How well do the required resources align with the company's likely capabilities?
+7. Risk vs Reward: What is the risk-adjusted potential value for this specific company?
+
+Scoring Guidelines:
+- 1-20: Very Low Benefit (significant misalignment, major obstacles, minimal value potential)
+- 21-40: Low Benefit (poor fit, substantial challenges, limited value)
+- 41-60: Moderate Benefit (reasonable fit, manageable challenges, decent value potential)
+- 61-80: High Benefit (good strategic fit, achievable implementation, strong value potential)
+- 81-99: Very High Benefit (excellent alignment, high feasibility, exceptional value potential)
+
+Format your response exactly as follows:
+Score: [number between 1-99]
+Reasoning: [Provide a comprehensive explanation of your scoring decision, addressing the key evaluation criteria and how they apply to this specific company context. Explain both the potential benefits and any limitations or challenges that influenced your score.]"""
+
+    try:
+        response = await model.ainvoke([HumanMessage(content=prompt)])
+        response_text = response.content.strip()
+
+        # Extract score and reasoning with improved parsing
+        score = None
+        reasoning = ""
+
+        # Try multiple parsing strategies
+
+        # Strategy 1: Look for "Score: XX" pattern
+        score_pattern = r'Score:\s*(\d+)'
+        score_match = re.search(score_pattern, response_text, re.IGNORECASE)
+        if score_match:
+            score = int(score_match.group(1))
+            # Ensure score is within valid range (1-99)
+            if score < 1:
+                score = 1
+            elif score > 99:
+                score = 99
+
+        # Strategy 2: Look for reasoning section
+        reasoning_pattern = r'Reasoning:\s*(.*?)(?:\n\n|\Z)'
+        reasoning_match = re.search(reasoning_pattern, response_text, re.IGNORECASE | re.DOTALL)
+        if reasoning_match:
+            reasoning = reasoning_match.group(1).strip()
+
+        # Fallback: If no structured format found, try to extract any number and use full text
+        if score is None:
+            number_matches = re.findall(r'\b(\d{1,2})\b', response_text)
+            for num_str in number_matches:
+                num = int(num_str)
+                if 1 <= num <= 99:
+                    score = num
+                    break
+
+        if not reasoning and score is None:
+            # If we can't parse anything, use the full response as reasoning
+            reasoning = response_text[:500] + "..." if len(response_text) > 500 else response_text
+
+        return {
+            'use_case_id': use_case['id'],
+            'description': use_case['description'],
+            'score': score if score is not None else 50,  # Default to 50 if parsing fails
+            'explanation': reasoning.strip() or "No reasoning provided",
+            'raw_response': response_text  # Keep for debugging
+        }
+    except Exception as e:
+        return {
+            'use_case_id': use_case['id'],
+            'description': use_case['description'],
+            'score': 50,  # Default score on error
+            'explanation': f"Error during evaluation: {str(e)}"
+        }
+
+
+def evaluate_use_cases(model, company_summary, use_cases, max_concurrency=None, on_progress=None):
+    """Evaluate every use case concurrently and return the results sorted by score (highest first)"""
+    results = run_async_tasks(
+        use_cases,
+        lambda use_case: evaluate_use_case(model, company_summary, use_case),
+        max_concurrency=max_concurrency,
+        on_progress=on_progress,
+    )
+    results.sort(key=lambda x: x['score'], reverse=True)
+    return results
@@ -0,0 +1,32 @@
+"""Excel output shared by the pages and the CLI."""
+from io import BytesIO
+
+import pandas as pd
+
+from run_context import current_run
+from telemetry import RUN_METRICS_SHEET, run_metrics
+
+
+def write_workbook(target, sheets, run=None):
+    """Write ``{sheet_name: DataFrame}`` to a path or file-like object.
+
+    When ``run`` (default: the open tool run) made model calls, the export gets
+    its "Run Metrics" sheet.
+    """
+    run = run or current_run()
+    if run is not None and run.records and RUN_METRICS_SHEET not in sheets:
+        sheets = dict(sheets, **{RUN_METRICS_SHEET: run_metrics(run)})
+    with pd.ExcelWriter(target, engine="xlsxwriter") as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def workbook_bytes(sheets, run=None):
+    """Workbook contents as bytes, ready for ``st.download_button``"""
+    buffer = BytesIO()
+    write_workbook(buffer, sheets, run)
+    return buffer.getvalue()
+
+
+def percentage(count, total):
+    return f"{(count / total * 100):.1f}%" if total > 0 else "0%"
@@ -0,0 +1,215 @@
+"""Deterministic stand-in chat model for benchmarking and offline runs.
+
+``FakeChatModel`` recognises the prompts used by the toolkit pipelines and
+answers each one in the format its parser expects, using the IDs found in the
+prompt itself. Answers and latencies are derived from a hash of the prompt,
+so the same input always produces the same output. Select it by setting
+``"backend": "fake"`` in model_config.json; the ``fake_llm`` section sets
+the simulated latency. A leading system message seen before is reported as
+served from the prompt cache, as the provider would.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import zlib
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+# Like OpenAI's prompt caching: prefixes of at least 1,024 tokens, reused in 128-token steps
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+IMPACT_LEVELS = ["High", "Medium", "Low"]
+CATEGORIES = ["Application", "Technology", "Platform"]
+# Confidence ratings for prompts that ask for one; one in five falls below the default routing threshold
+CONFIDENCES = [0.95, 0.9, 0.85, 0.8, 0.55]
+
+
+def _section(prompt: str, start: str, end: Optional[str] = None) -> str:
+    """Text between the ``start`` marker and the next ``end`` marker"""
+    begin = prompt.find(start)
+    if begin < 0:
+        return ""
+    begin += len(start)
+    finish = prompt.find(end, begin) if end else -1
+    return prompt[begin:finish if finish >= 0 else len(prompt)]
+
+
+def _ids(section: str) -> List[str]:
+    """IDs from "ID: text" / "- ID: text" lines"""
+    ids = []
+    for line in section.splitlines():
+        line = line.strip()
+        if line.startswith("- "):
+            line = line[2:]
+        if line.startswith("ID: "):
+            line = line[4:]
+        item_id = line.split(":", 1)[0].split(" | ", 1)[0].strip()
+        if item_id and ":" in line:
+            ids.append(item_id)
+    return ids
+
+
+def _pick(rng: random.Random, options: List[str], count: int = 1) -> List[str]:
+    if not options:
+        return []
+    return rng.sample(options, min(count, len(options)))
+
+
+def _answered(prompt: str, item_ids: List[str], omit_share: float) -> List[str]:
+    """``item_ids`` less a deterministic ``omit_share`` of them, like a model skipping rows"""
+    if not omit_share:
+        return item_ids
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")) ^ 0x0B5E55ED)
+    return [item_id for item_id in item_ids if rng.random() >= omit_share]
+
+
+def fake_response(prompt: str, omit_share: float = 0.0) -> str:
+    """Format-correct canned answer for a toolkit prompt.
+
+    ``omit_share`` of the IDs are left out of ID-keyed JSON answers, to exercise
+    the follow-up requests for missing rows.
+    """
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+
+    if "theme and perspective from the provided lists" in prompt:
+        pain_ids = _ids(_section(prompt, "Pain Points to Map:", "Mappings:"))
+        themes = [t.strip() for t in _section(prompt, "Available Themes:", "Available Perspectives:").split(",")]
+        perspectives = [p.strip() for p in _section(prompt, "Available Perspectives:", "Additional Context:").split(",")]
+        rated = "| CONFIDENCE: [0-1]" in prompt
+        return "\n".join(
+            f"{pain_id} -> THEME: {rng.choice(themes)} | PERSPECTIVE: {rng.choice(perspectives)}"
+            + (f" | CONFIDENCE: {rng.choice(CONFIDENCES)}" if rated else "")
+            for pain_id in pain_ids
+        )
+
+    if "Match each pain point to the MOST APPROPRIATE capability" in prompt:
+        pain_ids = _ids(_section(prompt, "Pain Points to Match:", "Mappings:"))
+        cap_ids = _ids(_section(prompt, "Available Capabilities:", "Additional Context:"))
+        return "\n".join(f"{pain_id} -> {_pick(rng, cap_ids)[0]}" for pain_id in pain_ids if cap_ids)
+
+    if "Match each strategic initiative" in prompt:
+        strategy_ids = _ids(_section(prompt, "Strategic Initiatives to Match:", "Mappings:"))
+        cap_ids = _ids(_section(prompt, "Available Capabilities:", "Additional Context:"))
+        return "\n".join(
+            f"{strategy_id} -> {', '.join(_pick(rng, cap_ids, rng.randint(1, 3))) or 'NONE'}"
+            for strategy_id in strategy_ids
+        )
+
+    if "mapping software applications to a business-capability model" in prompt:
+        cap_ids = _ids(_section(prompt, "Available Capabilities:", "Applications to map:"))
+        app_ids = _answered(prompt, _ids(_section(prompt, "Applications to map:")), omit_share)
+        return json.dumps({app_id: _pick(rng, cap_ids, rng.randint(1, 3)) for app_id in app_ids})
+
+    if "enterprise-level impact assessment" in prompt:
+        pain_ids = _answered(prompt, _ids(_section(prompt, "Pain points to assess:")), omit_share)
+        if '"confidence"' in prompt:
+            return json.dumps({pain_id: {"level": rng.choice(IMPACT_LEVELS), "confidence": rng.choice(CONFIDENCES)}
+                               for pain_id in pain_ids})
+        return json.dumps({pain_id: rng.choice(IMPACT_LEVELS) for pain_id in pain_ids})
+
+    if "Application, Technology, or Platform" in prompt:
+        app_ids = _ids(_section(prompt, "Applications to categorise:"))
+        rated = "ApplicationID,Category,Confidence" in prompt
+        return "\n".join(f"{app_id},{rng.choice(CATEGORIES)}" + (f",{rng.choice(CONFIDENCES)}" if rated else "")
+                         for app_id in app_ids)
+
+    if "Application-to-Data Entity Mapping Analysis" in prompt:
+        entity_ids = _ids(_section(prompt, "DATA ENTITY CATALOGUE:", "TASK:"))
+        return "\n".join(
+            f"{entity_id} | The application creates and reads {entity_id} records as part of its core workflow"
+            for entity_id in _pick(rng, entity_ids, rng.randint(1, 4))
+        )
+
+    if "evaluating AI use cases" in prompt:
+        return (f"Score: {rng.randint(1, 99)}\n"
+                "Reasoning: Simulated assessment of strategic alignment, feasibility and business impact.")
+
+    return "Simulated response."
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that returns ``fake_response`` after a simulated, deterministic delay"""
+
+    latency_seconds: float = 0.0
+    latency_jitter_seconds: float = 0.0
+    # Share of rows left out of ID-keyed JSON answers
+    omit_share: float = 0.0
+
+    _wait_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _total_wait: float = PrivateAttr(default=0.0)
+    _calls: int = PrivateAttr(default=0)
+    _input_tokens: int = PrivateAttr(default=0)
+    _cached_tokens: int = PrivateAttr(default=0)
+    _seen_prefixes: set = PrivateAttr(default_factory=set)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"latency_seconds": self.latency_seconds, "latency_jitter_seconds": self.latency_jitter_seconds,
+                "omit_share": self.omit_share}
+
+    def _respond(self, messages: List[BaseMessage]):
+        prompt = "\n".join(str(message.content) for message in messages)
+        delay = self.latency_seconds
+        if self.latency_jitter_seconds:
+            delay += random.Random(zlib.crc32(prompt.encode("utf-8")) ^ 0x5F3759DF).uniform(
+                0, self.latency_jitter_seconds)
+        input_tokens = len(prompt) // 4
+        cached_tokens = 0
+        with self._wait_lock:
+            if messages and isinstance(messages[0], SystemMessage):
+                prefix_tokens = len(str(messages[0].content)) // 4
+                prefix_key = zlib.crc32(str(messages[0].content).encode("utf-8"))
+                if prefix_key in self._seen_prefixes and prefix_tokens >= CACHE_MIN_TOKENS:
+                    cached_tokens = prefix_tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+                self._seen_prefixes.add(prefix_key)
+            self._total_wait += delay
+            self._calls += 1
+            self._input_tokens += input_tokens
+            self._cached_tokens += cached_tokens
+        text = fake_response(prompt, self.omit_share)
+        message = AIMessage(content=text, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": len(text) // 4,
+            "total_tokens": input_tokens + len(text) // 4,
+            "input_token_details": {"cache_read": cached_tokens},
+        })
+        return delay, ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay, result = self._respond(messages)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay, result = self._respond(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+
+    def usage(self) -> dict:
+        """Calls made, total simulated LLM wait and simulated token counts so far"""
+        with self._wait_lock:
+            return {"calls": self._calls, "wait_seconds": self._total_wait,
+                    "input_tokens": self._input_tokens, "cached_tokens": self._cached_tokens}
+
+    def reset_usage(self) -> None:
+        with self._wait_lock:
+            self._calls = 0
+            self._total_wait = 0.0
+            self._input_tokens = 0
+            self._cached_tokens = 0
+            self._seen_prefixes.clear()
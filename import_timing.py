@@ -0,0 +1,96 @@
+"""Built-in import-time report, like ``python -X importtime``.
+
+``install`` wraps ``builtins.__import__`` so that every module loaded for the
+first time is timed: its cumulative time (including the modules it imports)
+and its self time (excluding them). ``timed_import`` does the same for
+modules loaded with ``importlib``, such as the page modules that navigation
+loads on first visit. ``import_times`` returns the records slowest first, for
+the Admin Tool page to show what each page and library costs at startup.
+
+main.py installs the hook before its other imports, so this module must not
+import anything heavy itself.
+"""
+import builtins
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+
+_original_import = builtins.__import__
+_records = {}
+_records_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _timed(name, load, trigger=None):
+    """Run ``load()``, recording ``name``'s cumulative and self time"""
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    # Modules pulled in by a page's import are attributed to that page
+    if trigger is None and parent is not None:
+        trigger = parent["trigger"]
+    frame = {"children": 0.0, "trigger": trigger}
+    stack.append(frame)
+    started = time.perf_counter()
+    try:
+        return load()
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        if parent is not None:
+            parent["children"] += elapsed
+        with _records_lock:
+            _records.setdefault(name, {
+                "module": name,
+                "cumulative_seconds": elapsed,
+                "self_seconds": max(0.0, elapsed - frame["children"]),
+                "trigger": trigger,
+            })
+
+
+def _absolute_name(name, globals, level):
+    if level == 0:
+        return name
+    package = (globals or {}).get("__package__") or (globals or {}).get("__name__", "")
+    try:
+        return importlib.util.resolve_name("." * level + name, package)
+    except (ImportError, ValueError):
+        return None
+
+
+def _timing_import(name, globals=None, locals=None, fromlist=(), level=0):
+    module_name = _absolute_name(name, globals, level)
+    if not module_name or module_name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    return _timed(module_name, lambda: _original_import(name, globals, locals, fromlist, level))
+
+
+def install():
+    """Start timing first-time imports; safe to call on every script rerun"""
+    if builtins.__import__ is not _timing_import:
+        builtins.__import__ = _timing_import
+
+
+def timed_import(module_name, trigger=None):
+    """``importlib.import_module`` with the load recorded against ``trigger``"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    return _timed(module_name, lambda: importlib.import_module(module_name), trigger)
+
+
+def import_times():
+    """Recorded imports, slowest cumulative time first"""
+    # Imported here so that loading this module before everything else stays cheap
+    import pandas as pd
+
+    with _records_lock:
+        records = list(_records.values())
+    df = pd.DataFrame(records, columns=["module", "cumulative_seconds", "self_seconds", "trigger"])
+    return df.sort_values("cumulative_seconds", ascending=False, ignore_index=True)
@@ -0,0 +1,199 @@
+"""Persistent, content-addressed cache for LLM responses.
+
+Every tool reruns its Streamlit script on each widget interaction, which used
+to resend identical prompts to OpenAI. ``SQLiteLLMCache`` plugs into
+LangChain's cache hook on the chat model: responses are stored in a SQLite
+file under the app directory, keyed by a SHA-256 hash of the model
+configuration (model name, temperature and other call parameters) and the
+full serialised message list. Entries are evicted by age and by total size,
+and hit/miss counters are kept alongside the entries.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from run_context import note_cache_hit
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "llm_cache.sqlite")
+
+DEFAULT_MAX_SIZE_MB = 200
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """Hash the model configuration and serialised prompt into a cache key"""
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    """Disk-backed LangChain cache with size/age eviction and hit/miss counters"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.path = path
+        self.max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.max_age_seconds = max_age_days * 24 * 3600 if max_age_days else None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                       key TEXT PRIMARY KEY,
+                       value TEXT NOT NULL,
+                       size INTEGER NOT NULL,
+                       created_at REAL NOT NULL,
+                       last_access REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _increment(self, conn, name: str) -> None:
+        conn.execute(
+            "INSERT INTO cache_stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.max_age_seconds and now - row[1] > self.max_age_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._increment(conn, "misses")
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._increment(conn, "hits")
+        try:
+            generations = _deserialise_generations(row[0])
+        except Exception:
+            # Entry written by an incompatible LangChain version - treat as a miss
+            return None
+        note_cache_hit()
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = make_cache_key(prompt, llm_string)
+        value = _serialise_generations(return_val)
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under the size limit"""
+        if self.max_age_seconds:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+        if self.max_bytes:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale_keys = []
+                for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access"):
+                    stale_keys.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale_keys)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+            conn.execute("DELETE FROM cache_stats")
+
+    def stats(self) -> dict:
+        """Entry count, stored bytes and hit/miss counters"""
+        with self._lock, self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "size_bytes": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+def _serialise_generations(generations) -> str:
+    records = []
+    for generation in generations:
+        if isinstance(generation, ChatGeneration):
+            records.append({"message": message_to_dict(generation.message),
+                            "generation_info": generation.generation_info})
+        else:
+            records.append({"text": generation.text,
+                            "generation_info": generation.generation_info})
+    return json.dumps(records)
+
+
+def _deserialise_generations(value: str) -> list:
+    generations = []
+    for record in json.loads(value):
+        if "message" in record:
+            message = messages_from_dict([record["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=record["generation_info"]))
+        else:
+            generations.append(Generation(text=record["text"], generation_info=record["generation_info"]))
+    return generations
+
+
+def build_llm_cache(config: dict) -> Optional[SQLiteLLMCache]:
+    """Create the response cache described by the ``llm_cache`` config section"""
+    cache_config = config.get("llm_cache", {})
+    if not cache_config.get("enabled", True):
+        return None
+    try:
+        return SQLiteLLMCache(
+            path=cache_config.get("path", DEFAULT_CACHE_PATH),
+            max_size_mb=cache_config.get("max_size_mb", DEFAULT_MAX_SIZE_MB),
+            max_age_days=cache_config.get("max_age_days", DEFAULT_MAX_AGE_DAYS),
+        )
+    except sqlite3.Error:
+        # A broken cache file must never stop the app from starting
+        return None
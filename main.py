@@ -1,8 +1,14 @@
-import openai
+import import_timing
+
+# Time the imports below and each page's first load for the Admin Tool report
+import_timing.install()
+
+import os
+
 import streamlit as st
-import pandas as pd
-from app_config import model
 from navigation import PAGE_ROUTES
+from background_jobs import render_jobs_strip
+from run_context import tool_scope
 
 # Configure Streamlit page settings - must be first Streamlit command
 st.set_page_config(
@@ -12,9 +18,10 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Ensure the OpenAI API key is configured only once
-if not openai.api_key:
-    openai.api_key = st.secrets.get("OPENAI_API_KEY")
+# Ensure the OpenAI API key is configured only once; the OpenAI client and
+# LangChain read it from the environment when a page first builds a model
+if not os.environ.get("OPENAI_API_KEY") and st.secrets.get("OPENAI_API_KEY"):
+    os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
 
 # Initialise session state for page navigation
 if "page" not in st.session_state:
@@ -35,8 +42,13 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# Progress of this session's background jobs, visible from every tool
+render_jobs_strip()
+
 # Page routing based on session state only
 route_func = PAGE_ROUTES.get(st.session_state.page)
 if route_func is None:
     route_func = PAGE_ROUTES["Home"]
-route_func()
+# Tool runs are opened when a tool is invoked; this only names the page in call telemetry
+with tool_scope(st.session_state.page):
+    route_func()
@@ -0,0 +1,46 @@
+"""Per-token prices of OpenAI models, used by the admin page and call telemetry."""
+
+
+def get_dynamic_pricing():
+    """Attempt to fetch dynamic pricing from OpenAI API (when available)"""
+    try:
+        # Note: OpenAI doesn't currently provide a public pricing API
+        # This is a placeholder for future implementation
+        # For now, we'll return None to indicate static pricing should be used
+        return None
+    except Exception:
+        return None
+
+
+def get_model_pricing():
+    """Get pricing information for OpenAI models with dynamic updates when possible"""
+    
+    # Try to get dynamic pricing first
+    dynamic_pricing = get_dynamic_pricing()
+    if dynamic_pricing:
+        return dynamic_pricing
+    
+    # Fallback to static pricing (updated August 2024)
+    # Pricing per 1M tokens (input/output) in USD
+    pricing = {
+        'o1-preview': {'input': 15.00, 'output': 60.00, 'reasoning': True, 'last_updated': '2024-08-04'},
+        'o1-mini': {'input': 3.00, 'output': 12.00, 'reasoning': True, 'last_updated': '2024-08-04'},
+        'o1': {'input': 15.00, 'output': 60.00, 'reasoning': True, 'last_updated': '2024-08-04'},  # o1 alias
+        'gpt-4o': {'input': 5.00, 'output': 15.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4o-mini': {'input': 0.15, 'output': 0.60, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4-turbo': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4-turbo-2024-04-09': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4-turbo-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4-0125-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4-1106-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4': {'input': 30.00, 'output': 60.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-4-0613': {'input': 30.00, 'output': 60.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-3.5-turbo': {'input': 0.50, 'output': 1.50, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-3.5-turbo-0125': {'input': 0.50, 'output': 1.50, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-3.5-turbo-1106': {'input': 1.00, 'output': 2.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        'gpt-3.5-turbo-16k': {'input': 3.00, 'output': 4.00, 'reasoning': False, 'last_updated': '2024-08-04'},
+        # Add some potential future/test models with estimated pricing
+        'gpt-4.1-nano-2025-04-14': {'input': 0.10, 'output': 0.30, 'reasoning': False, 'last_updated': '2024-08-04', 'experimental': True},
+        'gpt-4.1-mini-2025-04-14': {'input': 0.40, 'output': 1.60, 'reasoning': False, 'last_updated': '2025-04-14'},
+    }
+    return pricing
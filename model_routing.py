@@ -0,0 +1,132 @@
+"""Cheap-first model routing for the classification tools.
+
+With routing on, a tool sends every row to a fast, cheap model first and asks
+it to rate its confidence in each answer. Answers rated at least
+``min_confidence`` are kept; rows rated below it, or whose answer could not be
+parsed, are sent again to the strong model. Results record which model
+answered each row, so pages and the CLI can report the split.
+
+Models and the threshold come from the ``model_routing`` section of
+model_config.json, with per-tool overrides under ``tools``.
+"""
+import pandas as pd
+
+from app_config import get_model, load_config, load_model_config
+from core.structured_output import item_key
+
+DEFAULT_FAST_MODEL = "gpt-4.1-nano-2025-04-14"
+DEFAULT_STRONG_MODEL = "gpt-4.1-mini-2025-04-14"
+DEFAULT_MIN_CONFIDENCE = 0.7
+# Extra answer tokens per row for the confidence rating, for automatic batch sizing
+CONFIDENCE_TOKENS_PER_ROW = 6
+
+CONFIDENCE_COLUMN = "Confidence"
+ROUTED_COLUMN = "Answered By"
+FAST_TIER = "Fast model"
+STRONG_TIER = "Strong model"
+
+class ModelRoute:
+    """Fast and strong models for one tool, and the confidence a fast answer needs"""
+
+    def __init__(self, fast_model, strong_model, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                 fast_model_name=None, strong_model_name=None):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.min_confidence = min_confidence
+        self.fast_model_name = fast_model_name
+        self.strong_model_name = strong_model_name
+
+
+def load_routing_config(tool):
+    """Routing settings for ``tool``: enabled, fast_model, strong_model and min_confidence"""
+    config = load_config().get("model_routing", {})
+    settings = {
+        "enabled": False,
+        "fast_model": config.get("fast_model", DEFAULT_FAST_MODEL),
+        "strong_model": config.get("strong_model", DEFAULT_STRONG_MODEL),
+        "min_confidence": config.get("min_confidence", DEFAULT_MIN_CONFIDENCE),
+    }
+    settings.update(config.get("tools", {}).get(tool, {}))
+    try:
+        settings["min_confidence"] = min(1.0, max(0.0, float(settings["min_confidence"])))
+    except (TypeError, ValueError):
+        settings["min_confidence"] = DEFAULT_MIN_CONFIDENCE
+    settings["enabled"] = bool(settings["enabled"])
+    return settings
+
+
+def _chat_model(model_name):
+    """Shared chat model for ``model_name`` at the configured temperature"""
+    return get_model(model_name, load_model_config()[1])
+
+
+def model_route(tool):
+    """``ModelRoute`` for ``tool`` built from the config"""
+    settings = load_routing_config(tool)
+    return ModelRoute(
+        _chat_model(settings["fast_model"]), _chat_model(settings["strong_model"]), settings["min_confidence"],
+        fast_model_name=settings["fast_model"], strong_model_name=settings["strong_model"],
+    )
+
+
+def parse_confidence(value):
+    """Confidence between 0 and 1 from a model answer such as 0.8, "0.8", 80 or "80%", or None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip().rstrip("%").strip()
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return None
+    if confidence > 1:
+        confidence /= 100
+    return confidence if 0 <= confidence <= 1 else None
+
+
+def run_routed(route, df, id_column, result_id_column, run_tier):
+    """Results for ``df`` from the fast model, with low-confidence rows escalated.
+
+    ``run_tier(model, rows_df, with_confidence)`` runs the tool's pipeline and
+    returns its results DataFrame, keyed by ``result_id_column``; with
+    ``with_confidence`` it also has a ``Confidence`` column, None where the
+    answer could not be parsed. Returns the combined results in input order
+    with an ``Answered By`` column.
+    """
+    fast_df = run_tier(route.fast_model, df, True)
+    confidence = pd.to_numeric(fast_df[CONFIDENCE_COLUMN], errors="coerce") if not fast_df.empty \
+        else pd.Series(dtype=float)
+    accepted_df = fast_df[confidence >= route.min_confidence].drop(columns=CONFIDENCE_COLUMN)
+    accepted = {item_key(item_id) for item_id in accepted_df[result_id_column]} if not accepted_df.empty else set()
+
+    escalated_df = df[[item_key(item_id) not in accepted for item_id in df[id_column]]]
+    strong_df = run_tier(route.strong_model, escalated_df, False) if not escalated_df.empty else None
+
+    parts = [accepted_df.assign(**{ROUTED_COLUMN: FAST_TIER})]
+    if strong_df is not None:
+        parts.append(strong_df.assign(**{ROUTED_COLUMN: STRONG_TIER}))
+    results_df = pd.concat(parts, ignore_index=True)
+
+    # Back into input order
+    position = {item_key(item_id): index for index, item_id in enumerate(df[id_column])}
+    order = results_df[result_id_column].map(lambda item_id: position.get(item_key(item_id), len(position)))
+    return results_df.iloc[order.argsort(kind="stable")].reset_index(drop=True)
+
+
+def routing_split(results_df):
+    """Rows answered by each model, or None when the results were not routed"""
+    if ROUTED_COLUMN not in results_df.columns:
+        return None
+    counts = results_df[ROUTED_COLUMN].value_counts()
+    return {tier: int(counts.get(tier, 0)) for tier in (FAST_TIER, STRONG_TIER)}
+
+
+def routing_summary(results_df):
+    """One-line description of the fast/strong split, or None when the results were not routed"""
+    split = routing_split(results_df)
+    if split is None:
+        return None
+    total = sum(split.values())
+    share = split[FAST_TIER] / total * 100 if total else 0
+    return (f"{split[FAST_TIER]} of {total} rows ({share:.0f}%) answered by the fast model; "
+            f"{split[STRONG_TIER]} escalated to the strong model")
@@ -1,11 +1,12 @@
 import streamlit as st
-import json
-import os
 import openai
+import pandas as pd
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
-from app_config import model, load_model_config
-from navigation import render_breadcrumbs
+from app_config import get_llm_cache, get_model, load_config, load_model_config, load_max_concurrency, save_config
+from navigation import PAGE_ROUTES, render_breadcrumbs
+from import_timing import import_times
+from uploads import upload_cache
+from model_pricing import get_model_pricing
 
 
 def get_available_openai_models():
@@ -42,50 +43,6 @@ def get_available_openai_models():
         return fallback_models
 
 
-def get_dynamic_pricing():
-    """Attempt to fetch dynamic pricing from OpenAI API (when available)"""
-    try:
-        # Note: OpenAI doesn't currently provide a public pricing API
-        # This is a placeholder for future implementation
-        # For now, we'll return None to indicate static pricing should be used
-        return None
-    except Exception:
-        return None
-
-
-def get_model_pricing():
-    """Get pricing information for OpenAI models with dynamic updates when possible"""
-    
-    # Try to get dynamic pricing first
-    dynamic_pricing = get_dynamic_pricing()
-    if dynamic_pricing:
-        return dynamic_pricing
-    
-    # Fallback to static pricing (updated August 2024)
-    # Pricing per 1M tokens (input/output) in USD
-    pricing = {
-        'o1-preview': {'input': 15.00, 'output': 60.00, 'reasoning': True, 'last_updated': '2024-08-04'},
-        'o1-mini': {'input': 3.00, 'output': 12.00, 'reasoning': True, 'last_updated': '2024-08-04'},
-        'o1': {'input': 15.00, 'output': 60.00, 'reasoning': True, 'last_updated': '2024-08-04'},  # o1 alias
-        'gpt-4o': {'input': 5.00, 'output': 15.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4o-mini': {'input': 0.15, 'output': 0.60, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4-turbo': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4-turbo-2024-04-09': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4-turbo-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4-0125-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4-1106-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4': {'input': 30.00, 'output': 60.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-4-0613': {'input': 30.00, 'output': 60.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-3.5-turbo': {'input': 0.50, 'output': 1.50, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-3.5-turbo-0125': {'input': 0.50, 'output': 1.50, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-3.5-turbo-1106': {'input': 1.00, 'output': 2.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        'gpt-3.5-turbo-16k': {'input': 3.00, 'output': 4.00, 'reasoning': False, 'last_updated': '2024-08-04'},
-        # Add some potential future/test models with estimated pricing
-        'gpt-4.1-nano-2025-04-14': {'input': 0.10, 'output': 0.30, 'reasoning': False, 'last_updated': '2024-08-04', 'experimental': True},
-    }
-    return pricing
-
-
 def format_model_simple(model_name):
     """Format model name with simple information"""
     pricing = get_model_pricing()
@@ -105,29 +62,6 @@ def format_model_simple(model_name):
         return f"{model_name} ⚠️"
 
 
-def get_model_pricing():
-    """Get pricing information for OpenAI models (as of August 2024)"""
-    # Pricing per 1M tokens (input/output) in USD
-    pricing = {
-        'o1-preview': {'input': 15.00, 'output': 60.00, 'reasoning': True},
-        'o1-mini': {'input': 3.00, 'output': 12.00, 'reasoning': True},
-        'gpt-4o': {'input': 5.00, 'output': 15.00, 'reasoning': False},
-        'gpt-4o-mini': {'input': 0.15, 'output': 0.60, 'reasoning': False},
-        'gpt-4-turbo': {'input': 10.00, 'output': 30.00, 'reasoning': False},
-        'gpt-4-turbo-2024-04-09': {'input': 10.00, 'output': 30.00, 'reasoning': False},
-        'gpt-4-turbo-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False},
-        'gpt-4-0125-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False},
-        'gpt-4-1106-preview': {'input': 10.00, 'output': 30.00, 'reasoning': False},
-        'gpt-4': {'input': 30.00, 'output': 60.00, 'reasoning': False},
-        'gpt-4-0613': {'input': 30.00, 'output': 60.00, 'reasoning': False},
-        'gpt-3.5-turbo': {'input': 0.50, 'output': 1.50, 'reasoning': False},
-        'gpt-3.5-turbo-0125': {'input': 0.50, 'output': 1.50, 'reasoning': False},
-        'gpt-3.5-turbo-1106': {'input': 1.00, 'output': 2.00, 'reasoning': False},
-        'gpt-3.5-turbo-16k': {'input': 3.00, 'output': 4.00, 'reasoning': False},
-    }
-    return pricing
-
-
 def format_model_with_cost(model_name):
     """Format model name with cost information"""
     pricing = get_model_pricing()
@@ -156,16 +90,15 @@ def estimate_call_cost(model_name, input_tokens=1000, output_tokens=500):
     return None
 
 
-def save_model_config(model_name, temperature):
-    """Save model configuration to JSON file"""
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "model_config.json")
-    config = {
-        "openai_model": model_name,
-        "temperature": temperature
-    }
+def save_model_config(model_name, temperature, max_concurrency=None):
+    """Save model configuration to JSON file, keeping any other settings already in it"""
+    config = load_config()
+    config["openai_model"] = model_name
+    config["temperature"] = temperature
+    if max_concurrency is not None:
+        config["max_concurrency"] = int(max_concurrency)
     try:
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=4)
+        save_config(config)
         return True
     except Exception as e:
         st.error(f"Failed to save configuration: {e}")
@@ -180,6 +113,7 @@ def admin_tool_page():
     
     # Get current configuration
     current_model_name, current_temperature = load_model_config()
+    current_max_concurrency = load_max_concurrency()
     
     col1, col2 = st.columns(2)
     
@@ -242,13 +176,23 @@ def admin_tool_page():
             st.markdown("• Models are automatically sorted by cost (most economical first)")
             st.markdown("• This helps you choose budget-friendly options for your consulting work")
         
+        # Concurrency used by the batch tools
+        selected_max_concurrency = st.number_input(
+            "Concurrent requests:",
+            min_value=1,
+            max_value=32,
+            value=current_max_concurrency,
+            help="Maximum number of batches the mapping and categorisation tools send to the model at the same time."
+        )
+        
         # Save configuration button
-        config_changed = (selected_model != current_model_name)
+        config_changed = (selected_model != current_model_name or
+                          selected_max_concurrency != current_max_concurrency)
         
         if st.button("💾 Save Configuration", disabled=not config_changed, type="primary"):
-            if save_model_config(selected_model, current_temperature):  # Keep current temperature
+            if save_model_config(selected_model, current_temperature, selected_max_concurrency):  # Keep current temperature
                 st.success("✅ Configuration saved successfully!")
-                st.info("ℹ️ Please restart the application to apply changes.")
+                st.info("ℹ️ Changes apply from the next run.")
                 # Update session state to reflect changes
                 st.session_state['config_saved'] = True
             else:
@@ -258,11 +202,85 @@ def admin_tool_page():
         st.markdown("### Current Settings")
         st.info(f"**Active Model:** {current_model_name}")
         st.info(f"**Temperature:** {current_temperature}")
+        st.info(f"**Concurrent Requests:** {current_max_concurrency}")
         
         if config_changed:
             st.warning("⚠️ Unsaved changes detected")
             st.markdown(f"**Selected Model:** {selected_model}")
             st.markdown("**Temperature:** No change (kept current setting)")
+            st.markdown(f"**Concurrent Requests:** {selected_max_concurrency}")
+    
+    st.markdown("---")
+    
+    # Response Cache Section
+    st.markdown("## 🗄️ Response Cache")
+    
+    llm_cache = get_llm_cache()
+    if llm_cache is None:
+        st.info("Response caching is disabled in model_config.json.")
+    else:
+        st.caption("Identical prompts sent to the same model and temperature are answered from a local cache instead of the OpenAI API.")
+        cache_stats = llm_cache.stats()
+        col_entries, col_size, col_hits, col_misses = st.columns(4)
+        with col_entries:
+            st.metric("Cached Responses", cache_stats['entries'])
+        with col_size:
+            st.metric("Cache Size", f"{cache_stats['size_bytes'] / (1024 * 1024):.1f} MB")
+        with col_hits:
+            st.metric("Hits", cache_stats['hits'], help=f"Hit rate: {cache_stats['hit_rate']:.0%}")
+        with col_misses:
+            st.metric("Misses", cache_stats['misses'])
+        
+        if st.button("🧹 Clear Response Cache"):
+            llm_cache.clear()
+            st.success("✅ Response cache cleared")
+            st.rerun()
+    
+    st.markdown("---")
+    
+    # Upload Cache Section
+    st.markdown("## 📂 Upload Cache")
+    st.caption("Uploaded workbooks are parsed once per file content and sheet, so widget changes don't re-read them.")
+    upload_stats = upload_cache.stats()
+    col_sheets, col_memory, col_upload_hits, col_upload_misses = st.columns(4)
+    with col_sheets:
+        st.metric("Cached Sheets", upload_stats['entries'])
+    with col_memory:
+        st.metric("Memory", f"{upload_stats['size_bytes'] / (1024 * 1024):.1f} of {upload_cache.max_bytes / (1024 * 1024):.0f} MB")
+    with col_upload_hits:
+        st.metric("Hits", upload_stats['hits'])
+    with col_upload_misses:
+        st.metric("Parses", upload_stats['misses'])
+    
+    if st.button("🧹 Clear Upload Cache"):
+        upload_cache.clear()
+        st.success("✅ Upload cache cleared")
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # Import Times Section
+    st.markdown("## ⏱️ Import Times")
+    st.caption("Pages are loaded on first visit. These are the seconds each page and module took to import in this app process, "
+               "slowest first, to show what a cold start or a page's first visit costs.")
+    
+    if PAGE_ROUTES.load_seconds:
+        page_times = pd.DataFrame(
+            sorted(PAGE_ROUTES.load_seconds.items(), key=lambda item: item[1], reverse=True),
+            columns=["Page", "First Load (s)"],
+        )
+        st.dataframe(page_times.round(3), use_container_width=True, hide_index=True)
+    
+    module_times = import_times()
+    if module_times.empty:
+        st.info("No imports recorded yet.")
+    else:
+        module_times = module_times.rename(columns={
+            "module": "Module", "cumulative_seconds": "Cumulative (s)", "self_seconds": "Self (s)", "trigger": "Loaded For",
+        })
+        module_times["Loaded For"] = module_times["Loaded For"].fillna("Startup / other")
+        with st.expander(f"📦 Module Import Times ({len(module_times)} modules)", expanded=False):
+            st.dataframe(module_times.round(3), use_container_width=True, hide_index=True)
     
     st.markdown("---")
     
@@ -277,6 +295,7 @@ def admin_tool_page():
         st.error("❌ OpenAI API key not found in Streamlit secrets")
 
     # Display configured model name - try multiple methods for compatibility
+    model = get_model()
     model_name = None
     
     # Method 1: Try to get from model object attributes
@@ -318,8 +337,8 @@ def admin_tool_page():
     if st.button("🧪 Run Connectivity Test", type="primary"):
         with st.spinner("Testing connection to model..."):
             try:
-                # Import the current model from app_config to ensure we have the latest instance
-                from app_config import model as current_model
+                # Fetch the model for the current configuration to ensure we have the latest instance
+                current_model = get_model()
                 
                 # Validate that we have a proper model object
                 if not hasattr(current_model, 'invoke'):
@@ -1,10 +1,16 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from langchain_core.messages import HumanMessage
-from app_config import model
-from prompts import APPLICATION_CAPABILITY_MAPPING_PROMPT
+from app_config import get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_text_columns, read_upload_text_preview, upload_sheet_columns, upload_sheet_names
+from background_jobs import job_manager, render_job_outcome, track_job, tracked_job
+from core.application_capability_mapping import (
+    mapping_summary, mapping_workbook_sheets, run_application_capability_mapping,
+)
+from core.retrieval import embedding_warning, embeddings_usable, load_shortlist_k
+from core.workbook import workbook_bytes
+
+TOOL_NAME = "Application to Capability Mapping"
+JOB_KEY = "app_mapping_job"
 
 def application_capability_mapping_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -19,14 +25,13 @@ def application_capability_mapping_page():
     st.markdown("### 📱 Applications Data")
     applications_file = st.file_uploader("Choose Applications file", type=['xlsx', 'xls', 'xlsm'], key="applications_file_upload")
     
-    applications_df = None
+    app_columns = []
     app_sheet_names = []
     
     if applications_file is not None:
         # Read the Excel file and get sheet names
         try:
-            excel_data = pd.ExcelFile(applications_file)
-            app_sheet_names = excel_data.sheet_names
+            app_sheet_names = upload_sheet_names(applications_file)
         except Exception as e:
             st.error(f"Error reading Applications Excel file: {str(e)}")
             return
@@ -35,37 +40,27 @@ def application_capability_mapping_page():
         selected_app_sheet = st.selectbox("Select Applications sheet:", app_sheet_names, key="app_sheet_select")
         
         if selected_app_sheet:
-            # Read the selected sheet
-            applications_df = pd.read_excel(applications_file, sheet_name=selected_app_sheet)
-            
-            # Clean the dataframe to avoid PyArrow conversion issues
-            for col in applications_df.columns:
-                applications_df[col] = applications_df[col].astype(str)
-            applications_df = applications_df.replace('nan', pd.NA)
+            # Only the header row here; the selected columns are loaded once chosen
+            app_columns = upload_sheet_columns(applications_file, selected_app_sheet)
             
             st.markdown(f"**Applications Sheet:** {selected_app_sheet}")
-            st.markdown(f"**Rows:** {len(applications_df)} | **Columns:** {len(applications_df.columns)}")
+            st.markdown(f"**Columns:** {len(app_columns)}")
             
             # Show preview
             with st.expander("📋 Preview Applications Data", expanded=False):
-                preview_df = applications_df.head(10).copy()
-                for col in preview_df.columns:
-                    preview_df[col] = preview_df[col].astype(str)
-                preview_df = preview_df.replace('nan', '').replace('<NA>', '')
-                st.dataframe(preview_df)
+                st.dataframe(read_upload_text_preview(applications_file, selected_app_sheet))
     
     # Capabilities file upload
     st.markdown("### 🎯 Capabilities Data")
     capabilities_file = st.file_uploader("Choose Capabilities file", type=['xlsx', 'xls', 'xlsm'], key="capabilities_file_upload")
     
-    capabilities_df = None
+    cap_columns = []
     cap_sheet_names = []
     
     if capabilities_file is not None:
         # Read the Excel file and get sheet names
         try:
-            excel_data = pd.ExcelFile(capabilities_file)
-            cap_sheet_names = excel_data.sheet_names
+            cap_sheet_names = upload_sheet_names(capabilities_file)
         except Exception as e:
             st.error(f"Error reading Capabilities Excel file: {str(e)}")
             return
@@ -74,27 +69,18 @@ def application_capability_mapping_page():
         selected_cap_sheet = st.selectbox("Select Capabilities sheet:", cap_sheet_names, key="cap_sheet_select")
         
         if selected_cap_sheet:
-            # Read the selected sheet
-            capabilities_df = pd.read_excel(capabilities_file, sheet_name=selected_cap_sheet)
-            
-            # Clean the dataframe to avoid PyArrow conversion issues
-            for col in capabilities_df.columns:
-                capabilities_df[col] = capabilities_df[col].astype(str)
-            capabilities_df = capabilities_df.replace('nan', pd.NA)
+            # Only the header row here; the selected columns are loaded once chosen
+            cap_columns = upload_sheet_columns(capabilities_file, selected_cap_sheet)
             
             st.markdown(f"**Capabilities Sheet:** {selected_cap_sheet}")
-            st.markdown(f"**Rows:** {len(capabilities_df)} | **Columns:** {len(capabilities_df.columns)}")
+            st.markdown(f"**Columns:** {len(cap_columns)}")
             
             # Show preview
             with st.expander("📋 Preview Capabilities Data", expanded=False):
-                preview_df = capabilities_df.head(10).copy()
-                for col in preview_df.columns:
-                    preview_df[col] = preview_df[col].astype(str)
-                preview_df = preview_df.replace('nan', '').replace('<NA>', '')
-                st.dataframe(preview_df)
+                st.dataframe(read_upload_text_preview(capabilities_file, selected_cap_sheet))
     
     # Column selection (only show if both files are uploaded)
-    if applications_df is not None and capabilities_df is not None:
+    if app_columns and cap_columns:
         st.markdown("---")
         st.markdown("### 🔧 Column Selection")
         
@@ -105,14 +91,14 @@ def application_capability_mapping_page():
         with app_col1:
             app_id_column = st.selectbox(
                 "Select Applications ID Column:",
-                options=applications_df.columns.tolist(),
+                options=app_columns,
                 key="app_id_column"
             )
         
         with app_col2:
             app_description_columns = st.multiselect(
                 "Select Applications Description Column(s):",
-                options=[col for col in applications_df.columns.tolist() if col != app_id_column],
+                options=[col for col in app_columns if col != app_id_column],
                 key="app_description_columns"
             )
         
@@ -123,14 +109,14 @@ def application_capability_mapping_page():
         with cap_col1:
             cap_id_column = st.selectbox(
                 "Select Capabilities ID Column:",
-                options=capabilities_df.columns.tolist(),
+                options=cap_columns,
                 key="cap_id_column"
             )
         
         with cap_col2:
             cap_description_columns = st.multiselect(
                 "Select Capabilities Description Column(s):",
-                options=[col for col in capabilities_df.columns.tolist() if col != cap_id_column],
+                options=[col for col in cap_columns if col != cap_id_column],
                 key="cap_description_columns"
             )
         
@@ -138,6 +124,11 @@ def application_capability_mapping_page():
         if (app_id_column and app_description_columns and 
             cap_id_column and cap_description_columns):
             
+            applications_df = read_upload_text_columns(applications_file, selected_app_sheet,
+                                                       [app_id_column] + app_description_columns)
+            capabilities_df = read_upload_text_columns(capabilities_file, selected_cap_sheet,
+                                                       [cap_id_column] + cap_description_columns)
+            
             st.markdown("---")
             st.markdown("### 🏢 Additional Context")
             st.markdown("_Optionally provide additional context to improve mapping accuracy._")
@@ -179,161 +170,115 @@ def application_capability_mapping_page():
             with col_batch1:
                 batch_size = st.selectbox(
                     "Batch Size:",
-                    options=[5, 10, 15, 20, 25],
-                    index=1,  # Default to 10
-                    help="Number of applications to process in each batch. Smaller batches are more reliable but slower.",
+                    options=["Auto", 5, 10, 15, 20, 25],
+                    index=0,  # Default to sizing from the token budget
+                    help="Number of applications to process in each batch. Auto sizes batches from the model's "
+                         "token limits. Smaller batches are more reliable but slower.",
                     key="app_mapping_batch_size"
                 )
+                if batch_size == "Auto":
+                    batch_size = None
             
             with col_batch2:
-                estimated_batches = (len(applications_df) + batch_size - 1) // batch_size
-                st.metric("Estimated Batches", estimated_batches)
+                if batch_size:
+                    st.metric("Estimated Batches", (len(applications_df) + batch_size - 1) // batch_size)
+                else:
+                    st.metric("Estimated Batches", "Auto")
+
+            # Optional embedding shortlist for large capability catalogues
+            use_shortlist = st.checkbox(
+                "Shortlist capabilities with embeddings",
+                key="app_mapping_shortlist",
+                value=False,
+                help="Send each batch only the capabilities most similar to its applications instead of the whole catalogue. "
+                     "Cuts prompt size and latency on large capability models."
+            )
+            shortlist_k = None
+            if use_shortlist:
+                shortlist_k = st.number_input(
+                    "Capabilities shortlisted per application:",
+                    min_value=1, max_value=100, value=load_shortlist_k()
+                )
+                if embedding_warning():
+                    if embeddings_usable():
+                        st.warning(embedding_warning())
+                    else:
+                        st.error(embedding_warning())
             
             # Process button
-            if st.button("🚀 Start Application Mapping", key="start_app_mapping", type="primary"):
+            job = tracked_job(JOB_KEY)
+            running = job is not None and not job.finished_state
+            blocked = use_shortlist and not embeddings_usable()
+            if st.button("🚀 Start Application Mapping", key="start_app_mapping", type="primary",
+                         disabled=running or blocked):
                 process_application_mapping(
                     applications_df, app_id_column, app_description_columns,
                     capabilities_df, cap_id_column, cap_description_columns,
-                    additional_context, batch_size
+                    additional_context, batch_size, shortlist_k
                 )
 
+    # Shown even after the uploads are cleared by navigating away and back
+    show_application_mapping_job()
+
 def process_application_mapping(applications_df, app_id_column, app_description_columns,
                               capabilities_df, cap_id_column, cap_description_columns,
-                              additional_context, batch_size=10):
-    """Process applications and map them to capabilities"""
-    
-    st.markdown("### 🔄 Processing Application to Capability Mapping")
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    results = []
+                              additional_context, batch_size=None, shortlist_k=None):
+    """Submit the mapping as a background job so it survives reruns and navigation"""
     total_apps = len(applications_df)
-    
-    st.info(f"📊 Processing {total_apps} applications against {len(capabilities_df)} capabilities in batches of {batch_size}...")
-    
-    # Prepare capabilities lookup text
-    capabilities_text = ""
-    for _, cap_row in capabilities_df.iterrows():
-        cap_id = cap_row[cap_id_column]
-        cap_parts = []
-        for col in cap_description_columns:
-            if pd.notna(cap_row[col]) and str(cap_row[col]).strip():
-                cap_parts.append(str(cap_row[col]).strip())
-        
-        cap_description = " | ".join(cap_parts)
-        capabilities_text += f"{cap_id}: {cap_description}\n"
-    
-    # Create the mapping prompt header using template
-    context_section = ""
-    if additional_context and additional_context.strip():
-        context_section = f"\nAdditional Context:\n{additional_context}\n"
+    job = job_manager.submit(
+        TOOL_NAME, f"{total_apps} applications", run_application_mapping_job,
+        applications_df, app_id_column, app_description_columns,
+        capabilities_df, cap_id_column, cap_description_columns,
+        additional_context, batch_size, shortlist_k,
+    )
+    track_job(JOB_KEY, job)
 
-    mapping_prompt_header = APPLICATION_CAPABILITY_MAPPING_PROMPT.format(
-        capabilities=capabilities_text,
-        context_section=context_section,
+def run_application_mapping_job(job, applications_df, app_id_column, app_description_columns,
+                                capabilities_df, cap_id_column, cap_description_columns,
+                                additional_context, batch_size, shortlist_k):
+    """Run the mapping in a background job; the workbook is built here so it includes the run's metrics"""
+    def report_batch_error(index, error, item_ids):
+        job.report(f"❌ Error processing batch {index + 1}, applications {', '.join(str(item_id) for item_id in item_ids)}: {str(error)}")
+
+    results_df = run_application_capability_mapping(
+        get_model(), applications_df, app_id_column, app_description_columns,
+        capabilities_df, cap_id_column, cap_description_columns,
+        additional_context, batch_size,
+        on_progress=job.progress,
+        on_batch_error=report_batch_error,
+        shortlist_k=shortlist_k,
     )
+    return {
+        "results_df": results_df,
+        "total_apps": len(applications_df),
+        "workbook": workbook_bytes(mapping_workbook_sheets(results_df), job.run),
+    }
+
+def show_application_mapping_job():
+    """Progress of the session's mapping job, then its results"""
+    job = tracked_job(JOB_KEY)
+    if job is None:
+        return
     
-    total_batches = (total_apps + batch_size - 1) // batch_size
-    
-    for i in range(0, total_apps, batch_size):
-        batch_end = min(i + batch_size, total_apps)
-        batch_df = applications_df.iloc[i:batch_end]
-        current_batch = i // batch_size + 1
-        
-        # Prepare batch text
-        batch_text = ""
-        batch_app_ids = []
-        
-        for _, row in batch_df.iterrows():
-            app_id = row[app_id_column]
-            batch_app_ids.append(app_id)
-            
-            # Combine application description columns
-            app_parts = []
-            for col in app_description_columns:
-                if pd.notna(row[col]) and str(row[col]).strip():
-                    app_parts.append(str(row[col]).strip())
-            
-            app_description = " | ".join(app_parts)
-            batch_text += f"{app_id}: {app_description}\n"
-        
-        status_text.text(f"🔄 Processing batch {current_batch} of {total_batches} ({len(batch_df)} applications)...")
-        
-        try:
-            # Get AI response for the batch
-            messages = [HumanMessage(content=mapping_prompt_header + batch_text)]
-            response = model.invoke(messages)
-            mapping_results = response.content.strip().split('\n')
-            
-            # Parse results
-            for j, app_id in enumerate(batch_app_ids):
-                if j < len(mapping_results):
-                    mapping_text = mapping_results[j].strip()
-                    # Extract capability IDs from the response
-                    if ':' in mapping_text:
-                        capabilities_part = mapping_text.split(':', 1)[1].strip()
-                    else:
-                        capabilities_part = mapping_text
-                    
-                    if capabilities_part.upper() == 'NONE' or not capabilities_part:
-                        # No capabilities mapped
-                        results.append({
-                            'Application ID': app_id,
-                            'Capability ID': 'No mapping found'
-                        })
-                    else:
-                        # Parse multiple capability IDs
-                        capability_ids = [cap.strip() for cap in capabilities_part.split(',') if cap.strip()]
-                        if capability_ids:
-                            for cap_id in capability_ids:
-                                results.append({
-                                    'Application ID': app_id,
-                                    'Capability ID': cap_id
-                                })
-                        else:
-                            results.append({
-                                'Application ID': app_id,
-                                'Capability ID': 'No mapping found'
-                            })
-                else:
-                    # Default fallback
-                    results.append({
-                        'Application ID': app_id,
-                        'Capability ID': 'No mapping found'
-                    })
-        
-        except Exception as e:
-            st.error(f"❌ Error processing batch {current_batch}: {str(e)}")
-            # Add default results for this batch
-            for app_id in batch_app_ids:
-                results.append({
-                    'Application ID': app_id,
-                    'Capability ID': 'Processing error'
-                })
-        
-        # Update progress
-        progress = min((batch_end / total_apps), 1.0)
-        progress_bar.progress(progress)
-    
-    # Clear status
-    status_text.empty()
+    st.markdown("### 🔄 Processing Application to Capability Mapping")
     
-    # Create results DataFrame
-    results_df = pd.DataFrame(results)
+    if not render_job_outcome(job, "Application mapping"):
+        return
     
-    # Display results
-    progress_bar.progress(1.0)
+    results_df = job.result["results_df"]
+    total_apps = job.result["total_apps"]
+    st.progress(1.0)
     st.success(f"🎉 Successfully processed {total_apps} applications!")
     
     # Show results summary
     st.markdown("### 📊 Mapping Results Summary")
     
     # Calculate summary statistics
-    total_mappings = len(results_df)
-    unique_apps = results_df['Application ID'].nunique()
-    unique_caps = results_df[results_df['Capability ID'].notna()]['Capability ID'].nunique()
-    no_mapping_count = len(results_df[results_df['Capability ID'] == 'No mapping found'])
+    summary = mapping_summary(results_df)
+    total_mappings = summary['Total Mappings']
+    unique_apps = summary['Applications Processed']
+    unique_caps = summary['Capabilities Matched']
+    no_mapping_count = summary['No Mappings Found']
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -359,28 +304,9 @@ def process_application_mapping(applications_df, app_id_column, app_description_
     # Download button
     st.markdown("### ⬇️ Download Results")
     
-    # Create Excel file for download
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        results_df.to_excel(writer, sheet_name='Application Mappings', index=False)
-        
-        # Add summary sheet
-        summary_data = {
-            'Metric': ['Total Mappings', 'Applications Processed', 'Capabilities Matched', 'No Mappings Found'],
-            'Count': [total_mappings, unique_apps, unique_caps, no_mapping_count]
-        }
-        summary_df = pd.DataFrame(summary_data)
-        summary_df.to_excel(writer, sheet_name='Summary', index=False)
-        
-        # Add applications overview
-        app_mapping_counts = results_df.groupby('Application ID').size().reset_index(name='Mapping Count')
-        app_mapping_counts.to_excel(writer, sheet_name='Applications Overview', index=False)
-    
-    output.seek(0)
-    
     st.download_button(
         label="📊 Download Application Mapping Results",
-        data=output.getvalue(),
+        data=job.result["workbook"],
         file_name="application_capability_mapping.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         key="download_app_mapping_results"
@@ -1,10 +1,17 @@
 import streamlit as st
-import pandas as pd
 import math
-from io import BytesIO
-from langchain_core.messages import HumanMessage
-from app_config import model
+from app_config import get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_text_columns, read_upload_text_preview, upload_sheet_columns, upload_sheet_names
+from background_jobs import job_manager, render_job_outcome, track_job, tracked_job
+from core.application_categorisation import (
+    categorisation_workbook_sheets, category_counts, run_application_categorisation,
+)
+from core.workbook import workbook_bytes
+from model_routing import load_routing_config, model_route, routing_summary
+
+TOOL_NAME = "Application Categorisation"
+JOB_KEY = "app_categorisation_job"
 
 def application_categorization_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -50,24 +57,15 @@ def application_categorization_page():
     
     if uploaded_file is not None:
         try:
-            # Read the file
+            # Only the header row and a preview here; the selected columns are loaded once chosen
             if uploaded_file.type == "text/csv":
-                df = pd.read_csv(uploaded_file)
+                sheet_name = 0
             else:
-                xls = pd.ExcelFile(uploaded_file)
-                sheet_name = st.selectbox("Select sheet to load", xls.sheet_names)
-                df = pd.read_excel(xls, sheet_name=sheet_name)
-            
-            # Convert all columns to string to prevent PyArrow errors
-            df = df.astype(str)
-            df = df.replace('nan', pd.NA)
-            
-            # Create clean display data
-            display_df = df.copy()
-            display_df = display_df.fillna('')
+                sheet_name = st.selectbox("Select sheet to load", upload_sheet_names(uploaded_file))
+            columns = upload_sheet_columns(uploaded_file, sheet_name)
             
             st.markdown("### 📋 Data Preview")
-            st.dataframe(display_df.head(10))
+            st.dataframe(read_upload_text_preview(uploaded_file, sheet_name))
             
             # Column selection
             st.markdown("### 🔧 Column Selection")
@@ -77,18 +75,20 @@ def application_categorization_page():
             with col1:
                 id_column = st.selectbox(
                     "Select Application ID column:",
-                    df.columns.tolist(),
+                    columns,
                     help="Choose the column containing unique identifiers for each application"
                 )
             
             with col2:
                 description_columns = st.multiselect(
                     "Select description columns:",
-                    df.columns.tolist(),
+                    columns,
                     help="Choose one or more columns that describe the applications (will be combined for analysis)"
                 )
             
             if id_column and description_columns:
+                df = read_upload_text_columns(uploaded_file, sheet_name, [id_column] + description_columns)
+                
                 # Additional context section
                 st.markdown("### 📝 Additional Context (Optional)")
                 additional_context = st.text_area(
@@ -106,143 +106,100 @@ def application_categorization_page():
                 with col1:
                     batch_size = st.selectbox(
                         "Batch Size:",
-                        [5, 10, 15, 20, 25],
-                        index=1,
-                        help="Number of applications to process per batch. Smaller batches are more reliable but slower."
+                        ["Auto", 5, 10, 15, 20, 25],
+                        index=0,
+                        help="Number of applications to process per batch. Auto sizes batches from the model's "
+                             "token limits. Smaller batches are more reliable but slower."
                     )
+                    if batch_size == "Auto":
+                        batch_size = None
                 
                 with col2:
                     total_records = len(df)
-                    estimated_batches = math.ceil(total_records / batch_size)
-                    st.metric("Estimated Batches", estimated_batches)
+                    if batch_size:
+                        st.metric("Estimated Batches", math.ceil(total_records / batch_size))
+                    else:
+                        st.metric("Estimated Batches", "Auto")
+                
+                route_models = st.checkbox(
+                    "Try a faster model first",
+                    value=load_routing_config("application-categorisation")["enabled"],
+                    help="Categorise every application with the fast model first and send only those it is unsure "
+                         "of to the strong model. The models and confidence threshold are set in model_config.json."
+                )
                 
                 # Process button
-                if st.button("🚀 Categorise Applications", use_container_width=True):
+                job = tracked_job(JOB_KEY)
+                running = job is not None and not job.finished_state
+                if st.button("🚀 Categorise Applications", use_container_width=True, disabled=running):
                     if not description_columns:
                         st.error("❌ Please select at least one description column.")
                     else:
-                        categorise_applications(df, id_column, description_columns, additional_context, batch_size)
+                        categorise_applications(df, id_column, description_columns, additional_context, batch_size,
+                                                route_models)
         
         except Exception as e:
             st.error(f"❌ Error reading file: {str(e)}")
             st.error("Please ensure your file is a valid Excel or CSV file with proper formatting.")
 
-def categorise_applications(df, id_column, description_columns, additional_context, batch_size):
-    """Process application categorisation with AI"""
-    
-    # Prepare data
-    df_clean = df.copy()
-    
-    # Combine description columns
-    df_clean['combined_description'] = df_clean[description_columns].fillna('').agg(' | '.join, axis=1)
-    
-    # Create processing batches
-    total_records = len(df_clean)
-    num_batches = math.ceil(total_records / batch_size)
-    
-    results = []
-    
-    # Progress tracking
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    st.markdown("## 🔄 Processing Application Categorisation")
-    
-    if additional_context.strip():
-        st.info(f"ℹ️ Using additional context: {additional_context}")
-    
-    for batch_num in range(num_batches):
-        start_idx = batch_num * batch_size
-        end_idx = min((batch_num + 1) * batch_size, total_records)
-        batch_df = df_clean.iloc[start_idx:end_idx]
-        
-        status_text.text(f"Processing batch {batch_num + 1} of {num_batches} ({len(batch_df)} applications)")
-        
-        # Prepare batch data for AI
-        batch_data = []
-        for _, row in batch_df.iterrows():
-            app_id = row[id_column]
-            description = row['combined_description']
-            batch_data.append(f"ID: {app_id} | Description: {description}")
-        
-        batch_text = "\n".join(batch_data)
-        
-        # Create AI prompt
-        context_section = f"Additional Context: {additional_context}\n\n" if additional_context.strip() else ""
-        
-        prompt = f"""You are a senior enterprise architect with expertise in application portfolio management and technology categorisation.
-
-Analyse each application/system and categorise it as exactly one of: Application, Technology, or Platform.
+    # Shown even after the upload is cleared by navigating away and back
+    show_categorisation_job()
 
-{context_section}Definitions:
-- Application: A discrete software solution that delivers specific business functions to defined user groups. Has its own data, user interface, and logic. Maps to business capabilities (e.g., payroll processing, incident management).
-- Technology: Underlying technical building blocks—languages, frameworks, protocols, databases, devices, infrastructure services. Typically abstracted from end-users.
-- Platform: A managed environment bundling multiple technologies and shared services. Provides stable foundation for developing, deploying, and operating applications. Standardises common concerns like identity, integration, observability.
-
-Return ONLY the results in this exact format (one line per application):
-ApplicationID,Category
+def categorise_applications(df, id_column, description_columns, additional_context, batch_size, route_models=False):
+    """Submit the categorisation as a background job so it survives reruns and navigation"""
+    job = job_manager.submit(
+        TOOL_NAME, f"{len(df)} applications", run_categorisation_job,
+        df, id_column, description_columns, additional_context, batch_size, route_models,
+    )
+    track_job(JOB_KEY, job)
 
-Applications to categorise:
-{batch_text}"""
+def run_categorisation_job(job, df, id_column, description_columns, additional_context, batch_size, route_models):
+    """Run the categorisation in a background job; the workbook is built here so it includes the run's metrics"""
+    def report_batch_error(index, error, item_ids):
+        job.report(f"❌ Error processing batch {index + 1}, applications {', '.join(str(item_id) for item_id in item_ids)}: {str(error)}")
+    
+    results_df, unparsed_lines = run_application_categorisation(
+        get_model(), df, id_column, description_columns, additional_context, batch_size,
+        on_progress=job.progress,
+        on_batch_error=report_batch_error,
+        route=model_route("application-categorisation") if route_models else None,
+    )
+    return {
+        "results_df": results_df,
+        "unparsed_lines": unparsed_lines,
+        "additional_context": additional_context,
+        "workbook": workbook_bytes(categorisation_workbook_sheets(results_df), job.run),
+    }
 
-        try:
-            # Call AI model
-            message = HumanMessage(content=prompt)
-            response = model.invoke([message])
-            ai_response = response.content.strip()
-            
-            # Parse results
-            for line in ai_response.split('\n'):
-                line = line.strip()
-                if line and ',' in line:
-                    try:
-                        parts = line.split(',', 1)
-                        if len(parts) == 2:
-                            app_id = parts[0].strip()
-                            category = parts[1].strip()
-                            
-                            # Clean app_id - remove any leading characters
-                            import re
-                            app_id = re.sub(r'^[^a-zA-Z0-9]*', '', app_id)
-                            app_id = re.sub(r'[^a-zA-Z0-9_\-\.]*$', '', app_id)
-                            
-                            # Validate category
-                            if category in ['Application', 'Technology', 'Platform']:
-                                # Validate application ID exists in source data
-                                if app_id in df_clean[id_column].astype(str).values:
-                                    results.append({
-                                        'Application_ID': app_id,
-                                        'Category': category
-                                    })
-                    except Exception as e:
-                        st.warning(f"⚠️ Could not parse response line: {line}")
-                        continue
-        
-        except Exception as e:
-            st.error(f"❌ Error processing batch {batch_num + 1}: {str(e)}")
-            continue
-        
-        # Update progress
-        progress = (batch_num + 1) / num_batches
-        progress_bar.progress(progress)
+def show_categorisation_job():
+    """Progress of the session's categorisation job, then its results"""
+    job = tracked_job(JOB_KEY)
+    if job is None:
+        return
+    
+    st.markdown("## 🔄 Processing Application Categorisation")
     
-    # Clear progress indicators
-    progress_bar.empty()
-    status_text.empty()
+    if not render_job_outcome(job, "Application categorisation"):
+        return
+    
+    results_df = job.result["results_df"]
+    if job.result["additional_context"].strip():
+        st.info(f"ℹ️ Used additional context: {job.result['additional_context']}")
+    for line in job.result["unparsed_lines"]:
+        st.warning(f"⚠️ Could not parse response line: {line}")
     
     # Display results
-    if results:
-        results_df = pd.DataFrame(results)
-        
+    if not results_df.empty:
         st.markdown("## ✅ Categorisation Complete!")
         
         # Display metrics
         col1, col2, col3, col4 = st.columns(4)
         
+        counts = category_counts(results_df)
         total_categorised = len(results_df)
-        applications_count = len(results_df[results_df['Category'] == 'Application'])
-        technologies_count = len(results_df[results_df['Category'] == 'Technology'])
-        platforms_count = len(results_df[results_df['Category'] == 'Platform'])
+        applications_count = counts['Application']
+        technologies_count = counts['Technology']
+        platforms_count = counts['Platform']
         
         with col1:
             st.metric("Total Categorised", total_categorised)
@@ -257,39 +214,18 @@ Applications to categorise:
         st.markdown("### 📊 Categorisation Results")
         st.dataframe(results_df, use_container_width=True)
         
-        # Create Excel download
-        excel_buffer = BytesIO()
-        
-        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-            # Main results
-            results_df.to_excel(writer, sheet_name='Application_Categories', index=False)
-            
-            # Summary statistics
-            summary_data = {
-                'Category': ['Application', 'Technology', 'Platform', 'Total'],
-                'Count': [applications_count, technologies_count, platforms_count, total_categorised],
-                'Percentage': [
-                    f"{(applications_count/total_categorised*100):.1f}%" if total_categorised > 0 else "0%",
-                    f"{(technologies_count/total_categorised*100):.1f}%" if total_categorised > 0 else "0%",
-                    f"{(platforms_count/total_categorised*100):.1f}%" if total_categorised > 0 else "0%",
-                    "100%"
-                ]
-            }
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name='Summary', index=False)
-        
-        excel_buffer.seek(0)
-        
         # Download button
         st.download_button(
             label="📥 Download Categorisation Results",
-            data=excel_buffer.getvalue(),
+            data=job.result["workbook"],
             file_name="application_categorisation_results.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             use_container_width=True
         )
         
         st.success(f"✅ Successfully categorised {total_categorised} applications!")
+        if routing_summary(results_df):
+            st.info(f"🔀 {routing_summary(results_df)}")
         
     else:
         st.warning("⚠️ No valid categorisations were generated. Please check your data and try again.")
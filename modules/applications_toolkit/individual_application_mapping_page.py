@@ -1,9 +1,10 @@
 import streamlit as st
 import pandas as pd
 from langchain_core.messages import HumanMessage
-from app_config import model
+from app_config import get_model
 from prompts import INDIVIDUAL_APPLICATION_MAPPING_PROMPT
 from navigation import render_breadcrumbs
+from uploads import read_upload_sheet, upload_sheet_names
 
 def individual_application_mapping_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -37,9 +38,8 @@ def individual_application_mapping_page():
     
     if capabilities_file is not None:
         # Load capabilities file
-        xls = pd.ExcelFile(capabilities_file)
-        cap_sheet = st.selectbox("Select sheet for capabilities", xls.sheet_names, key="cap_sheet")
-        capabilities_df = pd.read_excel(xls, sheet_name=cap_sheet)
+        cap_sheet = st.selectbox("Select sheet for capabilities", upload_sheet_names(capabilities_file), key="cap_sheet")
+        capabilities_df = read_upload_sheet(capabilities_file, cap_sheet)
         st.session_state['capabilities_df'] = capabilities_df
         
         st.write("**Capabilities Preview:**")
@@ -154,7 +154,7 @@ def map_individual_application(capabilities_df, cap_id_col, cap_text_cols, app_n
         try:
             # Call AI model
             message = HumanMessage(content=prompt)
-            response = model.invoke([message])
+            response = get_model().invoke([message])
             ai_response = response.content.strip()
             
             # Display results
@@ -2,8 +2,29 @@ import streamlit as st
 import pandas as pd
 import io
 from langchain_core.messages import HumanMessage
-from app_config import model
+from app_config import get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_csv, read_upload_sheet, upload_sheet_names
+from streaming import LiveTable, stream_response
+
+
+def category_line_parser(table):
+    """Line callback that adds each category to ``table`` once its applications line arrives"""
+    current = {}
+
+    def on_line(line):
+        line = line.strip()
+        if line.startswith("### "):
+            current.clear()
+            current["Category"] = line[4:].strip()
+        elif current and line.startswith("**Definition:**"):
+            current["Definition"] = line[len("**Definition:**"):].strip()
+        elif current and line.startswith("**Applications:**"):
+            current["Applications"] = line[len("**Applications:**"):].strip()
+            table.add(dict(current))
+            current.clear()
+
+    return on_line
 
 
 def logical_application_model_generator_page():
@@ -71,13 +92,12 @@ def logical_application_model_generator_page():
         try:
             # Handle different file types
             if apps_file.type == "text/csv":
-                applications_df = pd.read_csv(apps_file)
+                applications_df = read_upload_csv(apps_file)
                 available_sheets = ["CSV File"]
                 selected_sheet = "CSV File"
             else:
                 # For Excel files, get available sheets
-                excel_file = pd.ExcelFile(apps_file)
-                available_sheets = excel_file.sheet_names
+                available_sheets = upload_sheet_names(apps_file)
                 
                 # Sheet selection
                 st.markdown("#### Select Worksheet")
@@ -88,7 +108,7 @@ def logical_application_model_generator_page():
                 )
                 
                 # Load the selected sheet
-                applications_df = pd.read_excel(apps_file, sheet_name=selected_sheet)
+                applications_df = read_upload_sheet(apps_file, selected_sheet)
             
             st.success(f"✅ Loaded {len(applications_df)} rows from '{selected_sheet}'")
             
@@ -247,12 +267,11 @@ Format your response as:
 ## Architectural Analysis
 [Provide insights about the application portfolio, gaps, overlaps, recommendations]"""
 
-                    # Generate response
-                    response = model.invoke([HumanMessage(content=prompt)])
-                    
-                    # Display results
+                    # Stream the model in, filling the category table as each category completes
                     st.markdown("## 📊 Generated Logical Application Model")
-                    st.markdown(response.content)
+                    categories_table = LiveTable(st.empty(), ["Category", "Definition", "Applications"])
+                    model_text = stream_response(get_model(), [HumanMessage(content=prompt)], st.empty(),
+                                                 on_line=category_line_parser(categories_table))
                     
                     # Create downloadable summary
                     summary_data = {
@@ -274,6 +293,9 @@ Format your response as:
                         excel_buffer = io.BytesIO()
                         with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
                             summary_df.to_excel(writer, sheet_name='Applications', index=False)
+                            if categories_table.rows:
+                                pd.DataFrame(categories_table.rows, columns=categories_table.columns).to_excel(
+                                    writer, sheet_name='Categories', index=False)
                         
                         st.download_button(
                             label="📊 Download Applications Summary (Excel)",
@@ -287,7 +309,7 @@ Format your response as:
                         analysis_text = f"""Logical Application Model Analysis
 Generated: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}
 
-{response.content}
+{model_text}
 
 Application List:
 {apps_text}
@@ -2,8 +2,9 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 from langchain_core.messages import HumanMessage
-from app_config import capability_description_prompt, model
+from app_config import capability_description_prompt, get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_sheet, upload_sheet_names
 
 def capability_description_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -19,9 +20,8 @@ def capability_description_page():
     if uploaded_file is not None:
         try:
             # Read Excel file
-            xls = pd.ExcelFile(uploaded_file)
-            sheet_name = st.selectbox("Select sheet to load", xls.sheet_names)
-            dataframe = pd.read_excel(xls, sheet_name=sheet_name)
+            sheet_name = st.selectbox("Select sheet to load", upload_sheet_names(uploaded_file))
+            dataframe = read_upload_sheet(uploaded_file, sheet_name)
             
             st.markdown("#### Data Preview")
             st.dataframe(dataframe.head())
@@ -89,7 +89,7 @@ def capability_description_page():
                             )
                             
                             # Get AI response
-                            output = model.invoke([HumanMessage(content=_input)])
+                            output = get_model().invoke([HumanMessage(content=_input)])
                             descriptions = output.content
                             
                             # Store descriptions in session state
@@ -3,9 +3,11 @@ import pandas as pd
 import json
 import xml.etree.ElementTree as ET
 import io
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from navigation import render_breadcrumbs
-from app_config import model
+from uploads import read_upload_sheet, upload_sheet_names
+from app_config import get_model, load_max_async_concurrency
+from core.use_case_evaluation import build_use_cases, evaluate_use_cases
+from run_context import hedging_summary, tool_run
 from langchain_core.messages import HumanMessage
 
 
@@ -139,7 +141,7 @@ Keep it factual and focused - only the most critical information for AI use case
 
 Summary:"""
 
-                            summary_response = model.invoke([HumanMessage(content=summary_prompt)])
+                            summary_response = get_model().invoke([HumanMessage(content=summary_prompt)])
                             company_summary = summary_response.content.strip()
                             
                             # Cache the summary in session state
@@ -178,8 +180,7 @@ Summary:"""
     if use_cases_file is not None:
         try:
             # Read Excel file and get sheet names
-            excel_file = pd.ExcelFile(use_cases_file)
-            sheet_names = excel_file.sheet_names
+            sheet_names = upload_sheet_names(use_cases_file)
             
             st.markdown("### Select Sheet")
             selected_sheet = st.selectbox(
@@ -189,7 +190,7 @@ Summary:"""
             )
             
             # Read the selected sheet
-            use_cases_df = pd.read_excel(use_cases_file, sheet_name=selected_sheet)
+            use_cases_df = read_upload_sheet(use_cases_file, selected_sheet)
             
             # Show basic info about the data
             st.info(f"📊 Data shape: {use_cases_df.shape[0]} rows × {use_cases_df.shape[1]} columns")
@@ -273,176 +274,44 @@ Summary:"""
             st.markdown("Each use case will receive a detailed score and reasoning")
         
         with col_settings2:
-            max_workers = st.slider(
-                "Processing threads:",
+            max_concurrency = st.slider(
+                "Concurrent requests:",
                 min_value=1,
-                max_value=10,
-                value=1,  # Default to single thread to avoid context warnings
-                help="Number of parallel threads for processing. Use 1 to avoid threading warnings, or higher values for faster processing with multiple API calls."
+                max_value=100,
+                value=min(load_max_async_concurrency(), 100),
+                help="Number of use cases evaluated at the same time. Higher values finish faster but send more simultaneous API calls."
             )
         
         if st.button("🤖 Evaluate AI Use Cases", type="primary"):
             with st.spinner("Evaluating AI use cases based on your company context..."):
                 try:
-                    # Prepare use cases data with concatenated descriptions
-                    use_cases_data = []
-                    
                     # Determine separator if multiple description columns
                     separator = " | "  # Default
                     if len(desc_columns) > 1 and 'concat_separator' in locals():
                         separator = concat_separator
                     
-                    for _, row in use_cases_df.iterrows():
-                        use_case_id = row[id_column]
-                        
-                        # Concatenate description columns
-                        if len(desc_columns) == 1:
-                            use_case_desc = str(row[desc_columns[0]]) if pd.notna(row[desc_columns[0]]) else ""
-                        else:
-                            desc_parts = [
-                                str(row[col]) for col in desc_columns 
-                                if pd.notna(row[col]) and str(row[col]).strip()
-                            ]
-                            use_case_desc = separator.join(desc_parts)
-                        
-                        if use_case_desc.strip():  # Only include if we have a description
-                            use_cases_data.append({
-                                'id': use_case_id,
-                                'description': use_case_desc
-                            })
+                    use_cases_data = build_use_cases(use_cases_df, id_column, desc_columns, separator)
                     
-                    # Function to evaluate a single use case
-                    def evaluate_use_case(use_case):
-                        prompt = f"""You are an AI strategy consultant with deep expertise in AI implementation and business value assessment. You are evaluating AI use cases for a specific company to determine their potential benefit and strategic fit.
-
-Company Context:
-{company_summary}
-
-Use Case to Evaluate:
-ID: {use_case['id']}
-Description: {use_case['description']}
-
-IMPORTANT SCORING REQUIREMENTS:
-- You must provide a score between 1-100 (no use case can receive exactly 0 or 100)
-- Consider this company's specific context, industry, size, maturity, and strategic objectives
-- Provide nuanced scoring that reflects real-world implementation considerations
-
-Evaluation Criteria (consider all factors):
-1. Strategic Alignment: How well does this use case align with the company's business strategy and objectives?
-2. Industry Relevance: How applicable is this use case to the company's specific industry and market?
-3. Technical Feasibility: Given the company's likely technical maturity, how feasible is implementation?
-4. Business Impact Potential: What is the potential ROI, efficiency gains, or competitive advantage?
-5. Implementation Complexity: How complex would this be to implement given the company context?
-6. Resource Requirements: How well do the required resources align with the company's likely capabilities?
-7. Risk vs Reward: What is the risk-adjusted potential value for this specific company?
-
-Scoring Guidelines:
-- 1-20: Very Low Benefit (significant misalignment, major obstacles, minimal value potential)
-- 21-40: Low Benefit (poor fit, substantial challenges, limited value)
-- 41-60: Moderate Benefit (reasonable fit, manageable challenges, decent value potential)
-- 61-80: High Benefit (good strategic fit, achievable implementation, strong value potential)
-- 81-99: Very High Benefit (excellent alignment, high feasibility, exceptional value potential)
-
-Format your response exactly as follows:
-Score: [number between 1-99]
-Reasoning: [Provide a comprehensive explanation of your scoring decision, addressing the key evaluation criteria and how they apply to this specific company context. Explain both the potential benefits and any limitations or challenges that influenced your score.]"""
-
-                        try:
-                            response = model.invoke([HumanMessage(content=prompt)])
-                            response_text = response.content.strip()
-                            
-                            # Extract score and reasoning with improved parsing
-                            import re
-                            score = None
-                            reasoning = ""
-                            
-                            # Try multiple parsing strategies
-                            
-                            # Strategy 1: Look for "Score: XX" pattern
-                            score_pattern = r'Score:\s*(\d+)'
-                            score_match = re.search(score_pattern, response_text, re.IGNORECASE)
-                            if score_match:
-                                score = int(score_match.group(1))
-                                # Ensure score is within valid range (1-99)
-                                if score < 1:
-                                    score = 1
-                                elif score > 99:
-                                    score = 99
-                            
-                            # Strategy 2: Look for reasoning section
-                            reasoning_pattern = r'Reasoning:\s*(.*?)(?:\n\n|\Z)'
-                            reasoning_match = re.search(reasoning_pattern, response_text, re.IGNORECASE | re.DOTALL)
-                            if reasoning_match:
-                                reasoning = reasoning_match.group(1).strip()
-                            
-                            # Fallback: If no structured format found, try to extract any number and use full text
-                            if score is None:
-                                number_matches = re.findall(r'\b(\d{1,2})\b', response_text)
-                                for num_str in number_matches:
-                                    num = int(num_str)
-                                    if 1 <= num <= 99:
-                                        score = num
-                                        break
-                            
-                            if not reasoning and score is None:
-                                # If we can't parse anything, use the full response as reasoning
-                                reasoning = response_text[:500] + "..." if len(response_text) > 500 else response_text
-                            
-                            return {
-                                'use_case_id': use_case['id'],
-                                'description': use_case['description'],
-                                'score': score if score is not None else 50,  # Default to 50 if parsing fails
-                                'explanation': reasoning.strip() or "No reasoning provided",
-                                'raw_response': response_text  # Keep for debugging
-                            }
-                        except Exception as e:
-                            return {
-                                'use_case_id': use_case['id'],
-                                'description': use_case['description'],
-                                'score': 50,  # Default score on error
-                                'explanation': f"Error during evaluation: {str(e)}"
-                            }
-                    
-                    # Process use cases with progress tracking
-                    results = []
+                    # Process use cases concurrently with progress tracking
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    if max_workers == 1:
-                        # Sequential processing to avoid threading warnings
-                        for i, use_case in enumerate(use_cases_data):
-                            result = evaluate_use_case(use_case)
-                            results.append(result)
-                            
-                            # Update progress
-                            progress = (i + 1) / len(use_cases_data)
-                            progress_bar.progress(progress)
-                            status_text.text(f"Processed {i + 1}/{len(use_cases_data)} use cases...")
-                    else:
-                        # Parallel processing
-                        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                            # Submit all tasks
-                            future_to_use_case = {executor.submit(evaluate_use_case, uc): uc for uc in use_cases_data}
-                            
-                            # Process completed tasks
-                            completed = 0
-                            total = len(use_cases_data)
-                            
-                            for future in as_completed(future_to_use_case):
-                                result = future.result()
-                                results.append(result)
-                                completed += 1
-                                
-                                # Update progress
-                                progress_bar.progress(completed / total)
-                                status_text.text(f"Processed {completed}/{total} use cases...")
+                    def on_progress(completed, total):
+                        progress_bar.progress(completed / total)
+                        status_text.text(f"Processed {completed}/{total} use cases...")
+                    
+                    with tool_run("AI Use Case Customiser") as run:
+                        results = evaluate_use_cases(
+                            get_model(), company_summary, use_cases_data,
+                            max_concurrency=max_concurrency,
+                            on_progress=on_progress,
+                        )
                     
                     # Clear progress indicators
                     progress_bar.empty()
                     status_text.empty()
-                    
-                    # Sort results by score (highest to lowest)
-                    results.sort(key=lambda x: x['score'], reverse=True)
+                    if hedging_summary(run):
+                        st.caption(f"⚡ {hedging_summary(run)}")
                     
                     # Display results
                     st.markdown("## 📊 AI Use Case Evaluation Results")
@@ -3,9 +3,9 @@ import pandas as pd
 import json
 from io import BytesIO
 from langchain_core.messages import HumanMessage
-from app_config import model
+from app_config import get_model
 from navigation import render_breadcrumbs
-import concurrent.futures
+from async_engine import run_async_tasks
 import threading
 import time
 # No warnings suppression needed with xlsxwriter engine
@@ -93,7 +93,7 @@ Instructions
                 
                 try:
                     # Call LangChain model to generate subject areas
-                    response = model.invoke([HumanMessage(content=base_prompt)])
+                    response = get_model().invoke([HumanMessage(content=base_prompt)])
                     subject_areas = response.content
                     
                     # Store in session state for iteration
@@ -158,11 +158,10 @@ Instructions
                 all_data_elements = []
                 
                 # Function to generate data elements for a single subject area
-                def generate_subject_area_elements(subject_area, index, dossier_content, additional_context):
+                async def generate_subject_area_elements(subject_area, index, dossier_content, additional_context):
                     """Generate data elements for a single subject area."""
-                    try:
-                        # Prepare specific prompt for this subject area
-                        elements_prompt = f"""Generate Key Data Entities for Subject Area: {subject_area}
+                    # Prepare specific prompt for this subject area
+                    elements_prompt = f"""Generate Key Data Entities for Subject Area: {subject_area}
 
 You are generating data entities for the "{subject_area}" subject area of a business organisation.
 
@@ -185,81 +184,69 @@ Example format:
 - Customer Profile: Contains comprehensive information about individual customers including contact details, preferences, and account status
 - Customer Segment: Defines customer categorisation based on demographics, behaviour, or value metrics
 - Customer Communication: Records of all interactions and communications with customers across different channels"""
+                    
+                    # Add dossier context for each subject area call
+                    if dossier_content:
+                        elements_prompt += f"\n\nCompany Dossier Context:\n{dossier_content}"
+                    
+                    if additional_context:
+                        elements_prompt += f"\n\nAdditional Context:\n{additional_context}"
+                    
+                    # Call LangChain model for this specific subject area
+                    response = await get_model().ainvoke([HumanMessage(content=elements_prompt)])
+                    subject_area_elements = response.content.strip()
+                    
+                    # Parse the entities for this subject area
+                    entity_lines = subject_area_elements.split('\n')
+                    subject_area_id = f"SA{index+1:02d}"
+                    subject_area_data = []
+                    
+                    for line in entity_lines:
+                        line = line.strip()
+                        # Clean formatting
+                        clean_line = line.replace('*', '').replace('#', '').replace('_', '').strip()
                         
-                        # Add dossier context for each subject area call
-                        if dossier_content:
-                            elements_prompt += f"\n\nCompany Dossier Context:\n{dossier_content}"
-                        
-                        if additional_context:
-                            elements_prompt += f"\n\nAdditional Context:\n{additional_context}"
-                        
-                        # Call LangChain model for this specific subject area
-                        response = model.invoke([HumanMessage(content=elements_prompt)])
-                        subject_area_elements = response.content.strip()
-                        
-                        # Parse the entities for this subject area
-                        entity_lines = subject_area_elements.split('\n')
-                        subject_area_id = f"SA{index+1:02d}"
-                        subject_area_data = []
-                        
-                        for line in entity_lines:
-                            line = line.strip()
-                            # Clean formatting
-                            clean_line = line.replace('*', '').replace('#', '').replace('_', '').strip()
-                            
-                            if (clean_line.startswith('- ') or clean_line.startswith('• ')) and ':' in clean_line:
-                                entity_part = clean_line[2:]  # Remove bullet
-                                if ':' in entity_part:
-                                    parts = entity_part.split(':', 1)
-                                    entity_name = parts[0].strip()
-                                    entity_desc = parts[1].strip()
-                                    
-                                    if entity_name and entity_desc:
-                                        subject_area_data.append({
-                                            'Subject Area ID': subject_area_id,
-                                            'Subject Area': subject_area,
-                                            'Data Entity': entity_name,
-                                            'Description': entity_desc,
-                                            'Index': index  # For sorting later
-                                        })
-                        
-                        return subject_area_data
-                        
-                    except Exception as e:
-                        st.error(f"Error generating data elements for {subject_area}: {str(e)}")
-                        return []
+                        if (clean_line.startswith('- ') or clean_line.startswith('• ')) and ':' in clean_line:
+                            entity_part = clean_line[2:]  # Remove bullet
+                            if ':' in entity_part:
+                                parts = entity_part.split(':', 1)
+                                entity_name = parts[0].strip()
+                                entity_desc = parts[1].strip()
+                                
+                                if entity_name and entity_desc:
+                                    subject_area_data.append({
+                                        'Subject Area ID': subject_area_id,
+                                        'Subject Area': subject_area,
+                                        'Data Entity': entity_name,
+                                        'Description': entity_desc,
+                                        'Index': index  # For sorting later
+                                    })
+                    
+                    return subject_area_data
                 
                 # Create progress bar
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
-                # Use ThreadPoolExecutor to process subject areas in parallel
-                with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(subject_areas_list), 5)) as executor:
-                    # Submit all tasks
-                    future_to_subject_area = {
-                        executor.submit(generate_subject_area_elements, subject_area, i, dossier_content, additional_context): (subject_area, i)
-                        for i, subject_area in enumerate(subject_areas_list)
-                    }
-                    
-                    completed_count = 0
-                    all_subject_area_data = []
-                    
-                    # Process completed futures
-                    for future in concurrent.futures.as_completed(future_to_subject_area):
-                        subject_area, index = future_to_subject_area[future]
-                        completed_count += 1
-                        
-                        try:
-                            subject_area_data = future.result()
-                            all_subject_area_data.extend(subject_area_data)
-                            
-                            # Update progress
-                            progress = completed_count / len(subject_areas_list)
-                            progress_bar.progress(progress)
-                            status_text.text(f"Completed {completed_count}/{len(subject_areas_list)} subject areas. Last: {subject_area}")
-                            
-                        except Exception as e:
-                            st.error(f"Error processing {subject_area}: {str(e)}")
+                def on_progress(completed, total):
+                    progress_bar.progress(completed / total)
+                    status_text.text(f"Completed {completed}/{total} subject areas")
+                
+                def on_error(index, indexed_subject_area, error):
+                    subject_area = indexed_subject_area[1]
+                    st.error(f"Error generating data elements for {subject_area}: {str(error)}")
+                    return []
+                
+                # Process subject areas concurrently on the async engine
+                results = run_async_tasks(
+                    list(enumerate(subject_areas_list)),
+                    lambda indexed_subject_area: generate_subject_area_elements(
+                        indexed_subject_area[1], indexed_subject_area[0], dossier_content, additional_context
+                    ),
+                    on_progress=on_progress,
+                    on_error=on_error,
+                )
+                all_subject_area_data = [element for subject_area_data in results for element in subject_area_data]
                 
                 # Sort by original index to maintain order and assign entity IDs
                 all_subject_area_data.sort(key=lambda x: x['Index'])
@@ -423,15 +410,13 @@ Example format:
                     df = st.session_state.data_elements_df
                     subject_areas = df['Subject Area'].unique().tolist()
                     
-                    all_relationships = []
-                    
                     # Generate relationships for each subject area individually
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    for i, subject_area in enumerate(subject_areas):
-                        status_text.text(f"Generating relationships for {subject_area}... ({i+1}/{len(subject_areas)})")
-                        
+                    # Build one prompt per subject area, then request them concurrently
+                    relationship_prompts = []
+                    for subject_area in subject_areas:
                         # Get entities for this subject area
                         subject_entities = df[df['Subject Area'] == subject_area]
                         entities_text = ""
@@ -483,19 +468,27 @@ IMPORTANT: Use only the exact entity names from the entities list provided above
                         if additional_context:
                             relationships_prompt += f"\n\nAdditional Context:\n{additional_context}"
                         
-                        try:
-                            # Call LangChain model for this specific subject area
-                            response = model.invoke([HumanMessage(content=relationships_prompt)])
-                            subject_area_relationships = response.content.strip()
-                            all_relationships.append(subject_area_relationships)
-                            
-                            # Update progress
-                            progress = (i + 1) / len(subject_areas)
-                            progress_bar.progress(progress)
-                            
-                        except Exception as e:
-                            st.error(f"Error generating relationships for {subject_area}: {str(e)}")
-                            continue
+                        relationship_prompts.append(relationships_prompt)
+                    
+                    async def generate_relationships(relationships_prompt):
+                        response = await get_model().ainvoke([HumanMessage(content=relationships_prompt)])
+                        return response.content.strip()
+                    
+                    def on_progress(completed, total):
+                        progress_bar.progress(completed / total)
+                        status_text.text(f"Generated relationships for {completed}/{total} subject areas")
+                    
+                    def on_error(index, relationships_prompt, error):
+                        st.error(f"Error generating relationships for {subject_areas[index]}: {str(error)}")
+                        return None
+                    
+                    results = run_async_tasks(
+                        relationship_prompts,
+                        generate_relationships,
+                        on_progress=on_progress,
+                        on_error=on_error,
+                    )
+                    all_relationships = [result for result in results if result]
                     
                     # Clear progress indicators
                     progress_bar.empty()
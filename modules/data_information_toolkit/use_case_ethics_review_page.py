@@ -1,7 +1,8 @@
 import streamlit as st
 from navigation import render_breadcrumbs
-from app_config import model
+from app_config import get_model
 from langchain_core.messages import HumanMessage
+from streaming import stream_response
 
 
 def use_case_ethics_review_page():
@@ -91,8 +92,7 @@ Conduct a thorough deontological analysis covering:
 
 Provide a detailed, objective analysis. Do not assume the use case is inherently good or bad - evaluate based on the ethical framework."""
 
-                    kantian_response = model.invoke([HumanMessage(content=kantian_prompt)])
-                    st.markdown(kantian_response.content)
+                    stream_response(get_model(), [HumanMessage(content=kantian_prompt)], st.empty())
                 
                 st.markdown("---")
                 
@@ -153,8 +153,7 @@ Conduct a comprehensive utilitarian analysis:
 
 Be objective and thorough. Consider both short-term and long-term consequences."""
 
-                    utilitarian_response = model.invoke([HumanMessage(content=utilitarian_prompt)])
-                    st.markdown(utilitarian_response.content)
+                    stream_response(get_model(), [HumanMessage(content=utilitarian_prompt)], st.empty())
                 
                 st.markdown("---")
                 
@@ -207,8 +206,7 @@ Conduct a thorough social contract analysis:
 
 Provide an objective analysis of how this use case aligns with or challenges existing social contracts."""
 
-                    social_contract_response = model.invoke([HumanMessage(content=social_contract_prompt)])
-                    st.markdown(social_contract_response.content)
+                    stream_response(get_model(), [HumanMessage(content=social_contract_prompt)], st.empty())
                 
                 st.markdown("---")
                 
@@ -271,8 +269,7 @@ Conduct a comprehensive virtue ethics analysis:
 
 Provide an objective assessment focused on character and moral excellence."""
 
-                    virtue_ethics_response = model.invoke([HumanMessage(content=virtue_ethics_prompt)])
-                    st.markdown(virtue_ethics_response.content)
+                    stream_response(get_model(), [HumanMessage(content=virtue_ethics_prompt)], st.empty())
                 
                 st.markdown("---")
                 
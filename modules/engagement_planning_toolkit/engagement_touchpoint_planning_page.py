@@ -2,9 +2,10 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 from langchain_core.messages import HumanMessage
-from app_config import model
+from app_config import get_model
 from prompts import ENGAGEMENT_TOUCHPOINT_PROMPT
 from navigation import render_breadcrumbs
+from streaming import stream_response
 
 def engagement_touchpoint_planning_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -156,10 +157,10 @@ def generate_touchpoint_plan(engagement_type, engagement_duration, client_size,
     progress_bar.progress(0.6)
     
     try:
-        # Get AI response
+        # Stream the plan into the page as it is written
+        st.markdown("### 📅 Your Engagement Touchpoint Plan")
         messages = [HumanMessage(content=touchpoint_prompt)]
-        response = model.invoke(messages)
-        touchpoint_plan = response.content.strip()
+        touchpoint_plan = stream_response(get_model(), messages, st.empty())
         
         progress_bar.progress(1.0)
         status_text.empty()
@@ -167,10 +168,6 @@ def generate_touchpoint_plan(engagement_type, engagement_duration, client_size,
         # Display results
         st.success("🎉 Touchpoint plan generated successfully!")
         
-        # Show the touchpoint plan
-        st.markdown("### 📅 Your Engagement Touchpoint Plan")
-        st.markdown(touchpoint_plan)
-        
         # Create downloadable plan
         st.markdown("### ⬇️ Download Plan")
         
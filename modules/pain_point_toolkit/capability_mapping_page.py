@@ -1,10 +1,19 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from langchain_core.messages import HumanMessage
-from app_config import model
-from prompts import PAIN_POINT_CAPABILITY_MAPPING_PROMPT
+from app_config import get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_columns, read_upload_preview, upload_sheet_columns, upload_sheet_names
+from background_jobs import job_manager, render_job_outcome, track_job, tracked_job
+from core.pain_point_capability_mapping import (
+    run_pain_point_capability_fast_mapping, run_pain_point_capability_mapping,
+)
+from core.retrieval import (
+    active_embedding_model, embedding_warning, embeddings_available, embeddings_usable, load_fast_mode_threshold,
+    load_shortlist_k,
+)
+from core.workbook import workbook_bytes
+
+TOOL_NAME = "Pain Point to Capability Mapping"
+JOB_KEY = "pain_point_capability_mapping_job"
 
 def capability_mapping_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -36,26 +45,27 @@ def capability_mapping_page():
         
         if pain_points_file is not None:
             # Load pain points file
-            xls = pd.ExcelFile(pain_points_file)
-            pain_sheet = st.selectbox("Select sheet for pain points", xls.sheet_names, key="pain_sheet")
-            pain_points_df = pd.read_excel(xls, sheet_name=pain_sheet)
-            st.session_state['pain_points_df'] = pain_points_df
+            pain_sheet = st.selectbox("Select sheet for pain points", upload_sheet_names(pain_points_file), key="pain_sheet")
+            # Only the header row and a preview here; the selected columns are loaded once chosen
+            pain_columns = upload_sheet_columns(pain_points_file, pain_sheet)
             
             st.write("**Preview:**")
-            st.dataframe(pain_points_df.head())
+            st.dataframe(read_upload_preview(pain_points_file, pain_sheet, rows=5))
             
             # Column selection for pain points
             pain_id_col = st.selectbox(
                 "Select Pain Point ID column", 
-                pain_points_df.columns,
+                pain_columns,
                 key="pain_id_col"
             )
             pain_text_cols = st.multiselect(
                 "Select Pain Point text columns (will be concatenated)", 
-                pain_points_df.columns,
+                pain_columns,
                 key="pain_text_cols",
                 help="Select one or more columns to describe the pain point (e.g., title, description, details)"
             )
+            st.session_state['pain_points_df'] = read_upload_columns(
+                pain_points_file, pain_sheet, [pain_id_col] + pain_text_cols)
             
             # Store column selections in session state (but not with widget key names)
             st.session_state['pain_columns']['id'] = pain_id_col
@@ -71,26 +81,27 @@ def capability_mapping_page():
         
         if capabilities_file is not None:
             # Load capabilities file
-            xls = pd.ExcelFile(capabilities_file)
-            cap_sheet = st.selectbox("Select sheet for capabilities", xls.sheet_names, key="cap_sheet")
-            capabilities_df = pd.read_excel(xls, sheet_name=cap_sheet)
-            st.session_state['capabilities_df'] = capabilities_df
+            cap_sheet = st.selectbox("Select sheet for capabilities", upload_sheet_names(capabilities_file), key="cap_sheet")
+            # Only the header row and a preview here; the selected columns are loaded once chosen
+            cap_columns = upload_sheet_columns(capabilities_file, cap_sheet)
             
             st.write("**Preview:**")
-            st.dataframe(capabilities_df.head())
+            st.dataframe(read_upload_preview(capabilities_file, cap_sheet, rows=5))
             
             # Column selection for capabilities
             cap_id_col = st.selectbox(
                 "Select Capability ID column", 
-                capabilities_df.columns,
+                cap_columns,
                 key="cap_id_col"
             )
             cap_text_cols = st.multiselect(
                 "Select Capability text columns (will be concatenated)", 
-                capabilities_df.columns,
+                cap_columns,
                 key="cap_text_cols",
                 help="Select one or more columns to describe the capability (e.g., name, description, details)"
             )
+            st.session_state['capabilities_df'] = read_upload_columns(
+                capabilities_file, cap_sheet, [cap_id_col] + cap_text_cols)
             
             # Store column selections in session state (but not with widget key names)
             st.session_state['cap_columns']['id'] = cap_id_col
@@ -114,129 +125,122 @@ def capability_mapping_page():
         )
         
         # Batch size control
-        batch_size = st.number_input(
-            'Batch size (number of pain points to process together)', 
-            min_value=1, max_value=50, value=10,
-            help="Larger batches are faster but may be less accurate. Smaller batches are more precise but slower."
+        auto_batch_size = st.checkbox(
+            "Size batches automatically",
+            value=True,
+            help="Pack as many pain points into each request as fit the model's token limits, up to the configured maximum."
+        )
+        batch_size = None
+        if not auto_batch_size:
+            batch_size = st.number_input(
+                'Batch size (number of pain points to process together)', 
+                min_value=1, max_value=50, value=10,
+                help="Larger batches are faster but may be less accurate. Smaller batches are more precise but slower."
+            )
+
+        # Optional embedding shortlist for large capability catalogues
+        use_shortlist = st.checkbox(
+            "Shortlist capabilities with embeddings",
+            value=False,
+            help="Send each batch only the capabilities most similar to its pain points instead of the whole catalogue. "
+                 "Cuts prompt size and latency on large capability models."
+        )
+        shortlist_k = None
+        if use_shortlist:
+            shortlist_k = st.number_input(
+                "Capabilities shortlisted per pain point:",
+                min_value=1, max_value=100, value=load_shortlist_k()
+            )
+
+        # Fast mode: embedding similarity first, AI only for low-confidence matches.
+        # On by default only with a real embedding model and a threshold calibrated for it
+        calibrated_threshold = load_fast_mode_threshold()
+        use_fast_mode = st.checkbox(
+            "Fast mode (embedding similarity)",
+            value=embeddings_available() and calibrated_threshold is not None,
+            help="Map each pain point to its most similar capability without the AI. Only pain points whose best "
+                 "match falls below the threshold are sent to the AI. Set the threshold to 0 to skip the AI entirely."
         )
+        fast_mode_threshold = None
+        if use_fast_mode:
+            if calibrated_threshold is None:
+                st.info(
+                    f"No threshold has been calibrated for the {active_embedding_model() or 'embedding'} model, so "
+                    "the slider starts at 1.0 and only near-identical matches skip the AI. Run "
+                    "`python cli.py calibrate-fast-mode` against a reviewed mapping to set one."
+                )
+            fast_mode_threshold = st.slider(
+                "Similarity threshold:",
+                min_value=0.0, max_value=1.0,
+                value=calibrated_threshold if calibrated_threshold is not None else 1.0, step=0.01
+            )
+        uses_embeddings = use_shortlist or use_fast_mode
+        if uses_embeddings and embedding_warning():
+            if embeddings_usable():
+                st.warning(embedding_warning())
+            else:
+                st.error(embedding_warning())
         
-        if st.button("Generate AI Mappings", type="primary"):
+        job = tracked_job(JOB_KEY)
+        running = job is not None and not job.finished_state
+        blocked = uses_embeddings and not embeddings_usable()
+        if st.button("Generate AI Mappings", type="primary", disabled=running or blocked):
             pain_points_df = st.session_state['pain_points_df']
-            capabilities_df = st.session_state['capabilities_df']
-            pain_id_col = st.session_state['pain_columns']['id']
-            pain_text_cols = st.session_state['pain_columns']['text']
-            cap_id_col = st.session_state['cap_columns']['id']
-            cap_text_cols = st.session_state['cap_columns']['text']
-            
-            mappings = []
-            
-            with st.spinner("Generating mappings with AI..."):
-                progress_bar = st.progress(0)
-                total_pain_points = len(pain_points_df)
-                
-                # Process in batches
-                for batch_start in range(0, total_pain_points, batch_size):
-                    batch_end = min(batch_start + batch_size, total_pain_points)
-                    batch_df = pain_points_df.iloc[batch_start:batch_end]
-                    
-                    st.write(f"Processing pain points {batch_start + 1} to {batch_end} of {total_pain_points}")
-                    
-                    # Build prompt using template
-                    pain_points_text = ""
-                    for _, pain_row in batch_df.iterrows():
-                        pain_id = pain_row[pain_id_col]
-                        pain_text_parts = []
-                        for col in pain_text_cols:
-                            if pd.notna(pain_row[col]):
-                                pain_text_parts.append(str(pain_row[col]))
-                        pain_text = " ".join(pain_text_parts)
-                        pain_points_text += f"- {pain_id}: {pain_text}\n"
+            job = job_manager.submit(
+                TOOL_NAME, f"{len(pain_points_df)} pain points", run_capability_mapping_job,
+                pain_points_df, st.session_state['pain_columns']['id'], st.session_state['pain_columns']['text'],
+                st.session_state['capabilities_df'], st.session_state['cap_columns']['id'],
+                st.session_state['cap_columns']['text'],
+                additional_context, batch_size, shortlist_k, fast_mode_threshold if use_fast_mode else None,
+            )
+            track_job(JOB_KEY, job)
 
-                    capabilities_lines = []
-                    for _, cap_row in capabilities_df.iterrows():
-                        cap_id = cap_row[cap_id_col]
-                        cap_text_parts = []
-                        for col in cap_text_cols:
-                            if pd.notna(cap_row[col]):
-                                cap_text_parts.append(str(cap_row[col]))
-                        cap_text = " ".join(cap_text_parts)
-                        capabilities_lines.append(f"- {cap_id}: {cap_text}")
-                    capabilities_text = "\n".join(capabilities_lines)
+    # Shown even after the uploads are cleared by navigating away and back
+    show_capability_mapping_job()
 
-                    batch_mapping_prompt = PAIN_POINT_CAPABILITY_MAPPING_PROMPT.format(
-                        pain_points=pain_points_text,
-                        capabilities=capabilities_text,
-                        additional_context=additional_context,
-                    )
-                    
-                    # Get AI response for the batch
-                    output = model.invoke([HumanMessage(content=batch_mapping_prompt)])
-                    batch_results = output.content.strip()
-                    
-                    # Parse the batch results
-                    for line in batch_results.split('\n'):
-                        line = line.strip()
-                        if '->' in line:
-                            try:
-                                pain_point_id, capability_id = line.split('->')
-                                pain_point_id = pain_point_id.strip()
-                                capability_id = capability_id.strip()
-                                
-                                # Get the pain point text for reference
-                                pain_text = ""
-                                matching_rows = batch_df[batch_df[pain_id_col].astype(str) == str(pain_point_id)]
-                                if not matching_rows.empty:
-                                    # Concatenate selected pain point text columns
-                                    pain_text_parts = []
-                                    for col in pain_text_cols:
-                                        if pd.notna(matching_rows.iloc[0][col]):
-                                            pain_text_parts.append(str(matching_rows.iloc[0][col]))
-                                    pain_text = ' '.join(pain_text_parts)
-                                
-                                mappings.append({
-                                    'Pain_Point_ID': pain_point_id,
-                                    'Capability_ID': capability_id,
-                                    'Pain_Point_Text': pain_text
-                                })
-                            except ValueError:
-                                # Skip malformed lines
-                                continue
-                    
-                    # Update progress
-                    progress = batch_end / total_pain_points
-                    progress_bar.progress(progress)
-                
-                progress_bar.progress(1.0)
-            
-            # Create mappings dataframe
-            mappings_df = pd.DataFrame(mappings)
-            
-            # Add capability text for reference (concatenate selected columns)
-            cap_lookup = {}
-            for _, cap_row in capabilities_df.iterrows():
-                cap_id = cap_row[cap_id_col]
-                cap_text_parts = []
-                for col in cap_text_cols:
-                    if pd.notna(cap_row[col]):
-                        cap_text_parts.append(str(cap_row[col]))
-                cap_text = ' '.join(cap_text_parts)
-                cap_lookup[cap_id] = cap_text
-            
-            mappings_df['Capability_Text'] = mappings_df['Capability_ID'].map(cap_lookup)
-            
-            st.session_state['mappings_df'] = mappings_df
-            
-            st.markdown("### 📊 Mapping Results")
-            st.dataframe(mappings_df)
-            
-            # Download button
-            buffer = BytesIO()
-            mappings_df.to_excel(buffer, index=False, engine='openpyxl')
-            buffer.seek(0)
-            
-            st.download_button(
-                label="📥 Download Mappings as Excel",
-                data=buffer.getvalue(),
-                file_name="pain_point_capability_mappings.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+def run_capability_mapping_job(job, pain_points_df, pain_id_col, pain_text_cols,
+                               capabilities_df, cap_id_col, cap_text_cols,
+                               additional_context, batch_size, shortlist_k, fast_mode_threshold):
+    """Run the mapping in a background job; the workbook is built here so it includes the run's metrics"""
+    if fast_mode_threshold is not None:
+        mappings_df = run_pain_point_capability_fast_mapping(
+            get_model(), pain_points_df, pain_id_col, pain_text_cols,
+            capabilities_df, cap_id_col, cap_text_cols,
+            additional_context, fast_mode_threshold, batch_size,
+            on_progress=job.progress,
+            shortlist_k=shortlist_k,
+        )
+    else:
+        mappings_df = run_pain_point_capability_mapping(
+            get_model(), pain_points_df, pain_id_col, pain_text_cols,
+            capabilities_df, cap_id_col, cap_text_cols,
+            additional_context, batch_size,
+            on_progress=job.progress,
+            shortlist_k=shortlist_k,
+        )
+    return {"mappings_df": mappings_df, "workbook": workbook_bytes({'Sheet1': mappings_df}, job.run)}
+
+def show_capability_mapping_job():
+    """Progress of the session's mapping job, then its results"""
+    job = tracked_job(JOB_KEY)
+    if job is None:
+        return
+    
+    st.markdown("### 🔄 Generating Mappings")
+    
+    if not render_job_outcome(job, "Capability mapping"):
+        return
+    
+    mappings_df = job.result["mappings_df"]
+    st.session_state['mappings_df'] = mappings_df
+    
+    st.markdown("### 📊 Mapping Results")
+    st.dataframe(mappings_df)
+    
+    # Download button
+    st.download_button(
+        label="📥 Download Mappings as Excel",
+        data=job.result["workbook"],
+        file_name="pain_point_capability_mappings.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
@@ -2,8 +2,9 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 from langchain_core.messages import HumanMessage
-from app_config import pain_point_extraction_prompt, model
+from app_config import pain_point_extraction_prompt, get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_csv, read_upload_sheet, upload_sheet_names
 
 def pain_point_extraction_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -15,11 +16,10 @@ def pain_point_extraction_page():
     if uploaded_file is not None:
         # Can be used wherever a "file-like" object is accepted:
         if uploaded_file.name.endswith('.csv'):
-            dataframe = pd.read_csv(uploaded_file)
+            dataframe = read_upload_csv(uploaded_file)
         elif uploaded_file.name.endswith(('.xls', '.xlsx', '.xlsm')):
-            xls = pd.ExcelFile(uploaded_file)
-            sheet_name = st.selectbox("Select sheet to load", xls.sheet_names)
-            dataframe = pd.read_excel(xls, sheet_name=sheet_name)
+            sheet_name = st.selectbox("Select sheet to load", upload_sheet_names(uploaded_file))
+            dataframe = read_upload_sheet(uploaded_file, sheet_name)
         else:
             st.error("Unsupported file type. Please upload a CSV or Excel file.")
             st.stop()
@@ -74,7 +74,7 @@ def pain_point_extraction_page():
                         additional_prompts=prompts,
                         data=chunk_text
                     )
-                    output = model.invoke([HumanMessage(content=_input)])
+                    output = get_model().invoke([HumanMessage(content=_input)])
                     
                     # Parse the output as simple text lines instead of comma-separated
                     raw_content = output.content.strip()
@@ -1,9 +1,14 @@
 import streamlit as st
-import pandas as pd
 from navigation import render_breadcrumbs
-from io import BytesIO
-from langchain_core.messages import HumanMessage
-from app_config import model, pain_point_impact_estimation_prompt
+from uploads import read_upload_text_columns, read_upload_text_preview, upload_sheet_columns, upload_sheet_names
+from background_jobs import job_manager, render_job_outcome, track_job, tracked_job
+from app_config import get_model
+from core.impact_estimation import impact_counts, impact_workbook_sheets, run_impact_estimation
+from core.workbook import workbook_bytes
+from model_routing import load_routing_config, model_route, routing_summary
+
+TOOL_NAME = "Pain Point Impact Estimation"
+JOB_KEY = "impact_estimation_job"
 
 def pain_point_impact_estimation_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -18,8 +23,7 @@ def pain_point_impact_estimation_page():
     if uploaded_file is not None:
         # Read the Excel file and get sheet names
         try:
-            excel_data = pd.ExcelFile(uploaded_file)
-            sheet_names = excel_data.sheet_names
+            sheet_names = upload_sheet_names(uploaded_file)
         except Exception as e:
             st.error(f"Error reading Excel file: {str(e)}")
             return
@@ -28,23 +32,15 @@ def pain_point_impact_estimation_page():
         selected_sheet = st.selectbox("Select a sheet:", sheet_names, key="impact_sheet_select")
         
         if selected_sheet:
-            # Read the selected sheet
-            df = pd.read_excel(uploaded_file, sheet_name=selected_sheet)
-            
-            # Clean the dataframe to avoid PyArrow conversion issues
-            # Convert all columns to string type to ensure compatibility
-            for col in df.columns:
-                df[col] = df[col].astype(str)
-            
-            # Replace 'nan' strings back to actual NaN for better handling
-            df = df.replace('nan', pd.NA)
+            # Only the header row here; the selected columns are loaded once chosen
+            columns = upload_sheet_columns(uploaded_file, selected_sheet)
             
             st.markdown(f"**Sheet:** {selected_sheet}")
-            st.markdown(f"**Rows:** {len(df)} | **Columns:** {len(df.columns)}")
+            st.markdown(f"**Columns:** {len(columns)}")
             
             # Show preview
             with st.expander("📋 Preview Data", expanded=True):
-                st.dataframe(df.head(10))
+                st.dataframe(read_upload_text_preview(uploaded_file, selected_sheet))
             
             # Column selection
             st.markdown("### Column Selection")
@@ -55,7 +51,7 @@ def pain_point_impact_estimation_page():
                 # ID column selection
                 id_column = st.selectbox(
                     "Select ID Column:",
-                    options=df.columns.tolist(),
+                    options=columns,
                     key="impact_id_column"
                 )
             
@@ -63,11 +59,13 @@ def pain_point_impact_estimation_page():
                 # Description columns selection
                 description_columns = st.multiselect(
                     "Select Description Column(s):",
-                    options=[col for col in df.columns.tolist() if col != id_column],
+                    options=[col for col in columns if col != id_column],
                     key="impact_description_columns"
                 )
             
             if id_column and description_columns:
+                df = read_upload_text_columns(uploaded_file, selected_sheet, [id_column] + description_columns)
+                
                 # Context input
                 st.markdown("### Business Context")
                 st.markdown("_Optionally provide key contextual information to help the AI assess business impact more accurately._")
@@ -101,137 +99,94 @@ def pain_point_impact_estimation_page():
                 with col_batch1:
                     batch_size = st.selectbox(
                         "Batch Size:",
-                        options=[5, 10, 15, 20, 25],
-                        index=1,  # Default to 10
-                        help="Number of pain points to process in each batch. Smaller batches are more reliable but slower.",
+                        options=["Auto", 5, 10, 15, 20, 25],
+                        index=0,  # Default to sizing from the token budget
+                        help="Number of pain points to process in each batch. Auto sizes batches from the model's "
+                             "token limits. Smaller batches are more reliable but slower.",
                         key="impact_batch_size"
                     )
+                    if batch_size == "Auto":
+                        batch_size = None
                 
                 with col_batch2:
-                    estimated_batches = (len(df) + batch_size - 1) // batch_size
-                    st.metric("Estimated Batches", estimated_batches)
+                    if batch_size:
+                        st.metric("Estimated Batches", (len(df) + batch_size - 1) // batch_size)
+                    else:
+                        st.metric("Estimated Batches", "Auto")
+                
+                route_models = st.checkbox(
+                    "Try a faster model first",
+                    value=load_routing_config("impact-estimation")["enabled"],
+                    help="Assess every pain point with the fast model first and send only those it is unsure of "
+                         "to the strong model. The models and confidence threshold are set in model_config.json.",
+                    key="impact_route_models"
+                )
                 
                 # Process button
-                if st.button("🚀 Estimate Impact", key="start_impact_estimation", type="primary"):
+                job = tracked_job(JOB_KEY)
+                running = job is not None and not job.finished_state
+                if st.button("🚀 Estimate Impact", key="start_impact_estimation", type="primary", disabled=running):
                     # Process the impact estimation (context is optional)
-                    process_impact_estimation(df, id_column, description_columns, context, batch_size)
+                    process_impact_estimation(df, id_column, description_columns, context, batch_size, route_models)
+
+    # Shown even after the upload is cleared by navigating away and back
+    show_impact_estimation_job()
+
+def process_impact_estimation(df, id_column, description_columns, context, batch_size=None, route_models=False):
+    """Submit the impact estimation as a background job so it survives reruns and navigation"""
+    job = job_manager.submit(
+        TOOL_NAME, f"{len(df)} pain points", run_impact_estimation_job,
+        df, id_column, description_columns, context, batch_size, route_models,
+    )
+    track_job(JOB_KEY, job)
+
+def run_impact_estimation_job(job, df, id_column, description_columns, context, batch_size, route_models):
+    """Run the estimation in a background job; the workbook is built here so it includes the run's metrics"""
+    def report_batch_error(index, error, item_ids):
+        job.report(f"❌ Error processing batch {index + 1}, pain points {', '.join(str(item_id) for item_id in item_ids)}: {str(error)}")
+    
+    results_df = run_impact_estimation(
+        get_model(), df, id_column, description_columns, context, batch_size,
+        on_progress=job.progress,
+        on_batch_error=report_batch_error,
+        route=model_route("impact-estimation") if route_models else None,
+    )
+    return {
+        "results_df": results_df,
+        "route_models": route_models,
+        "workbook": workbook_bytes(impact_workbook_sheets(results_df), job.run),
+    }
 
-def process_impact_estimation(df, id_column, description_columns, context, batch_size=10):
-    """Process pain points and estimate their business impact"""
+def show_impact_estimation_job():
+    """Progress of the session's impact estimation job, then its results"""
+    job = tracked_job(JOB_KEY)
+    if job is None:
+        return
     
     st.markdown("### 🔄 Processing Impact Assessment")
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    results = []
-    total_rows = len(df)
-    
-    st.info(f"📊 Processing {total_rows} pain points in batches of {batch_size}...")
+    if not render_job_outcome(job, "Impact estimation"):
+        return
     
-    batch_size = batch_size  # Use the configured batch size
-    total_batches = (total_rows + batch_size - 1) // batch_size
-    
-    for i in range(0, total_rows, batch_size):
-        batch_end = min(i + batch_size, total_rows)
-        batch_df = df.iloc[i:batch_end]
-        current_batch = i // batch_size + 1
-        
-        # Prepare batch text
-        batch_text = ""
-        batch_ids = []
-        
-        for _, row in batch_df.iterrows():
-            pain_point_id = row[id_column]
-            batch_ids.append(pain_point_id)
-            
-            # Combine description columns
-            description_parts = []
-            for col in description_columns:
-                if pd.notna(row[col]) and str(row[col]).strip():
-                    description_parts.append(str(row[col]).strip())
-            
-            combined_description = " | ".join(description_parts)
-            batch_text += f"{pain_point_id}: {combined_description}\n"
-        
-        status_text.text(f"🔄 Processing batch {current_batch} of {total_batches} ({len(batch_df)} pain points)...")
-        
-        try:
-            # Get AI response for the batch using the prompt template
-            # Handle optional context
-            if context and context.strip():
-                context_section = f"Business Context:\n{context}"
-                context_instruction = "Consider the business context provided when making your assessment."
-            else:
-                context_section = "No specific business context provided - use general business impact principles."
-                context_instruction = "Use general business impact principles for your assessment."
-            
-            prompt_input = pain_point_impact_estimation_prompt.format(
-                context_section=context_section,
-                context_instruction=context_instruction,
-                pain_points=batch_text
-            )
-            messages = [HumanMessage(content=prompt_input)]
-            response = model.invoke(messages)
-            impact_assessments = response.content.strip().split('\n')
-            
-            # Parse results
-            for j, pain_point_id in enumerate(batch_ids):
-                if j < len(impact_assessments):
-                    impact_text = impact_assessments[j].strip()
-                    # Extract impact level (handle various response formats)
-                    if 'HIGH' in impact_text.upper():
-                        impact = 'High'
-                    elif 'MEDIUM' in impact_text.upper():
-                        impact = 'Medium'
-                    elif 'LOW' in impact_text.upper():
-                        impact = 'Low'
-                    else:
-                        impact = 'Medium'  # Default fallback
-                else:
-                    impact = 'Medium'  # Default fallback
-                
-                results.append({
-                    'Pain Point ID': pain_point_id,
-                    'Business Impact': impact
-                })
-        
-        except Exception as e:
-            st.error(f"❌ Error processing batch {current_batch}: {str(e)}")
-            # Add default impacts for this batch
-            for pain_point_id in batch_ids:
-                results.append({
-                    'Pain Point ID': pain_point_id,
-                    'Business Impact': 'Medium'  # Default fallback
-                })
-        
-        # Update progress
-        progress = min((batch_end / total_rows), 1.0)
-        progress_bar.progress(progress)
-    
-    # Clear status
-    status_text.empty()
-    
-    # Create results DataFrame
-    results_df = pd.DataFrame(results)
-    
-    # Display results
-    status_text.text("✅ Impact estimation completed!")
-    progress_bar.progress(1.0)
+    results_df = job.result["results_df"]
+    route_models = job.result["route_models"]
+    st.progress(1.0)
     
     st.success(f"🎉 Successfully estimated impact for {len(results_df)} pain points!")
+    if routing_summary(results_df):
+        st.info(f"🔀 {routing_summary(results_df)}")
     
     # Show results summary
     st.markdown("### 📊 Impact Distribution")
-    impact_counts = results_df['Business Impact'].value_counts()
+    counts = impact_counts(results_df)
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("🔴 High Impact", impact_counts.get('High', 0))
+        st.metric("🔴 High Impact", counts['High'])
     with col2:
-        st.metric("🟡 Medium Impact", impact_counts.get('Medium', 0))
+        st.metric("🟡 Medium Impact", counts['Medium'])
     with col3:
-        st.metric("🟢 Low Impact", impact_counts.get('Low', 0))
+        st.metric("🟢 Low Impact", counts['Low'])
     
     # Show results table
     st.markdown("### 📋 Impact Assessment Results")
@@ -248,28 +203,9 @@ def process_impact_estimation(df, id_column, description_columns, context, batch
     # Download button
     st.markdown("### ⬇️ Download Results")
     
-    # Create Excel file for download
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        results_df.to_excel(writer, sheet_name='Impact Assessment', index=False)
-        
-        # Add summary sheet
-        summary_df = pd.DataFrame({
-            'Impact Level': ['High', 'Medium', 'Low'],
-            'Count': [impact_counts.get('High', 0), impact_counts.get('Medium', 0), impact_counts.get('Low', 0)],
-            'Percentage': [
-                f"{(impact_counts.get('High', 0) / len(results_df) * 100):.1f}%" if len(results_df) > 0 else "0%",
-                f"{(impact_counts.get('Medium', 0) / len(results_df) * 100):.1f}%" if len(results_df) > 0 else "0%",
-                f"{(impact_counts.get('Low', 0) / len(results_df) * 100):.1f}%" if len(results_df) > 0 else "0%"
-            ]
-        })
-        summary_df.to_excel(writer, sheet_name='Summary', index=False)
-    
-    output.seek(0)
-    
     st.download_button(
         label="📊 Download Impact Assessment Results",
-        data=output.getvalue(),
+        data=job.result["workbook"],
         file_name="pain_point_impact_assessment.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         key="download_impact_results"
@@ -277,5 +213,6 @@ def process_impact_estimation(df, id_column, description_columns, context, batch
     
     st.markdown("---")
     st.markdown("**📁 File Contents:**")
-    st.markdown("• **Impact Assessment** sheet: Pain Point ID and Business Impact classification")
+    st.markdown("• **Impact Assessment** sheet: Pain Point ID and Business Impact classification"
+                + (", and which model answered" if route_models else ""))
     st.markdown("• **Summary** sheet: Impact distribution statistics")
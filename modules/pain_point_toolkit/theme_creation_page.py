@@ -1,10 +1,14 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from langchain_core.messages import HumanMessage
-from app_config import model
-from prompts import THEME_PERSPECTIVE_MAPPING_PROMPT
+from app_config import get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_columns, read_upload_preview, upload_sheet_columns, upload_sheet_names
+from background_jobs import job_manager, render_job_outcome, track_job, tracked_job
+from core.theme_mapping import PREDEFINED_PERSPECTIVES, PREDEFINED_THEMES, run_theme_perspective_mapping
+from core.workbook import workbook_bytes
+from model_routing import load_routing_config, model_route, routing_summary
+
+TOOL_NAME = "Pain Point Theme Creation"
+JOB_KEY = "theme_mapping_job"
 
 def theme_creation_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -13,22 +17,6 @@ def theme_creation_page():
     st.markdown("## Pain Point Theme & Perspective Mapping")
     st.markdown("Upload a pain points spreadsheet to map each pain point to themes and perspectives.")
     
-    # Predefined themes and perspectives
-    predefined_themes = [
-        "Manual Processes", "No Single Source of Truth", "Skills & Capacity", 
-        "Technology Limitations", "Vendor Dependency", "Risk & Compliance",
-        "Market Pressures", "Capacity Constraints", "Project Mobilisation",
-        "Governance & Decision-Making", "Integration / Data Silos", "Process Improvement",
-        "Technology Opportunity", "Cross-Service Alignment", "Budget & Investment",
-        "Culture & Change", "Capacity Planning", "Inefficient Governance",
-        "Process Timing", "Process Inconsistencies"
-    ]
-    
-    predefined_perspectives = [
-        "Process", "Data / Information", "People", "Technology", 
-        "Risk", "Market", "Governance"
-    ]
-    
     # Initialise session state
     if 'pain_points_df' not in st.session_state:
         st.session_state['pain_points_df'] = None
@@ -45,26 +33,27 @@ def theme_creation_page():
     
     if pain_points_file is not None:
         # Load pain points file
-        xls = pd.ExcelFile(pain_points_file)
-        pain_sheet = st.selectbox("Select sheet for pain points", xls.sheet_names, key="pain_sheet_theme")
-        pain_points_df = pd.read_excel(xls, sheet_name=pain_sheet)
-        st.session_state['pain_points_df'] = pain_points_df
+        pain_sheet = st.selectbox("Select sheet for pain points", upload_sheet_names(pain_points_file), key="pain_sheet_theme")
+        # Only the header row and a preview here; the selected columns are loaded once chosen
+        pain_columns = upload_sheet_columns(pain_points_file, pain_sheet)
         
         st.write("**Preview:**")
-        st.dataframe(pain_points_df.head())
+        st.dataframe(read_upload_preview(pain_points_file, pain_sheet, rows=5))
         
         # Column selection
         pain_id_col = st.selectbox(
             "Select Pain Point ID column", 
-            pain_points_df.columns,
+            pain_columns,
             key="pain_id_col_theme"
         )
         pain_text_cols = st.multiselect(
             "Select Pain Point text columns (will be concatenated)", 
-            pain_points_df.columns,
+            pain_columns,
             key="pain_text_cols_theme",
             help="Select one or more columns that describe the pain point"
         )
+        pain_points_df = read_upload_columns(pain_points_file, pain_sheet, [pain_id_col] + pain_text_cols)
+        st.session_state['pain_points_df'] = pain_points_df
         
         # Store column selections
         st.session_state['pain_columns']['id'] = pain_id_col
@@ -74,11 +63,11 @@ def theme_creation_page():
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("### 🏷️ Available Themes")
-            st.write(", ".join(predefined_themes))
+            st.write(", ".join(PREDEFINED_THEMES))
         
         with col2:
             st.markdown("### 👀 Available Perspectives") 
-            st.write(", ".join(predefined_perspectives))
+            st.write(", ".join(PREDEFINED_PERSPECTIVES))
         
         # Additional context input
         additional_context = st.text_area(
@@ -87,186 +76,116 @@ def theme_creation_page():
         )
         
         # Batch size control
-        batch_size = st.number_input(
-            'Batch size (number of pain points to process together)', 
-            min_value=1, max_value=50, value=10,
-            help="Larger batches are faster but may be less accurate. Smaller batches are more precise but slower."
+        auto_batch_size = st.checkbox(
+            "Size batches automatically",
+            value=True,
+            help="Pack as many pain points into each request as fit the model's token limits, up to the configured maximum."
+        )
+        batch_size = None
+        if not auto_batch_size:
+            batch_size = st.number_input(
+                'Batch size (number of pain points to process together)', 
+                min_value=1, max_value=50, value=10,
+                help="Larger batches are faster but may be less accurate. Smaller batches are more precise but slower."
+            )
+        route_models = st.checkbox(
+            "Try a faster model first",
+            value=load_routing_config("theme-mapping")["enabled"],
+            help="Map every pain point with the fast model first and send only those it is unsure of to the "
+                 "strong model. The models and confidence threshold are set in model_config.json."
         )
         
         # Generate mappings button
+        job = tracked_job(JOB_KEY)
+        running = job is not None and not job.finished_state
         if (st.session_state['pain_columns']['text'] and 
-            st.button("Generate Theme & Perspective Mappings", type="primary")):
-            
-            pain_id_col = st.session_state['pain_columns']['id']
-            pain_text_cols = st.session_state['pain_columns']['text']
+            st.button("Generate Theme & Perspective Mappings", type="primary", disabled=running)):
             
-            mappings = []
-            
-            with st.spinner("Mapping pain points to themes and perspectives..."):
-                progress_bar = st.progress(0)
-                total_pain_points = len(pain_points_df)
-                
-                # Process in batches
-                for batch_start in range(0, total_pain_points, batch_size):
-                    batch_end = min(batch_start + batch_size, total_pain_points)
-                    batch_df = pain_points_df.iloc[batch_start:batch_end]
-                    
-                    st.write(f"Processing pain points {batch_start + 1} to {batch_end} of {total_pain_points}")
-                    
-                    # Build prompt using template
-                    pain_points_text = ""
-                    for _, pain_row in batch_df.iterrows():
-                        pain_id = pain_row[pain_id_col]
-                        pain_text_parts = []
-                        for col in pain_text_cols:
-                            if pd.notna(pain_row[col]):
-                                pain_text_parts.append(str(pain_row[col]))
-                        pain_text = " ".join(pain_text_parts)
-                        pain_points_text += f"- {pain_id}: {pain_text}\n"
-
-                    themes_text = ", ".join(predefined_themes)
-                    perspectives_text = ", ".join(predefined_perspectives)
-
-                    batch_mapping_prompt = THEME_PERSPECTIVE_MAPPING_PROMPT.format(
-                        pain_points=pain_points_text,
-                        themes=themes_text,
-                        perspectives=perspectives_text,
-                        additional_context=additional_context,
-                    )
-                    
-                    # Get AI response for the batch
-                    output = model.invoke([HumanMessage(content=batch_mapping_prompt)])
-                    batch_results = output.content.strip()
-                    
-                    # Debug: Show AI response for first batch
-                    if batch_start == 0:
-                        st.write("**Sample AI Response:**")
-                        st.text(batch_results[:300] + "..." if len(batch_results) > 300 else batch_results)
-                    
-                    # Parse the batch results
-                    parsed_count = 0
-                    for line in batch_results.split('\n'):
-                        line = line.strip()
-                        
-                        # More flexible parsing - look for -> anywhere in the line
-                        if '->' in line:
-                            try:
-                                # Split on '->' to get pain point ID and mapping
-                                pain_point_part, mapping_part = line.split('->', 1)
-                                pain_point_id = pain_point_part.strip()
-                                
-                                # Clean up pain point ID - remove markdown formatting and extra characters
-                                pain_point_id = pain_point_id.replace('**', '').replace('*', '').replace('`', '')
-                                pain_point_id = pain_point_id.replace('"', '').replace("'", '').strip()
-                                
-                                # Parse theme and perspective with more flexible approach
-                                theme = "Unknown"
-                                perspective = "Unknown"
-                                
-                                # Look for THEME: and PERSPECTIVE: patterns
-                                theme_match = None
-                                perspective_match = None
-                                
-                                # Try to find theme
-                                if 'THEME:' in mapping_part.upper():
-                                    # Find THEME: and extract until | or end
-                                    theme_start = mapping_part.upper().find('THEME:') + 6
-                                    theme_part = mapping_part[theme_start:]
-                                    if '|' in theme_part:
-                                        theme = theme_part.split('|')[0].strip()
-                                    elif 'PERSPECTIVE:' in theme_part.upper():
-                                        theme = theme_part.split('PERSPECTIVE:')[0].strip()
-                                    else:
-                                        theme = theme_part.strip()
-                                    
-                                    # Clean up theme
-                                    theme = theme.replace('**', '').replace('*', '').replace('`', '')
-                                    theme = theme.replace('"', '').replace("'", '').strip()
-                                
-                                # Try to find perspective
-                                if 'PERSPECTIVE:' in mapping_part.upper():
-                                    perspective_start = mapping_part.upper().find('PERSPECTIVE:') + 12
-                                    perspective = mapping_part[perspective_start:].strip()
-                                    
-                                    # Clean up perspective
-                                    perspective = perspective.replace('**', '').replace('*', '').replace('`', '')
-                                    perspective = perspective.replace('"', '').replace("'", '').strip()
-                                
-                                # Only add if we found both theme and perspective
-                                if theme != "Unknown" and perspective != "Unknown":
-                                    # Get the pain point text for reference
-                                    pain_text = ""
-                                    matching_rows = batch_df[batch_df[pain_id_col].astype(str) == str(pain_point_id)]
-                                    if not matching_rows.empty:
-                                        # Concatenate selected pain point text columns
-                                        pain_text_parts = []
-                                        for col in pain_text_cols:
-                                            if pd.notna(matching_rows.iloc[0][col]):
-                                                pain_text_parts.append(str(matching_rows.iloc[0][col]))
-                                        pain_text = ' '.join(pain_text_parts)
-                                    
-                                    mappings.append({
-                                        'Pain_Point_ID': pain_point_id,
-                                        'Theme': theme,
-                                        'Perspective': perspective,
-                                        'Pain_Point_Text': pain_text
-                                    })
-                                    parsed_count += 1
-                                
-                            except Exception as e:
-                                # Skip malformed lines but log the issue
-                                continue
-                    
-                    st.write(f"Successfully parsed {parsed_count} mappings from this batch")
-                    
-                    # Update progress
-                    progress = batch_end / total_pain_points
-                    progress_bar.progress(progress)
-                
-                progress_bar.progress(1.0)
-            
-            # Create mappings dataframe
-            mappings_df = pd.DataFrame(mappings)
-            
-            # Check if we have any successful mappings
-            if mappings_df.empty:
-                st.error("❌ No valid mappings were generated. Please check your data and try again.")
-                st.write("**Debug Info:**")
-                st.write(f"Total batches processed: {len(range(0, total_pain_points, batch_size))}")
-                st.write(f"Last AI response sample: {batch_results[:500]}...")
-                return
-            
-            st.session_state['theme_mappings_df'] = mappings_df
-            
-            st.markdown("### 📊 Theme & Perspective Mapping Results")
-            st.dataframe(mappings_df)
-            
-            # Summary statistics - only if we have the columns
-            if 'Theme' in mappings_df.columns and 'Perspective' in mappings_df.columns:
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.markdown("**Themes Distribution:**")
-                    theme_counts = mappings_df['Theme'].value_counts()
-                    st.dataframe(theme_counts)
-                
-                with col2:
-                    st.markdown("**Perspectives Distribution:**")
-                    perspective_counts = mappings_df['Perspective'].value_counts()
-                    st.dataframe(perspective_counts)
-            else:
-                st.warning("⚠️ Some columns are missing from the results. Please check the mapping output.")
-            
-            # Download button
-            buffer = BytesIO()
-            mappings_df.to_excel(buffer, index=False, engine='openpyxl')
-            buffer.seek(0)
-            
-            st.download_button(
-                label="📥 Download Theme & Perspective Mappings as Excel",
-                data=buffer.getvalue(),
-                file_name="pain_point_theme_perspective_mappings.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            job = job_manager.submit(
+                TOOL_NAME, f"{len(pain_points_df)} pain points", run_theme_mapping_job,
+                pain_points_df, st.session_state['pain_columns']['id'], st.session_state['pain_columns']['text'],
+                additional_context, batch_size, route_models,
             )
+            track_job(JOB_KEY, job)
     
     else:
         st.info("📤 Please upload a pain points Excel file to begin theme and perspective mapping.")
+
+    # Shown even after the upload is cleared by navigating away and back
+    show_theme_mapping_job()
+
+def run_theme_mapping_job(job, pain_points_df, pain_id_col, pain_text_cols, additional_context, batch_size,
+                          route_models):
+    """Run the mapping in a background job; the workbook is built here so it includes the run's metrics"""
+    mappings_df, batch_outputs = run_theme_perspective_mapping(
+        get_model(), pain_points_df, pain_id_col, pain_text_cols, additional_context, batch_size,
+        on_progress=job.progress,
+        route=model_route("theme-mapping") if route_models else None,
+    )
+    return {
+        "mappings_df": mappings_df,
+        "batch_outputs": batch_outputs,
+        "workbook": workbook_bytes({'Sheet1': mappings_df}, job.run),
+    }
+
+def show_theme_mapping_job():
+    """Progress of the session's mapping job, then its results"""
+    job = tracked_job(JOB_KEY)
+    if job is None:
+        return
+    
+    st.markdown("### 🔄 Mapping Pain Points to Themes and Perspectives")
+    
+    if not render_job_outcome(job, "Theme and perspective mapping"):
+        return
+    
+    mappings_df = job.result["mappings_df"]
+    batch_outputs = job.result["batch_outputs"]
+    
+    # Debug: Show AI response for first batch
+    if batch_outputs:
+        first_response = batch_outputs[0][1]
+        st.write("**Sample AI Response:**")
+        st.text(first_response[:300] + "..." if len(first_response) > 300 else first_response)
+    
+    for batch_number, (batch_mappings, _) in enumerate(batch_outputs, 1):
+        st.write(f"Batch {batch_number}: successfully parsed {len(batch_mappings)} mappings")
+    batch_results = batch_outputs[-1][1] if batch_outputs else ""
+    
+    # Check if we have any successful mappings
+    if mappings_df.empty:
+        st.error("❌ No valid mappings were generated. Please check your data and try again.")
+        st.write("**Debug Info:**")
+        st.write(f"Total batches processed: {len(batch_outputs)}")
+        st.write(f"Last AI response sample: {batch_results[:500]}...")
+        return
+    
+    st.session_state['theme_mappings_df'] = mappings_df
+    
+    st.markdown("### 📊 Theme & Perspective Mapping Results")
+    if routing_summary(mappings_df):
+        st.info(f"🔀 {routing_summary(mappings_df)}")
+    st.dataframe(mappings_df)
+    
+    # Summary statistics - only if we have the columns
+    if 'Theme' in mappings_df.columns and 'Perspective' in mappings_df.columns:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Themes Distribution:**")
+            theme_counts = mappings_df['Theme'].value_counts()
+            st.dataframe(theme_counts)
+        
+        with col2:
+            st.markdown("**Perspectives Distribution:**")
+            perspective_counts = mappings_df['Perspective'].value_counts()
+            st.dataframe(perspective_counts)
+    else:
+        st.warning("⚠️ Some columns are missing from the results. Please check the mapping output.")
+    
+    # Download button
+    st.download_button(
+        label="📥 Download Theme & Perspective Mappings as Excel",
+        data=job.result["workbook"],
+        file_name="pain_point_theme_perspective_mappings.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
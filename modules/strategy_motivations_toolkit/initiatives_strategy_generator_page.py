@@ -2,13 +2,91 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 from langchain_core.messages import HumanMessage
-from app_config import model
+from app_config import get_model
 from prompts import (
     STRATEGY_GROUPING_PROMPT,
     STRATEGY_DETAILED_PROMPT,
 )
 
 from navigation import render_breadcrumbs
+from uploads import read_upload_sheet, upload_sheet_names
+from async_engine import run_async_tasks
+from streaming import LiveTable, stream_response
+
+# Detail lines under each strategic activity heading and the summary column each fills
+STRATEGY_DETAIL_FIELDS = {
+    "*Strategic Description:*": "Strategic_Description",
+    "*Success Factors:*": "Success_Factors",
+    "*Risk Considerations:*": "Risk_Considerations",
+    "*Expected Outcomes:*": "Expected_Outcomes",
+}
+
+
+class StrategyResponseParser:
+    """Parses the detailed strategic activities response one line at a time.
+
+    Each strategic activity is added to ``strategies_table`` once its details are
+    complete (when the next activity starts, or at ``finish``), and each mapping
+    table row to ``mapping_table`` as soon as it arrives.
+    """
+
+    def __init__(self, strategies_table, mapping_table):
+        self.strategies_table = strategies_table
+        self.mapping_table = mapping_table
+        self.strategies = []
+        self.mappings = []
+        self._current = None
+        self._in_mapping_table = False
+
+    def feed_line(self, line):
+        line = line.strip()
+        
+        # Check if we're in the mapping table section
+        if line.startswith("**TACTICS TO STRATEGIC ACTIVITIES MAPPING TABLE**"):
+            self._in_mapping_table = True
+            return
+        elif line.startswith("**STRATEGIC EXECUTION SUMMARY**"):
+            self._in_mapping_table = False
+            return
+        
+        # Parse mapping table data
+        if self._in_mapping_table and " | " in line and not line.startswith("Tactic_ID"):
+            parts = [p.strip() for p in line.split(" | ")]
+            if len(parts) >= 3:
+                mapping = {
+                    'Tactic_ID': parts[0],
+                    'Strategic_Activity_ID': parts[1],
+                    'Strategic_Activity_Name': parts[2]
+                }
+                self.mappings.append(mapping)
+                self.mapping_table.add(mapping)
+        
+        # Parse strategic activities
+        if line.startswith("**STRATEGIC ACTIVITY SA-"):
+            self._finish_strategy()
+            strategy_part = line.replace("**STRATEGIC ACTIVITY ", "").replace("**", "")
+            strategy_id, strategy_name = "", ""
+            if ":" in strategy_part:
+                strategy_id = strategy_part.split(":")[0].strip()
+                strategy_name = strategy_part.split(":", 1)[1].strip()
+            self._current = {'Strategic_Activity_ID': strategy_id, 'Strategic_Activity_Name': strategy_name}
+            self._current.update(dict.fromkeys(STRATEGY_DETAIL_FIELDS.values(), ""))
+        elif self._current is not None:
+            for prefix, field in STRATEGY_DETAIL_FIELDS.items():
+                if line.startswith(prefix):
+                    self._current[field] = line.replace(prefix, "").strip()
+                    break
+
+    def finish(self):
+        """Record the last strategic activity once the response has ended"""
+        self._finish_strategy()
+
+    def _finish_strategy(self):
+        if self._current and self._current['Strategic_Activity_ID']:
+            self.strategies.append(self._current)
+            self.strategies_table.add(self._current)
+        self._current = None
+
 def initiatives_strategy_generator_page():
     # Breadcrumb navigation as a single line with clickable elements
     render_breadcrumbs([("🏠 Home", "Home"), ("🎯 Strategy and Motivations Toolkit", "Strategy and Motivations Toolkit"), ("📈 Tactics to Strategies Generator", None)])
@@ -36,9 +114,8 @@ def initiatives_strategy_generator_page():
     if uploaded_file is not None:
         try:
             # Read the file
-            xls = pd.ExcelFile(uploaded_file)
-            sheet_name = st.selectbox("Select sheet to load", xls.sheet_names)
-            df = pd.read_excel(xls, sheet_name=sheet_name)
+            sheet_name = st.selectbox("Select sheet to load", upload_sheet_names(uploaded_file))
+            df = read_upload_sheet(uploaded_file, sheet_name)
             
             # Convert all columns to string to prevent PyArrow errors
             df = df.astype(str)
@@ -133,10 +210,9 @@ def generate_strategic_activities(df, id_column, description_columns, additional
         )
 
         try:
-            # Call AI for grouping analysis
-            message = HumanMessage(content=grouping_prompt)
-            response = model.invoke([message])
-            grouping_response = response.content.strip()
+            # Call AI for grouping analysis, streaming the reasoning as it is written
+            with st.expander("View Grouping Analysis", expanded=True):
+                grouping_response = stream_response(get_model(), [HumanMessage(content=grouping_prompt)], st.empty())
             
             # Parse the recommended number
             recommended_number = 5  # default fallback
@@ -149,8 +225,6 @@ def generate_strategic_activities(df, id_column, description_columns, additional
                         pass
             
             st.write(f"✅ **Recommended Strategic Activities:** {recommended_number}")
-            with st.expander("View Grouping Analysis", expanded=False):
-                st.markdown(grouping_response)
             
             # Step 2: Generate detailed strategic activities with IDs
             st.write("🎯 **Step 2:** Generating detailed strategic activities with mapping...")
@@ -162,13 +236,20 @@ def generate_strategic_activities(df, id_column, description_columns, additional
                 initiatives_text=initiatives_text,
             )
 
-            # Call AI for detailed analysis
-            message = HumanMessage(content=detailed_prompt)
-            response = model.invoke([message])
-            ai_response = response.content.strip()
-            
-            # Display results
+            # Stream the detailed analysis; strategies and mappings fill their tables as they are parsed
             st.markdown("## 🎯 Strategic Activities Analysis")
+            st.markdown("#### Strategic Activities")
+            strategies_table = LiveTable(st.empty(), ["Strategic_Activity_ID", "Strategic_Activity_Name",
+                                                       "Strategic_Description"])
+            st.markdown("#### Tactics to Strategic Activities")
+            mapping_table = LiveTable(st.empty(), ["Tactic_ID", "Strategic_Activity_ID", "Strategic_Activity_Name"])
+            parser = StrategyResponseParser(strategies_table, mapping_table)
+            with st.expander("View Full Analysis", expanded=False):
+                ai_response = stream_response(get_model(), [HumanMessage(content=detailed_prompt)], st.empty(),
+                                              on_line=parser.feed_line)
+            parser.finish()
+            strategies_summary = parser.strategies
+            tactics_to_strategies_mapping = parser.mappings
             
             # Initiative summary
             col1, col2, col3 = st.columns(3)
@@ -186,94 +267,6 @@ def generate_strategic_activities(df, id_column, description_columns, additional
             
             st.markdown("---")
             
-            # Parse AI response for Excel creation
-            tactics_to_strategies_mapping = []
-            strategies_summary = []
-            
-            # Parse the AI response to extract structured data
-            lines = ai_response.split('\n')
-            current_strategy_id = None
-            current_strategy_name = None
-            current_description = ""
-            current_tactics = ""
-            current_success_factors = ""
-            current_risks = ""
-            current_outcomes = ""
-            
-            # Extract mapping table data
-            in_mapping_table = False
-            
-            for line in lines:
-                line = line.strip()
-                
-                # Check if we're in the mapping table section
-                if line.startswith("**TACTICS TO STRATEGIC ACTIVITIES MAPPING TABLE**"):
-                    in_mapping_table = True
-                    continue
-                elif line.startswith("**STRATEGIC EXECUTION SUMMARY**"):
-                    in_mapping_table = False
-                    continue
-                
-                # Parse mapping table data
-                if in_mapping_table and " | " in line and not line.startswith("Tactic_ID"):
-                    parts = [p.strip() for p in line.split(" | ")]
-                    if len(parts) >= 3:
-                        tactics_to_strategies_mapping.append({
-                            'Tactic_ID': parts[0],
-                            'Strategic_Activity_ID': parts[1],
-                            'Strategic_Activity_Name': parts[2]
-                        })
-                
-                # Parse strategic activities
-                if line.startswith("**STRATEGIC ACTIVITY SA-"):
-                    # Save previous strategy if exists
-                    if current_strategy_id:
-                        strategies_summary.append({
-                            'Strategic_Activity_ID': current_strategy_id,
-                            'Strategic_Activity_Name': current_strategy_name,
-                            'Strategic_Description': current_description,
-                            'Success_Factors': current_success_factors,
-                            'Risk_Considerations': current_risks,
-                            'Expected_Outcomes': current_outcomes
-                        })
-                    
-                    # Extract new strategy ID and name
-                    strategy_part = line.replace("**STRATEGIC ACTIVITY ", "").replace("**", "")
-                    if ":" in strategy_part:
-                        current_strategy_id = strategy_part.split(":")[0].strip()
-                        current_strategy_name = strategy_part.split(":", 1)[1].strip()
-                    else:
-                        current_strategy_id = ""
-                        current_strategy_name = ""
-                    
-                    current_description = ""
-                    current_tactics = ""
-                    current_success_factors = ""
-                    current_risks = ""
-                    current_outcomes = ""
-                
-                elif line.startswith("*Strategic Description:*"):
-                    current_description = line.replace("*Strategic Description:*", "").strip()
-                elif line.startswith("*Mapped Tactics:*"):
-                    current_tactics = line.replace("*Mapped Tactics:*", "").strip()
-                elif line.startswith("*Success Factors:*"):
-                    current_success_factors = line.replace("*Success Factors:*", "").strip()
-                elif line.startswith("*Risk Considerations:*"):
-                    current_risks = line.replace("*Risk Considerations:*", "").strip()
-                elif line.startswith("*Expected Outcomes:*"):
-                    current_outcomes = line.replace("*Expected Outcomes:*", "").strip()
-            
-            # Don't forget the last strategy
-            if current_strategy_id:
-                strategies_summary.append({
-                    'Strategic_Activity_ID': current_strategy_id,
-                    'Strategic_Activity_Name': current_strategy_name,
-                    'Strategic_Description': current_description,
-                    'Success_Factors': current_success_factors,
-                    'Risk_Considerations': current_risks,
-                    'Expected_Outcomes': current_outcomes
-                })
-            
             # Validate mapping coverage
             mapped_tactics = set([mapping['Tactic_ID'] for mapping in tactics_to_strategies_mapping])
             all_tactics = set([str(row[id_column]) for _, row in df_clean.iterrows()])
@@ -292,8 +285,9 @@ def generate_strategic_activities(df, id_column, description_columns, additional
             # Step 3: Generate strategic assessment for each strategy
             st.write("📋 **Step 3:** Assessing individual strategic activities with SWOT analysis...")
             
-            # Generate SWOT analysis for each strategic activity
+            # Build a SWOT prompt for each strategic activity, then request them concurrently
             strategy_assessments = []
+            swot_prompts = []
             
             for strategy in strategies_summary:
                 strategy_id = strategy.get('Strategic_Activity_ID', '')
@@ -343,19 +337,23 @@ Return your analysis in this exact format:
 
 SWOT Analysis:"""
 
-                # Call AI for SWOT analysis
-                message = HumanMessage(content=swot_prompt)
-                response = model.invoke([message])
-                swot_response = response.content.strip()
-                
+                swot_prompts.append(swot_prompt)
                 strategy_assessments.append({
                     'strategy_id': strategy_id,
                     'strategy_name': strategy_name,
                     'strategy_description': strategy_description,
-                    'supporting_tactics': strategy_tactics,
-                    'swot_analysis': swot_response
+                    'supporting_tactics': strategy_tactics
                 })
             
+            # Call AI for SWOT analysis
+            async def generate_swot(swot_prompt):
+                response = await get_model().ainvoke([HumanMessage(content=swot_prompt)])
+                return response.content.strip()
+            
+            swot_responses = run_async_tasks(swot_prompts, generate_swot)
+            for assessment, swot_response in zip(strategy_assessments, swot_responses):
+                assessment['swot_analysis'] = swot_response
+            
             st.write("✅ **Strategic Assessment Complete**")
             
             # Create comprehensive Excel download
@@ -1,10 +1,14 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from langchain_core.messages import HumanMessage
-from app_config import model
-from prompts import STRATEGY_CAPABILITY_MAPPING_PROMPT
+from app_config import get_model
 from navigation import render_breadcrumbs
+from uploads import read_upload_columns, read_upload_preview, upload_sheet_columns, upload_sheet_names
+from background_jobs import job_manager, render_job_outcome, track_job, tracked_job
+from core.strategy_capability_mapping import run_strategy_capability_mapping
+from core.retrieval import embedding_warning, embeddings_usable, load_shortlist_k
+from core.workbook import workbook_bytes
+
+TOOL_NAME = "Strategy to Capability Mapping"
+JOB_KEY = "strategy_capability_mapping_job"
 
 def strategy_capability_mapping_page():
     # Breadcrumb navigation as a single line with clickable elements
@@ -36,26 +40,27 @@ def strategy_capability_mapping_page():
         
         if strategies_file is not None:
             # Load strategies file
-            xls = pd.ExcelFile(strategies_file)
-            strategy_sheet = st.selectbox("Select sheet for strategic initiatives", xls.sheet_names, key="strategy_sheet")
-            strategies_df = pd.read_excel(xls, sheet_name=strategy_sheet)
-            st.session_state['strategies_df'] = strategies_df
+            strategy_sheet = st.selectbox("Select sheet for strategic initiatives", upload_sheet_names(strategies_file), key="strategy_sheet")
+            # Only the header row and a preview here; the selected columns are loaded once chosen
+            strategy_columns = upload_sheet_columns(strategies_file, strategy_sheet)
             
             st.write("**Preview:**")
-            st.dataframe(strategies_df.head())
+            st.dataframe(read_upload_preview(strategies_file, strategy_sheet, rows=5))
             
             # Column selection for strategies
             strategy_id_col = st.selectbox(
                 "Select Strategic Initiative ID column", 
-                strategies_df.columns,
+                strategy_columns,
                 key="strategy_id_col"
             )
             strategy_text_cols = st.multiselect(
                 "Select Strategic Initiative text columns (will be concatenated)", 
-                strategies_df.columns,
+                strategy_columns,
                 key="strategy_text_cols",
                 help="Select one or more columns to describe the strategic initiative (e.g., title, description, objectives, outcomes)"
             )
+            st.session_state['strategies_df'] = read_upload_columns(
+                strategies_file, strategy_sheet, [strategy_id_col] + strategy_text_cols)
             
             # Store column selections in session state (but not with widget key names)
             st.session_state['strategy_columns']['id'] = strategy_id_col
@@ -71,26 +76,27 @@ def strategy_capability_mapping_page():
         
         if capabilities_file is not None:
             # Load capabilities file
-            xls = pd.ExcelFile(capabilities_file)
-            cap_sheet = st.selectbox("Select sheet for capabilities", xls.sheet_names, key="cap_sheet")
-            capabilities_df = pd.read_excel(xls, sheet_name=cap_sheet)
-            st.session_state['capabilities_df'] = capabilities_df
+            cap_sheet = st.selectbox("Select sheet for capabilities", upload_sheet_names(capabilities_file), key="cap_sheet")
+            # Only the header row and a preview here; the selected columns are loaded once chosen
+            cap_columns = upload_sheet_columns(capabilities_file, cap_sheet)
             
             st.write("**Preview:**")
-            st.dataframe(capabilities_df.head())
+            st.dataframe(read_upload_preview(capabilities_file, cap_sheet, rows=5))
             
             # Column selection for capabilities
             cap_id_col = st.selectbox(
                 "Select Capability ID column", 
-                capabilities_df.columns,
+                cap_columns,
                 key="cap_id_col"
             )
             cap_text_cols = st.multiselect(
                 "Select Capability text columns (will be concatenated)", 
-                capabilities_df.columns,
+                cap_columns,
                 key="cap_text_cols",
                 help="Select one or more columns to describe the capability (e.g., name, description, details)"
             )
+            st.session_state['capabilities_df'] = read_upload_columns(
+                capabilities_file, cap_sheet, [cap_id_col] + cap_text_cols)
             
             # Store column selections in session state (but not with widget key names)
             st.session_state['cap_columns']['id'] = cap_id_col
@@ -114,139 +120,90 @@ def strategy_capability_mapping_page():
         )
         
         # Batch size control
-        batch_size = st.number_input(
-            'Batch size (number of strategic initiatives to process together)', 
-            min_value=1, max_value=50, value=10,
-            help="Larger batches are faster but may be less accurate. Smaller batches are more precise but slower."
+        auto_batch_size = st.checkbox(
+            "Size batches automatically",
+            value=True,
+            help="Pack as many strategic initiatives into each request as fit the model's token limits, up to the configured maximum."
         )
+        batch_size = None
+        if not auto_batch_size:
+            batch_size = st.number_input(
+                'Batch size (number of strategic initiatives to process together)', 
+                min_value=1, max_value=50, value=10,
+                help="Larger batches are faster but may be less accurate. Smaller batches are more precise but slower."
+            )
+
+        # Optional embedding shortlist for large capability catalogues
+        use_shortlist = st.checkbox(
+            "Shortlist capabilities with embeddings",
+            value=False,
+            help="Send each batch only the capabilities most similar to its strategic initiatives instead of the whole catalogue. "
+                 "Cuts prompt size and latency on large capability models."
+        )
+        shortlist_k = None
+        if use_shortlist:
+            shortlist_k = st.number_input(
+                "Capabilities shortlisted per strategic initiative:",
+                min_value=1, max_value=100, value=load_shortlist_k()
+            )
+            if embedding_warning():
+                if embeddings_usable():
+                    st.warning(embedding_warning())
+                else:
+                    st.error(embedding_warning())
         
-        if st.button("Generate AI Mappings", type="primary"):
+        job = tracked_job(JOB_KEY)
+        running = job is not None and not job.finished_state
+        blocked = use_shortlist and not embeddings_usable()
+        if st.button("Generate AI Mappings", type="primary", disabled=running or blocked):
             strategies_df = st.session_state['strategies_df']
-            capabilities_df = st.session_state['capabilities_df']
-            strategy_id_col = st.session_state['strategy_columns']['id']
-            strategy_text_cols = st.session_state['strategy_columns']['text']
-            cap_id_col = st.session_state['cap_columns']['id']
-            cap_text_cols = st.session_state['cap_columns']['text']
-            
-            mappings = []
-            
-            with st.spinner("Generating mappings with AI..."):
-                progress_bar = st.progress(0)
-                total_strategies = len(strategies_df)
-                
-                # Process in batches
-                for batch_start in range(0, total_strategies, batch_size):
-                    batch_end = min(batch_start + batch_size, total_strategies)
-                    batch_df = strategies_df.iloc[batch_start:batch_end]
-                    
-                    st.write(f"Processing strategic initiatives {batch_start + 1} to {batch_end} of {total_strategies}")
-                    
-                    # Build prompt using template
-                    strategies_lines = []
-                    for _, strategy_row in batch_df.iterrows():
-                        strategy_id = strategy_row[strategy_id_col]
-                        strategy_text_parts = []
-                        for col in strategy_text_cols:
-                            if pd.notna(strategy_row[col]):
-                                strategy_text_parts.append(str(strategy_row[col]))
-                        strategy_text = " ".join(strategy_text_parts)
-                        strategies_lines.append(f"- {strategy_id}: {strategy_text}")
-                    strategies_text = "\n".join(strategies_lines)
+            job = job_manager.submit(
+                TOOL_NAME, f"{len(strategies_df)} strategic initiatives", run_strategy_mapping_job,
+                strategies_df, st.session_state['strategy_columns']['id'], st.session_state['strategy_columns']['text'],
+                st.session_state['capabilities_df'], st.session_state['cap_columns']['id'],
+                st.session_state['cap_columns']['text'],
+                additional_context, batch_size, shortlist_k,
+            )
+            track_job(JOB_KEY, job)
 
-                    capabilities_lines = []
-                    for _, cap_row in capabilities_df.iterrows():
-                        cap_id = cap_row[cap_id_col]
-                        cap_text_parts = []
-                        for col in cap_text_cols:
-                            if pd.notna(cap_row[col]):
-                                cap_text_parts.append(str(cap_row[col]))
-                        cap_text = " ".join(cap_text_parts)
-                        capabilities_lines.append(f"- {cap_id}: {cap_text}")
-                    capabilities_text = "\n".join(capabilities_lines)
+    # Shown even after the uploads are cleared by navigating away and back
+    show_strategy_mapping_job()
 
-                    batch_mapping_prompt = STRATEGY_CAPABILITY_MAPPING_PROMPT.format(
-                        strategies_text=strategies_text,
-                        capabilities_text=capabilities_text,
-                        additional_context=additional_context,
-                    )
-                    
-                    # Get AI response for the batch
-                    output = model.invoke([HumanMessage(content=batch_mapping_prompt)])
-                    batch_results = output.content.strip()
-                    
-                    # Parse the batch results
-                    for line in batch_results.split('\n'):
-                        line = line.strip()
-                        if '->' in line:
-                            try:
-                                strategy_id, capability_ids = line.split('->', 1)
-                                strategy_id = strategy_id.strip()
-                                capability_ids = capability_ids.strip()
-                                
-                                # Clean strategy_id - remove any leading dashes or other characters
-                                # Only keep alphanumeric characters and common ID separators
-                                import re
-                                strategy_id = re.sub(r'^[^a-zA-Z0-9]*', '', strategy_id)
-                                strategy_id = re.sub(r'[^a-zA-Z0-9_\-\.]*$', '', strategy_id)
-                                
-                                # Validate that this strategy_id exists in our data
-                                strategy_ids_in_batch = batch_df[strategy_id_col].astype(str).tolist()
-                                if strategy_id not in strategy_ids_in_batch:
-                                    continue  # Skip if strategy ID doesn't match our data
-                                
-                                # Handle multiple capabilities or NONE
-                                if capability_ids.upper() == 'NONE':
-                                    # Strategy has no required capabilities - skip
-                                    continue
-                                else:
-                                    # Split by comma for multiple capabilities
-                                    cap_list = [cap.strip() for cap in capability_ids.split(',')]
-                                    
-                                    # Get valid capability IDs from our data for validation
-                                    valid_cap_ids = capabilities_df[cap_id_col].astype(str).tolist()
-                                    
-                                    # Create one mapping entry for each capability
-                                    for capability_id in cap_list:
-                                        if capability_id:  # Ensure not empty
-                                            # Clean capability_id - remove any leading/trailing characters
-                                            capability_id = re.sub(r'^[^a-zA-Z0-9]*', '', capability_id)
-                                            capability_id = re.sub(r'[^a-zA-Z0-9_\-\.]*$', '', capability_id)
-                                            
-                                            # Validate that this capability_id exists in our data
-                                            if capability_id in valid_cap_ids:
-                                                mappings.append({
-                                                    'Strategic_Initiative_ID': strategy_id,
-                                                    'Capability_ID': capability_id
-                                                })
-                            except ValueError:
-                                # Skip malformed lines
-                                continue
-                    
-                    # Update progress
-                    progress = batch_end / total_strategies
-                    progress_bar.progress(progress)
-                
-                progress_bar.progress(1.0)
-            
-            # Create mappings dataframe
-            mappings_df = pd.DataFrame(mappings)
-            
-            if not mappings_df.empty:
-                st.session_state['strategy_mappings_df'] = mappings_df
-                
-                st.markdown("### 📊 Mapping Results")
-                st.dataframe(mappings_df)
-                
-                # Download button
-                buffer = BytesIO()
-                mappings_df.to_excel(buffer, index=False, engine='openpyxl')
-                buffer.seek(0)
-                
-                st.download_button(
-                    label="📥 Download Mappings as Excel",
-                    data=buffer.getvalue(),
-                    file_name="strategy_capability_mappings.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-            else:
-                st.warning("No capability mappings were generated. This could mean all strategies were mapped to 'NONE' or there was an issue with the AI response format.")
+def run_strategy_mapping_job(job, strategies_df, strategy_id_col, strategy_text_cols,
+                             capabilities_df, cap_id_col, cap_text_cols, additional_context, batch_size, shortlist_k):
+    """Run the mapping in a background job; the workbook is built here so it includes the run's metrics"""
+    mappings_df = run_strategy_capability_mapping(
+        get_model(), strategies_df, strategy_id_col, strategy_text_cols,
+        capabilities_df, cap_id_col, cap_text_cols, additional_context, batch_size,
+        on_progress=job.progress,
+        shortlist_k=shortlist_k,
+    )
+    return {"mappings_df": mappings_df, "workbook": workbook_bytes({'Sheet1': mappings_df}, job.run)}
+
+def show_strategy_mapping_job():
+    """Progress of the session's mapping job, then its results"""
+    job = tracked_job(JOB_KEY)
+    if job is None:
+        return
+    
+    st.markdown("### 🔄 Generating Mappings")
+    
+    if not render_job_outcome(job, "Strategy mapping"):
+        return
+    
+    mappings_df = job.result["mappings_df"]
+    if not mappings_df.empty:
+        st.session_state['strategy_mappings_df'] = mappings_df
+        
+        st.markdown("### 📊 Mapping Results")
+        st.dataframe(mappings_df)
+        
+        # Download button
+        st.download_button(
+            label="📥 Download Mappings as Excel",
+            data=job.result["workbook"],
+            file_name="strategy_capability_mappings.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    else:
+        st.warning("No capability mappings were generated. This could mean all strategies were mapped to 'NONE' or there was an issue with the AI response format.")
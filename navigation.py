@@ -1,5 +1,11 @@
+import threading
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
 import streamlit as st
-from typing import List, Tuple, Optional, Callable
+
+from import_timing import timed_import
 
 # Type alias for breadcrumb items
 BreadcrumbItem = Tuple[str, Optional[str]]  # (label, target page)
@@ -52,58 +58,78 @@ def render_breadcrumbs(items: List[BreadcrumbItem]) -> None:
 
 # Mapping of page names to their corresponding functions
 PageFunc = Callable[[], None]
-PAGE_ROUTES: dict[str, PageFunc] = {}
-
-# Page modules imported below for route mapping
-from modules.home_page import home_page
-from modules.pain_point_toolkit.pain_point_toolkit_page import pain_point_toolkit_page
-from modules.capability_toolkit.capability_toolkit_page import capability_toolkit_page
-from modules.capability_toolkit.capability_description_page import capability_description_page
-from modules.applications_toolkit.applications_toolkit_page import applications_toolkit_page
-from modules.pain_point_toolkit.pain_point_extraction_page import pain_point_extraction_page
-from modules.pain_point_toolkit.capability_mapping_page import capability_mapping_page
-from modules.pain_point_toolkit.theme_creation_page import theme_creation_page
-from modules.pain_point_toolkit.pain_point_impact_estimation_page import pain_point_impact_estimation_page
-from modules.applications_toolkit.application_capability_mapping_page import application_capability_mapping_page
-from modules.applications_toolkit.application_categorization_page import application_categorization_page
-from modules.applications_toolkit.logical_application_model_generator_page import logical_application_model_generator_page
-from modules.applications_toolkit.individual_application_mapping_page import individual_application_mapping_page
-from modules.engagement_planning_toolkit.engagement_planning_toolkit_page import engagement_planning_toolkit_page
-from modules.engagement_planning_toolkit.engagement_touchpoint_planning_page import engagement_touchpoint_planning_page
-from modules.strategy_motivations_toolkit.strategy_motivations_toolkit_page import strategy_motivations_toolkit_page
-from modules.strategy_motivations_toolkit.strategy_capability_mapping_page import strategy_capability_mapping_page
-from modules.strategy_motivations_toolkit.initiatives_strategy_generator_page import initiatives_strategy_generator_page
-from modules.data_information_toolkit.data_information_toolkit_page import data_information_toolkit_page
-from modules.data_information_toolkit.conceptual_data_model_generator_page import conceptual_data_model_generator_page
-from modules.data_information_toolkit.data_application_mapping_page import data_application_mapping_page
-from modules.data_information_toolkit.ai_use_case_customiser_page import ai_use_case_customiser_page
-from modules.data_information_toolkit.use_case_ethics_review_page import use_case_ethics_review_page
-from modules.admin_tool_page import admin_tool_page
-
-# Dictionary mapping page names to functions
-PAGE_ROUTES: dict[str, PageFunc] = {
-    "Home": home_page,
-    "Pain Point Toolkit": pain_point_toolkit_page,
-    "Capability Toolkit": capability_toolkit_page,
-    "Applications Toolkit": applications_toolkit_page,
-    "Engagement Planning Toolkit": engagement_planning_toolkit_page,
-    "Strategy and Motivations Toolkit": strategy_motivations_toolkit_page,
-    "Data, Information, and AI Toolkit": data_information_toolkit_page,
-    "Pain Point Extraction": pain_point_extraction_page,
-    "Pain Point Theme Creation": theme_creation_page,
-    "Pain Point to Capability Mapping": capability_mapping_page,
-    "Pain Point Impact Estimation": pain_point_impact_estimation_page,
-    "Application to Capability Mapping": application_capability_mapping_page,
-    "Application Categorisation": application_categorization_page,
-    "Logical Application Model Generator": logical_application_model_generator_page,
-    "Individual Application to Capability Mapping": individual_application_mapping_page,
-    "Engagement Touchpoint Planning": engagement_touchpoint_planning_page,
-    "Capability Description Generation": capability_description_page,
-    "Strategy to Capability Mapping": strategy_capability_mapping_page,
-    "Tactics to Strategies Generator": initiatives_strategy_generator_page,
-    "Conceptual Data Model Generator": conceptual_data_model_generator_page,
-    "Data-Application Mapping": data_application_mapping_page,
-    "AI Use Case Customiser": ai_use_case_customiser_page,
-    "Use Case Ethics Review": use_case_ethics_review_page,
-    "Admin Tool": admin_tool_page,
+
+# Module and function of each page, imported on first visit so that opening
+# the Home page doesn't load every tool's dependencies
+PAGE_MODULES: Dict[str, Tuple[str, str]] = {
+    "Home": ("modules.home_page", "home_page"),
+    "Pain Point Toolkit": ("modules.pain_point_toolkit.pain_point_toolkit_page", "pain_point_toolkit_page"),
+    "Capability Toolkit": ("modules.capability_toolkit.capability_toolkit_page", "capability_toolkit_page"),
+    "Applications Toolkit": ("modules.applications_toolkit.applications_toolkit_page", "applications_toolkit_page"),
+    "Engagement Planning Toolkit": ("modules.engagement_planning_toolkit.engagement_planning_toolkit_page",
+                                    "engagement_planning_toolkit_page"),
+    "Strategy and Motivations Toolkit": ("modules.strategy_motivations_toolkit.strategy_motivations_toolkit_page",
+                                         "strategy_motivations_toolkit_page"),
+    "Data, Information, and AI Toolkit": ("modules.data_information_toolkit.data_information_toolkit_page",
+                                          "data_information_toolkit_page"),
+    "Pain Point Extraction": ("modules.pain_point_toolkit.pain_point_extraction_page", "pain_point_extraction_page"),
+    "Pain Point Theme Creation": ("modules.pain_point_toolkit.theme_creation_page", "theme_creation_page"),
+    "Pain Point to Capability Mapping": ("modules.pain_point_toolkit.capability_mapping_page", "capability_mapping_page"),
+    "Pain Point Impact Estimation": ("modules.pain_point_toolkit.pain_point_impact_estimation_page",
+                                     "pain_point_impact_estimation_page"),
+    "Application to Capability Mapping": ("modules.applications_toolkit.application_capability_mapping_page",
+                                          "application_capability_mapping_page"),
+    "Application Categorisation": ("modules.applications_toolkit.application_categorization_page",
+                                   "application_categorization_page"),
+    "Logical Application Model Generator": ("modules.applications_toolkit.logical_application_model_generator_page",
+                                            "logical_application_model_generator_page"),
+    "Individual Application to Capability Mapping": ("modules.applications_toolkit.individual_application_mapping_page",
+                                                     "individual_application_mapping_page"),
+    "Engagement Touchpoint Planning": ("modules.engagement_planning_toolkit.engagement_touchpoint_planning_page",
+                                       "engagement_touchpoint_planning_page"),
+    "Capability Description Generation": ("modules.capability_toolkit.capability_description_page",
+                                          "capability_description_page"),
+    "Strategy to Capability Mapping": ("modules.strategy_motivations_toolkit.strategy_capability_mapping_page",
+                                       "strategy_capability_mapping_page"),
+    "Tactics to Strategies Generator": ("modules.strategy_motivations_toolkit.initiatives_strategy_generator_page",
+                                        "initiatives_strategy_generator_page"),
+    "Conceptual Data Model Generator": ("modules.data_information_toolkit.conceptual_data_model_generator_page",
+                                        "conceptual_data_model_generator_page"),
+    "Data-Application Mapping": ("modules.data_information_toolkit.data_application_mapping_page",
+                                 "data_application_mapping_page"),
+    "AI Use Case Customiser": ("modules.data_information_toolkit.ai_use_case_customiser_page",
+                               "ai_use_case_customiser_page"),
+    "Use Case Ethics Review": ("modules.data_information_toolkit.use_case_ethics_review_page",
+                               "use_case_ethics_review_page"),
+    "Admin Tool": ("modules.admin_tool_page", "admin_tool_page"),
 }
+
+
+class LazyPageRoutes(Mapping):
+    """Page functions by page name, importing each page's module the first time it is looked up"""
+
+    def __init__(self, page_modules: Dict[str, Tuple[str, str]]):
+        self._page_modules = page_modules
+        self._pages: Dict[str, PageFunc] = {}
+        self._lock = threading.RLock()
+        # Seconds spent importing each page's module on its first visit
+        self.load_seconds: Dict[str, float] = {}
+
+    def __getitem__(self, page: str) -> PageFunc:
+        with self._lock:
+            if page not in self._pages:
+                module_name, function_name = self._page_modules[page]
+                started = time.perf_counter()
+                module = timed_import(module_name, trigger=page)
+                self.load_seconds[page] = time.perf_counter() - started
+                self._pages[page] = getattr(module, function_name)
+            return self._pages[page]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._page_modules)
+
+    def __len__(self) -> int:
+        return len(self._page_modules)
+
+
+PAGE_ROUTES = LazyPageRoutes(PAGE_MODULES)
@@ -2,15 +2,15 @@
 
 from langchain.prompts import PromptTemplate
 
-# Pain Point Theme & Perspective Mapping prompt template
-THEME_PERSPECTIVE_MAPPING_PROMPT = PromptTemplate(
-    input_variables=["pain_points", "themes", "perspectives", "additional_context"],
+# Pain Point Theme & Perspective Mapping prompts. The system prompt (instructions and the
+# theme/perspective lists) is identical for every batch so the provider can cache it as a
+# prefix; only the batch prompt with the pain points changes between calls.
+THEME_PERSPECTIVE_MAPPING_SYSTEM_PROMPT = PromptTemplate(
+    input_variables=["themes", "perspectives", "additional_context"],
     template="""You are an expert management consultant specialising in organisational analysis.
 
 Your task: Map each pain point to the MOST APPROPRIATE theme and perspective from the provided lists.
 
-Pain Points to Map:
-{pain_points}
 Available Themes:
 {themes}
 Available Perspectives:
@@ -29,20 +29,24 @@ PAIN_POINT_ID -> THEME: [theme_name] | PERSPECTIVE: [perspective_name]
 Example format:
 PP001 -> THEME: Technology Limitations | PERSPECTIVE: Technology
 PP002 -> THEME: Manual Processes | PERSPECTIVE: Process
-PP003 -> THEME: Skills & Capacity | PERSPECTIVE: People
+PP003 -> THEME: Skills & Capacity | PERSPECTIVE: People"""
+)
 
+THEME_PERSPECTIVE_MAPPING_BATCH_PROMPT = PromptTemplate(
+    input_variables=["pain_points"],
+    template="""Pain Points to Map:
+{pain_points}
 Mappings:"""
 )
 
-# Pain Point to Capability Mapping prompt template
-PAIN_POINT_CAPABILITY_MAPPING_PROMPT = PromptTemplate(
-    input_variables=["pain_points", "capabilities", "additional_context"],
+# Pain Point to Capability Mapping prompts: cacheable system prefix (instructions and
+# capability list) followed by the per-batch pain points
+PAIN_POINT_CAPABILITY_MAPPING_SYSTEM_PROMPT = PromptTemplate(
+    input_variables=["capabilities", "additional_context"],
     template="""You are an expert management consultant specialising in organisational capabilities.
 
 Your task: Match each pain point to the MOST APPROPRIATE capability from the provided list.
 
-Pain Points to Match:
-{pain_points}
 Available Capabilities:
 {capabilities}
 Additional Context: {additional_context}
@@ -57,13 +61,19 @@ PAIN_POINT_ID -> CAPABILITY_ID
 Example format:
 PP001 -> CAP003
 PP002 -> CAP007
-PP003 -> CAP001
+PP003 -> CAP001"""
+)
 
+PAIN_POINT_CAPABILITY_MAPPING_BATCH_PROMPT = PromptTemplate(
+    input_variables=["pain_points"],
+    template="""Pain Points to Match:
+{pain_points}
 Mappings:"""
 )
 
-# Application to Capability Mapping prompt template
-APPLICATION_CAPABILITY_MAPPING_PROMPT = PromptTemplate(
+# Application to Capability Mapping prompts: cacheable system prefix (instructions and
+# capability list) followed by the per-batch applications
+APPLICATION_CAPABILITY_MAPPING_SYSTEM_PROMPT = PromptTemplate(
     input_variables=["capabilities", "context_section"],
     template="""You are an enterprise architect mapping software applications to a business-capability model for a residential construction and home-building organisation.
 
@@ -77,17 +87,21 @@ APPLICATION_CAPABILITY_MAPPING_PROMPT = PromptTemplate(
    supports that business function. Ignore incidental or indirect links.
 
 **Output rules (show only these in your answer):**
-• Return just the Capability IDs, separated by commas, for each application.  
-• Preserve the exact "Application Name:" label before the IDs.  
-• If no clear capability match exists, output `NONE`.  
+• Return a single JSON object whose keys are the application IDs exactly as given and whose values are lists of Capability IDs, e.g. {{"APP-01": ["CAP-03", "CAP-11"], "APP-02": []}}.  
+• Include every application in the batch.  
+• If no clear capability match exists, use an empty list.  
 • Provide no explanations, qualifiers, or extra text.
 
 {context_section}
 
 Available Capabilities:
-{capabilities}
+{capabilities}"""
+)
 
-Applications to map:"""
+APPLICATION_CAPABILITY_MAPPING_BATCH_PROMPT = PromptTemplate(
+    input_variables=["applications"],
+    template="""Applications to map:
+{applications}"""
 )
 
 # Engagement Touchpoint Planning prompt template
@@ -258,15 +272,14 @@ Tactical Initiatives to Analyse and Map ({total_initiatives} total):
 Strategic Analysis:"""
 )
 
-# Strategic Initiative to Capability Mapping prompt template
-STRATEGY_CAPABILITY_MAPPING_PROMPT = PromptTemplate(
-    input_variables=["strategies_text", "capabilities_text", "additional_context"],
+# Strategic Initiative to Capability Mapping prompts: cacheable system prefix (instructions
+# and capability list) followed by the per-batch initiatives
+STRATEGY_CAPABILITY_MAPPING_SYSTEM_PROMPT = PromptTemplate(
+    input_variables=["capabilities_text", "additional_context"],
     template="""You are an expert strategy consultant specialising in organisational capabilities and strategic implementation.
 
 Your task: Match each strategic initiative to the MOST APPROPRIATE capability from the provided list.
 
-Strategic Initiatives to Match:
-{strategies_text}
 Available Capabilities:
 {capabilities_text}
 Additional Context: {additional_context}
@@ -285,7 +298,12 @@ Example format:
 STRAT001 -> CAP003, CAP007
 STRAT002 -> CAP012
 STRAT003 -> NONE
-STRAT004 -> CAP001, CAP005, CAP009
+STRAT004 -> CAP001, CAP005, CAP009"""
+)
 
+STRATEGY_CAPABILITY_MAPPING_BATCH_PROMPT = PromptTemplate(
+    input_variables=["strategies_text"],
+    template="""Strategic Initiatives to Match:
+{strategies_text}
 Mappings:"""
 )
@@ -0,0 +1,392 @@
+"""Client-side rate limiting for OpenAI requests.
+
+``RateLimiter`` keeps two token buckets, one for requests per minute and one
+for tokens per minute, and an adaptive cap on requests in flight. Every
+request reserves one request plus its estimated token count before it is
+sent. A 429 response pauses all callers for the server's ``retry-after`` (or
+an exponential backoff) plus jitter, halves the in-flight cap and retries the
+request. Successful responses feed the ``x-ratelimit-*`` headers back into the
+buckets and grow the cap again, so throughput settles just under the account
+limit instead of failing rows.
+
+The limiter is installed as an httpx transport on the chat model's sync and
+async HTTP clients, so every tool goes through it without code changes. A
+request holds its in-flight slot until its response body has been read and
+closed, so streamed completions count against the cap for as long as they
+stream. A 429 still failing after the limiter's retries is marked so the
+OpenAI SDK doesn't retry it again on top.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import weakref
+from typing import Optional
+
+import httpx
+
+from run_context import note_retry
+
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_MAX_RETRIES = 6
+
+# Tokens assumed for a completion when the request sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 500
+# Poll interval while waiting for a free in-flight slot
+SLOT_POLL_SECONDS = 0.05
+# Shrink the in-flight cap when fewer than this share of requests remain
+LOW_REMAINING_RATIO = 0.1
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as ``"120ms"``, ``"1s"`` or ``"6m0s"`` into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """Estimate the tokens a chat completion request will count against the TPM limit"""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return 1
+    if not isinstance(body, dict):
+        return 1
+    # Roughly four characters per token for English prompts
+    prompt_chars = len(json.dumps(body.get("messages", body.get("input", ""))))
+    completion_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // 4 + int(completion_tokens)
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _retry_after(headers) -> Optional[float]:
+    """Server-requested wait in seconds, if the response carries one"""
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """Refilling budget of ``per_minute`` units; not thread-safe on its own"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 when they already are)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60 / self.capacity
+
+    def consume(self, amount: float) -> None:
+        self.available -= min(amount, self.capacity)
+
+    def set_limit(self, per_minute: float) -> None:
+        if per_minute > 0 and per_minute != self.capacity:
+            self.capacity = float(per_minute)
+            self.available = min(self.available, self.capacity)
+
+    def sync_remaining(self, remaining: float, now: float) -> None:
+        """Never believe we have more budget than the server says is left"""
+        self._refill(now)
+        self.available = min(self.available, float(remaining))
+
+
+class RateLimiter:
+    """Shared RPM/TPM budget and adaptive in-flight cap for all model calls"""
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.concurrency_limit = float(self.max_in_flight)
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited_count = 0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Reserve a slot and budget, or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.concurrency_limit):
+                return SLOT_POLL_SECONDS
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def acquire(self, tokens: int) -> None:
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int) -> None:
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, response: Optional[httpx.Response]) -> None:
+        """Free the in-flight slot and learn from the response headers"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if response is None:
+                return
+            if response.status_code != 429:
+                # Additive increase: roughly one extra slot per window of successful calls
+                self.concurrency_limit = min(self.max_in_flight,
+                                             self.concurrency_limit + 1 / self.concurrency_limit)
+            self._apply_headers(response.headers, time.monotonic())
+
+    def _apply_headers(self, headers, now: float) -> None:
+        limit_requests = _header_int(headers, "x-ratelimit-limit-requests")
+        limit_tokens = _header_int(headers, "x-ratelimit-limit-tokens")
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        if limit_requests:
+            self.requests.set_limit(limit_requests)
+        if limit_tokens:
+            self.tokens.set_limit(limit_tokens)
+        if remaining_requests is not None:
+            self.requests.sync_remaining(remaining_requests, now)
+        if remaining_tokens is not None:
+            self.tokens.sync_remaining(remaining_tokens, now)
+        # Close to the request limit: shed concurrency before the server starts refusing
+        if limit_requests and remaining_requests is not None \
+                and remaining_requests < limit_requests * LOW_REMAINING_RATIO:
+            self.concurrency_limit = max(1.0, self.concurrency_limit * 0.75)
+
+    def backoff(self, response: httpx.Response, attempt: int) -> float:
+        """Record a 429, pause every caller and return the delay before retrying"""
+        with self._lock:
+            self.rate_limited_count += 1
+            # Multiplicative decrease of the in-flight cap
+            self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+            delay = _retry_after(response.headers)
+            if delay is None:
+                delay = parse_reset_duration(response.headers.get("x-ratelimit-reset-requests")) \
+                    if _header_int(response.headers, "x-ratelimit-remaining-requests") == 0 \
+                    else parse_reset_duration(response.headers.get("x-ratelimit-reset-tokens"))
+            if delay is None:
+                delay = self.base_delay * (2 ** attempt)
+            # Jitter spreads the retries so paused callers don't all fire at once
+            delay = min(self.max_delay, delay) + random.uniform(0, self.base_delay)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+                "in_flight": self.in_flight,
+                "concurrency_limit": int(self.concurrency_limit),
+                "rate_limited": self.rate_limited_count,
+            }
+
+
+def _no_sdk_retry(response: httpx.Response) -> httpx.Response:
+    """Tell the OpenAI SDK not to retry a 429 the limiter has already retried"""
+    response.headers["x-should-retry"] = "false"
+    return response
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees the request's in-flight slot once it is closed"""
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """Async response body that frees the request's in-flight slot once it is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Sync httpx transport that sends every request through a ``RateLimiter``"""
+
+    def __init__(self, limiter: RateLimiter, transport: Optional[httpx.BaseTransport] = None):
+        self.limiter = limiter
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_request_tokens(request)
+        for attempt in range(self.limiter.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                response = self.transport.handle_request(request)
+            except BaseException:
+                self.limiter.release(None)
+                raise
+            if response.status_code == 429 and attempt < self.limiter.max_retries:
+                self.limiter.release(response)
+                delay = self.limiter.backoff(response, attempt)
+                note_retry()
+                response.read()
+                response.close()
+                time.sleep(delay)
+                continue
+            response.stream = _ReleasingStream(response.stream, lambda: self.limiter.release(response))
+            return _no_sdk_retry(response) if response.status_code == 429 else response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async httpx transport that sends every request through a ``RateLimiter``"""
+
+    def __init__(self, limiter: RateLimiter, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 limits: Optional[httpx.Limits] = None):
+        self.limiter = limiter
+        self.transport = transport
+        self.limits = limits or httpx.Limits()
+        self._owns_transport = transport is None
+        # Pooled connections belong to the event loop that opened them, and each
+        # run_async_tasks call (from any session or background job) runs its own
+        # loop, so every loop gets its own pool, closed when the loop finishes
+        self._pools = weakref.WeakKeyDictionary()
+        self._pools_lock = threading.Lock()
+
+    async def _current_transport(self) -> httpx.AsyncBaseTransport:
+        if not self._owns_transport:
+            return self.transport
+        loop = asyncio.get_running_loop()
+        with self._pools_lock:
+            entry = self._pools.get(loop)
+            opened = entry is None
+            if opened:
+                pool = httpx.AsyncHTTPTransport(limits=self.limits)
+                entry = self._pools[loop] = (pool, self._close_at_loop_shutdown(loop, pool))
+        if opened:
+            await entry[1].__anext__()
+        return entry[0]
+
+    async def _close_at_loop_shutdown(self, loop, pool: httpx.AsyncBaseTransport):
+        """Async generator that closes ``pool`` when ``loop`` shuts down.
+
+        Started once on the pool's loop, it stays suspended until ``asyncio.run``
+        finalises the loop's async generators, while the loop can still run the close.
+        """
+        try:
+            yield
+        finally:
+            with self._pools_lock:
+                self._pools.pop(loop, None)
+            await pool.aclose()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_request_tokens(request)
+        transport = await self._current_transport()
+        for attempt in range(self.limiter.max_retries + 1):
+            await self.limiter.acquire_async(tokens)
+            try:
+                response = await transport.handle_async_request(request)
+            except BaseException:
+                self.limiter.release(None)
+                raise
+            if response.status_code == 429 and attempt < self.limiter.max_retries:
+                self.limiter.release(response)
+                delay = self.limiter.backoff(response, attempt)
+                note_retry()
+                await response.aread()
+                await response.aclose()
+                await asyncio.sleep(delay)
+                continue
+            response.stream = _AsyncReleasingStream(response.stream, lambda: self.limiter.release(response))
+            return _no_sdk_retry(response) if response.status_code == 429 else response
+
+    async def aclose(self) -> None:
+        if not self._owns_transport:
+            await self.transport.aclose()
+            return
+        with self._pools_lock:
+            entry = self._pools.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+
+def build_rate_limiter(config: dict) -> RateLimiter:
+    """Create the limiter described by the ``rate_limits`` config section"""
+    limits = config.get("rate_limits", {})
+    return RateLimiter(
+        requests_per_minute=limits.get("requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE),
+        tokens_per_minute=limits.get("tokens_per_minute", DEFAULT_TOKENS_PER_MINUTE),
+        max_in_flight=limits.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT),
+        max_retries=limits.get("max_retries", DEFAULT_MAX_RETRIES),
+    )
@@ -0,0 +1,144 @@
+"""Which tool run, and which model call, the current code is working for.
+
+``tool_run`` marks the model calls made inside a block as belonging to one
+run of a tool; it is opened when a tool is invoked, not on every page rerun.
+``tool_scope`` only names the tool for calls made outside a run, and
+``batch_rows`` records the batch size of the calls made inside it. The rate
+limiter and response cache report retries and cache hits against the call in
+progress, and the async engine reports its hedged requests against the run
+and marks their duplicates with ``hedge_attempt``. telemetry.py reads all of
+this when it records each call.
+
+This module imports nothing beyond the standard library, so that main.py and
+the background job strip can open tool runs without loading LangChain or
+pandas at startup.
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_run = ContextVar("telemetry_run", default=None)
+_current_tool = ContextVar("telemetry_tool", default=None)
+_current_call = ContextVar("telemetry_call", default=None)
+_batch_rows = ContextVar("telemetry_batch_rows", default=None)
+_hedge_attempt = ContextVar("telemetry_hedge_attempt", default=False)
+
+
+class ToolRun:
+    """Calls made while one tool runs"""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        # Set when the tool_run block exits, so later exports report the real run time
+        self.finished = None
+        self.records = []
+        self.hedging = {"fired": 0, "won": 0, "saved_seconds": 0.0, "extra_tokens": 0}
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def add_hedging(self, fired, won, saved_seconds=0.0):
+        with self._lock:
+            self.hedging["fired"] += fired
+            self.hedging["won"] += won
+            self.hedging["saved_seconds"] += saved_seconds
+
+    def add_hedge_tokens(self, tokens):
+        with self._lock:
+            self.hedging["extra_tokens"] += tokens
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.records)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+
+@contextmanager
+def tool_run(tool):
+    """Attribute the model calls made inside the block to ``tool``"""
+    run = ToolRun(tool)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        run.finished = time.perf_counter()
+        _current_run.reset(token)
+
+
+def current_run():
+    return _current_run.get()
+
+
+@contextmanager
+def tool_scope(tool):
+    """Attribute model calls made inside the block to ``tool`` without opening a tool run"""
+    token = _current_tool.set(tool)
+    try:
+        yield
+    finally:
+        _current_tool.reset(token)
+
+
+def current_tool():
+    """Tool of the open tool run, else the tool named by ``tool_scope``"""
+    run = _current_run.get()
+    return run.tool if run is not None else _current_tool.get()
+
+
+@contextmanager
+def batch_rows(rows):
+    """Record ``rows`` as the batch size of the model calls made inside the block"""
+    token = _batch_rows.set(rows)
+    try:
+        yield
+    finally:
+        _batch_rows.reset(token)
+
+
+@contextmanager
+def hedge_attempt():
+    """Mark the model calls made inside the block as a hedged duplicate, whose tokens are extra"""
+    token = _hedge_attempt.set(True)
+    try:
+        yield
+    finally:
+        _hedge_attempt.reset(token)
+
+
+def record_hedging(fired, won, saved_seconds=0.0):
+    """Add one run's hedged-request counters to the current tool run"""
+    run = _current_run.get()
+    if run is not None:
+        run.add_hedging(fired, won, saved_seconds)
+
+
+def hedging_summary(run):
+    """One-line description of the run's hedged requests, or None when none were sent"""
+    if run is None or not run.hedging["fired"]:
+        return None
+    hedging = run.hedging
+    return (f"Hedging: {hedging['fired']} slow requests duplicated, {hedging['won']} answered first by the "
+            f"duplicate, saving {hedging['saved_seconds']:.1f}s for {hedging['extra_tokens']:,} extra tokens")
+
+
+def note_retry():
+    """Count a rate-limit retry against the call in progress"""
+    call = _current_call.get()
+    if call is not None:
+        call["retries"] += 1
+
+
+def note_cache_hit():
+    """Mark the call in progress as answered from the local response cache"""
+    call = _current_call.get()
+    if call is not None:
+        call["cache_hit"] = True
@@ -0,0 +1,75 @@
+"""Streamed model output for the long single-shot generation tools.
+
+``stream_response`` sends the messages with ``model.stream`` and renders the
+text into a Streamlit placeholder as tokens arrive, so a 60-second answer is
+visible from its first second. Each completed line is also passed to an
+``on_line`` callback, letting a page parse rows (strategies, categories,
+mappings) and show them in its results table before generation finishes.
+"""
+import time
+
+import pandas as pd
+
+# Minimum gap between placeholder redraws; redrawing on every token is slower than the model
+RENDER_INTERVAL_SECONDS = 0.1
+
+
+class LineBuffer:
+    """Splits streamed chunks into complete lines"""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk):
+        """Complete lines contained in ``chunk`` plus any earlier partial line"""
+        self._pending += chunk
+        *lines, self._pending = self._pending.split("\n")
+        return lines
+
+    def flush(self):
+        """The trailing line once the stream has ended"""
+        line, self._pending = self._pending, ""
+        return [line] if line else []
+
+
+def stream_response(model, messages, placeholder=None, on_line=None):
+    """Stream the model's answer to ``messages`` and return the full text.
+
+    ``placeholder`` (e.g. ``st.empty()``) shows the text so far as Markdown;
+    ``on_line`` is called with each complete line as soon as it arrives.
+    """
+    parts = []
+    lines = LineBuffer()
+    last_render = 0.0
+    for chunk in model.stream(messages):
+        text = chunk.content if isinstance(chunk.content, str) else ""
+        if not text:
+            continue
+        parts.append(text)
+        if on_line is not None:
+            for line in lines.feed(text):
+                on_line(line)
+        if placeholder is not None and time.monotonic() - last_render >= RENDER_INTERVAL_SECONDS:
+            placeholder.markdown("".join(parts) + " ▌")
+            last_render = time.monotonic()
+
+    if on_line is not None:
+        for line in lines.flush():
+            on_line(line)
+    response = "".join(parts).strip()
+    if placeholder is not None:
+        placeholder.markdown(response)
+    return response
+
+
+class LiveTable:
+    """Rows collected while streaming, redrawn in a Streamlit placeholder as they are added"""
+
+    def __init__(self, placeholder, columns):
+        self.placeholder = placeholder
+        self.columns = list(columns)
+        self.rows = []
+
+    def add(self, row):
+        self.rows.append(row)
+        self.placeholder.dataframe(pd.DataFrame(self.rows, columns=self.columns), use_container_width=True)
@@ -0,0 +1,252 @@
+"""Token usage and per-call telemetry for model calls.
+
+``usage_tracker`` is registered as a callback on every chat model built by
+app_config, and adds up the usage metadata of each response: calls, input
+tokens, input tokens served from the provider's prompt cache
+(``cached_tokens``) and output tokens. Take a ``snapshot()`` before and after
+a run and ``usage_between`` gives that run's share, so a tool can confirm that
+its stable prompt prefix is being reused across batches.
+
+``call_telemetry`` records every call on its own: the tool it ran under (set
+with ``run_context.tool_run``), batch rows, tokens, latency, rate-limit
+retries, local response cache hits and estimated cost. Records are appended to
+``.cache/telemetry/llm_calls.jsonl``, and the calls of the current tool run
+are summarised, with the run's hedged requests, in the "Run Metrics" sheet of
+its Excel export.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from model_pricing import get_model_pricing
+from run_context import _batch_rows, _current_call, _current_run, _hedge_attempt, current_tool
+
+USAGE_FIELDS = ("calls", "input_tokens", "cached_tokens", "output_tokens")
+
+
+def message_usage(message) -> dict:
+    """Usage counts from one AI message's ``usage_metadata`` (zeros when absent)"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    return {
+        "calls": 1,
+        "input_tokens": int(usage.get("input_tokens") or 0),
+        "cached_tokens": int(details.get("cache_read") or 0),
+        "output_tokens": int(usage.get("output_tokens") or 0),
+    }
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Running token totals across all model calls in the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(USAGE_FIELDS, 0)
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None:
+                    self.record(message_usage(message))
+
+    def record(self, usage: dict) -> None:
+        with self._lock:
+            for field in USAGE_FIELDS:
+                self._totals[field] += usage.get(field, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._totals)
+
+
+def usage_between(before: dict, after: dict) -> dict:
+    """Usage recorded between two snapshots"""
+    return {field: after.get(field, 0) - before.get(field, 0) for field in USAGE_FIELDS}
+
+
+def cache_summary(usage: dict) -> str:
+    """One-line prompt cache report for a run"""
+    input_tokens = usage.get("input_tokens", 0)
+    cached_tokens = usage.get("cached_tokens", 0)
+    share = cached_tokens / input_tokens * 100 if input_tokens else 0.0
+    return (f"Prompt cache: {cached_tokens:,} of {input_tokens:,} input tokens served from cache "
+            f"({share:.0f}%) across {usage.get('calls', 0)} calls")
+
+
+usage_tracker = UsageTracker()
+
+
+TELEMETRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "telemetry", "llm_calls.jsonl")
+# Provider discount on input tokens served from its prompt cache
+CACHED_INPUT_PRICE_SHARE = 0.5
+RUN_METRICS_SHEET = "Run Metrics"
+
+_pricing = None
+
+
+def model_prices(model_name):
+    """Price per 1M input and output tokens from the pricing table, or None"""
+    global _pricing
+    if _pricing is None:
+        _pricing = get_model_pricing()
+    name = model_name or ""
+    if name in _pricing:
+        return _pricing[name]
+    # Dated snapshot of a listed model, or a listed snapshot of the configured alias
+    aliases = [key for key in _pricing if name.startswith(f"{key}-")]
+    if aliases:
+        return _pricing[max(aliases, key=len)]
+    snapshots = sorted(key for key in _pricing if key.startswith(f"{name}-"))
+    return _pricing[snapshots[-1]] if snapshots else None
+
+
+def estimate_cost(model_name, usage, cache_hit=False):
+    """Estimated USD cost of one call, or None for unpriced models"""
+    if cache_hit:
+        return 0.0
+    prices = model_prices(model_name)
+    if prices is None:
+        return None
+    uncached = usage["input_tokens"] - usage["cached_tokens"]
+    input_cost = (uncached + usage["cached_tokens"] * CACHED_INPUT_PRICE_SHARE) * prices["input"]
+    return (input_cost + usage["output_tokens"] * prices["output"]) / 1_000_000
+
+
+def call_record(run, tool, model, batch_rows, usage, latency_seconds, retries, cache_hit, cost_usd, error):
+    """One telemetry record, as written to the telemetry file and kept by the tool run"""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "run_id": run.run_id if run else None,
+        "tool": tool,
+        "model": model,
+        "batch_rows": batch_rows,
+        "input_tokens": usage["input_tokens"],
+        "cached_tokens": usage["cached_tokens"],
+        "output_tokens": usage["output_tokens"],
+        "latency_seconds": round(latency_seconds, 3),
+        "retries": retries,
+        "cache_hit": cache_hit,
+        "cost_usd": cost_usd,
+        "error": error,
+    }
+
+
+class CallTelemetry(BaseCallbackHandler):
+    """Records each model call to the telemetry file and the current tool run"""
+
+    # Run in the caller's context so the call state is visible to the transport and cache
+    run_inline = True
+
+    def __init__(self, path=TELEMETRY_PATH):
+        self.path = path
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        call = {
+            "started": time.perf_counter(),
+            "model": params.get("model_name") or params.get("model") or params.get("_type"),
+            "tool": current_tool(),
+            "run": _current_run.get(),
+            "batch_rows": _batch_rows.get(),
+            "retries": 0,
+            "cache_hit": False,
+            "hedge": _hedge_attempt.get(),
+        }
+        with self._lock:
+            self._calls[run_id] = call
+        _current_call.set(call)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = dict.fromkeys(USAGE_FIELDS, 0)
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None:
+                    for field, value in message_usage(message).items():
+                        usage[field] += value
+        self._finish(run_id, usage, error=None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, dict.fromkeys(USAGE_FIELDS, 0), error=f"{type(error).__name__}: {error}")
+
+    def _finish(self, run_id, usage, error):
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        if _current_call.get() is call:
+            # Retries and cache hits reported after this belong to no call
+            _current_call.set(None)
+        run = call["run"]
+        record = call_record(run, call["tool"], call["model"], call["batch_rows"], usage,
+                             time.perf_counter() - call["started"], call["retries"], call["cache_hit"],
+                             None if error else estimate_cost(call["model"], usage, call["cache_hit"]), error)
+        if run is not None:
+            run.add(record)
+            if call["hedge"]:
+                run.add_hedge_tokens(usage["input_tokens"] + usage["output_tokens"])
+        self._append(record)
+
+    def record_completed(self, model, usage, latency_seconds, cost_usd, error=None, append=True):
+        """Record a call answered outside LangChain, such as one request of a Batch API job.
+
+        With ``append=False`` the call is only added to the current tool run, for
+        calls already written to the telemetry file by an earlier process.
+        """
+        run = _current_run.get()
+        record = call_record(run, current_tool(), model, _batch_rows.get(), usage, latency_seconds, 0, False,
+                             cost_usd, error)
+        if run is not None:
+            run.add(record)
+        if append:
+            self._append(record)
+
+    def _append(self, record):
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass  # Telemetry must never break a tool run
+
+
+call_telemetry = CallTelemetry()
+
+
+def run_metrics(run):
+    """Summary of one tool run's model calls as a Metric / Value table"""
+    import pandas as pd
+
+    records = run.snapshot()
+    latencies = pd.Series([record["latency_seconds"] for record in records], dtype=float)
+    costs = [record["cost_usd"] for record in records if record["cost_usd"] is not None]
+    models = sorted({record["model"] for record in records if record["model"]})
+    metrics = [
+        ("Tool", run.tool),
+        ("Run ID", run.run_id),
+        ("Model", ", ".join(models)),
+        ("Model Calls", len(records)),
+        ("Failed Calls", sum(1 for record in records if record["error"])),
+        ("Local Cache Hits", sum(1 for record in records if record["cache_hit"])),
+        ("Rate-Limit Retries", sum(record["retries"] for record in records)),
+        ("Input Tokens", sum(record["input_tokens"] for record in records)),
+        ("Cached Input Tokens", sum(record["cached_tokens"] for record in records)),
+        ("Output Tokens", sum(record["output_tokens"] for record in records)),
+        ("Mean Call Latency (s)", round(latencies.mean(), 2) if len(latencies) else 0),
+        ("95th Percentile Call Latency (s)", round(latencies.quantile(0.95), 2) if len(latencies) else 0),
+        ("Run Time (s)", round(run.elapsed, 1)),
+        ("Estimated Cost (USD)", round(sum(costs), 4) if costs else "Unknown"),
+        ("Hedged Requests", run.hedging["fired"]),
+        ("Hedges Finished First", run.hedging["won"]),
+        ("Latency Saved by Hedges (s)", round(run.hedging["saved_seconds"], 1)),
+        ("Extra Tokens from Hedges", run.hedging["extra_tokens"]),
+    ]
+    return pd.DataFrame(metrics, columns=["Metric", "Value"])
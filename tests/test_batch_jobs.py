@@ -0,0 +1,28 @@
+import json
+
+import pandas as pd
+
+import batch_jobs
+from core.impact_estimation import run_impact_estimation
+from telemetry import call_telemetry
+
+
+def read_requests(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_first_round_submits_one_request_per_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(call_telemetry, "path", str(tmp_path / "llm_calls.jsonl"))
+    df = pd.DataFrame({"ID": [f"PP-{number}" for number in range(20)],
+                       "Desc": [f"Pain point {number} slows down month-end reporting" for number in range(20)]})
+
+    result = batch_jobs.run_batch_job(
+        "impact", lambda model: run_impact_estimation(model, df, "ID", ["Desc"], "", batch_size=5, max_workers=1),
+        batch_jobs.LocalBatchClient(str(tmp_path / "local")), "gpt-4o-mini", 0.0,
+        directory=str(tmp_path / "jobs"))
+
+    requests = read_requests(tmp_path / "jobs" / "impact" / "requests_1.jsonl")
+    assert len(requests) == 4
+    assert not any("Follow-up request" in request["body"]["messages"][0]["content"] for request in requests)
+    assert len(result) == 20
@@ -0,0 +1,254 @@
+"""Spreadsheet ingestion for uploads and the CLI, with parsed uploads cached by file content.
+
+Streamlit reruns the page script on every widget interaction, and parsing a
+large client workbook again each time makes every click slow. The pages read
+uploads through ``upload_sheet_names``, ``read_upload_sheet`` and
+``read_upload_csv`` instead of pandas directly. These hash the file's bytes
+and keep the sheet list and each parsed sheet in a process-wide cache,
+evicting the least recently used DataFrames once they exceed ``max_mb`` from
+the ``upload_cache`` section of model_config.json. The same file uploaded
+again, in any session, is parsed once.
+
+The tools only use an ID column and a few description columns, so large
+registers are read in two steps: ``upload_sheet_columns`` (or
+``sheet_columns`` for a file path) reads just the header row, and
+``read_upload_columns`` (or ``read_columns``) loads only the selected
+columns. Each column is cached on its own, so changing the selection reads
+only the newly chosen columns. ``read_upload_text_columns`` and
+``read_upload_text_preview`` return the same as text, as the batch tool pages
+display them. Excel files are read with the Rust-based
+calamine engine when python-calamine is installed, and with pandas' default
+reader (openpyxl for .xlsx) otherwise.
+"""
+import hashlib
+import importlib.util
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from app_config import load_config
+
+DEFAULT_MAX_MB = 256
+# Uploads whose content hash is remembered by Streamlit file ID, so reruns skip rehashing
+MAX_REMEMBERED_DIGESTS = 256
+
+
+def excel_engine():
+    """pandas Excel engine: calamine when installed, else None for pandas' default"""
+    return "calamine" if importlib.util.find_spec("python_calamine") is not None else None
+
+
+def _is_csv(name):
+    return os.path.splitext(str(name or ""))[1].lower() == ".csv"
+
+
+def _read_excel(source, sheet_name=0, **kwargs):
+    return pd.read_excel(source, sheet_name=sheet_name, engine=excel_engine(), **kwargs)
+
+
+def _pruned_read(read, headers, columns):
+    """Only ``columns`` of a table with header row ``headers``, in the order given.
+
+    Columns are selected by position so that duplicate headers, which pandas
+    renames ``Name.1`` and so on, still resolve to the right column.
+    """
+    missing = [column for column in columns if column not in headers]
+    if missing:
+        raise KeyError(f"Column(s) not found: {', '.join(str(column) for column in missing)}")
+    positions = sorted({headers.index(column) for column in columns})
+    df = read(usecols=positions)
+    df.columns = [headers[position] for position in positions]
+    return df[list(dict.fromkeys(columns))]
+
+
+def sheet_columns(path, sheet_name=0):
+    """Header row of a CSV file or Excel sheet on disk"""
+    if _is_csv(path):
+        return list(pd.read_csv(path, nrows=0).columns)
+    return list(_read_excel(path, sheet_name, nrows=0).columns)
+
+
+def read_columns(path, sheet_name=0, columns=None, headers=None):
+    """A CSV file or Excel sheet on disk, loading only ``columns`` (all when None).
+
+    Pass ``headers`` from ``sheet_columns`` when already read, to skip reading the header row again.
+    """
+    if _is_csv(path):
+        read = lambda **kwargs: pd.read_csv(path, **kwargs)
+    else:
+        read = lambda **kwargs: _read_excel(path, sheet_name, **kwargs)
+    if columns is None:
+        return read()
+    return _pruned_read(read, headers or sheet_columns(path, sheet_name), columns)
+
+
+def load_max_bytes():
+    """Memory the upload cache may hold, in bytes"""
+    try:
+        max_mb = float(load_config().get("upload_cache", {}).get("max_mb", DEFAULT_MAX_MB))
+    except (TypeError, ValueError):
+        max_mb = DEFAULT_MAX_MB
+    return max(0, int(max_mb * 1024 * 1024))
+
+
+def _size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    return 0
+
+
+class UploadCache:
+    """Least-recently-used cache of parsed uploads, bounded by their memory size"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = load_max_bytes() if max_bytes is None else max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, uploaded_file):
+        """Content hash of an uploaded file"""
+        file_id = getattr(uploaded_file, "file_id", None)
+        with self._lock:
+            if file_id is not None and file_id in self._digests:
+                self._digests.move_to_end(file_id)
+                return self._digests[file_id]
+        digest = hashlib.blake2b(uploaded_file.getvalue(), digest_size=20).hexdigest()
+        if file_id is not None:
+            with self._lock:
+                self._digests[file_id] = digest
+                while len(self._digests) > MAX_REMEMBERED_DIGESTS:
+                    self._digests.popitem(last=False)
+        return digest
+
+    def peek(self, key):
+        """Cached value for ``key`` without parsing, or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+        return None
+
+    def get_or_parse(self, key, parse):
+        """Cached value for ``key``, calling ``parse()`` on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = parse()
+        size = _size(value)
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "size_bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+upload_cache = UploadCache()
+
+
+def upload_sheet_names(uploaded_file):
+    """Sheet names of an uploaded Excel workbook"""
+    key = (upload_cache.digest(uploaded_file), "sheets")
+    names = upload_cache.get_or_parse(
+        key, lambda: pd.ExcelFile(io.BytesIO(uploaded_file.getvalue()), engine=excel_engine()).sheet_names)
+    return list(names)
+
+
+def _upload_reader(uploaded_file, sheet_name):
+    if _is_csv(getattr(uploaded_file, "name", None)):
+        return lambda **kwargs: pd.read_csv(io.BytesIO(uploaded_file.getvalue()), **kwargs)
+    return lambda **kwargs: _read_excel(io.BytesIO(uploaded_file.getvalue()), sheet_name, **kwargs)
+
+
+def read_upload_sheet(uploaded_file, sheet_name=0):
+    """One sheet of an uploaded Excel workbook; a copy the caller may modify"""
+    key = (upload_cache.digest(uploaded_file), "sheet", sheet_name)
+    df = upload_cache.get_or_parse(key, _upload_reader(uploaded_file, sheet_name))
+    return df.copy()
+
+
+def upload_sheet_columns(uploaded_file, sheet_name=0):
+    """Header row of an uploaded CSV file or Excel sheet, read without loading the rows"""
+    key = (upload_cache.digest(uploaded_file), "columns", sheet_name)
+    return list(upload_cache.get_or_parse(key, lambda: list(_upload_reader(uploaded_file, sheet_name)(nrows=0).columns)))
+
+
+def read_upload_preview(uploaded_file, sheet_name=0, rows=10):
+    """First ``rows`` rows of an uploaded CSV file or Excel sheet"""
+    key = (upload_cache.digest(uploaded_file), "preview", sheet_name, rows)
+    return upload_cache.get_or_parse(key, lambda: _upload_reader(uploaded_file, sheet_name)(nrows=rows)).copy()
+
+
+def read_upload_columns(uploaded_file, sheet_name, columns):
+    """Only ``columns`` of an uploaded CSV file or Excel sheet; a copy the caller may modify.
+
+    Columns already loaded for an earlier selection come from the cache and
+    only the rest are read from the file.
+    """
+    digest = upload_cache.digest(uploaded_file)
+    columns = list(dict.fromkeys(columns))
+    full_df = upload_cache.peek((digest, "sheet", sheet_name))
+    if full_df is not None:
+        return full_df[columns].copy()
+
+    cached = {column: upload_cache.peek((digest, "column", sheet_name, column)) for column in columns}
+    missing = [column for column, series in cached.items() if series is None]
+    if missing:
+        read_df = _pruned_read(_upload_reader(uploaded_file, sheet_name),
+                               upload_sheet_columns(uploaded_file, sheet_name), missing)
+        for column in missing:
+            cached[column] = upload_cache.get_or_parse((digest, "column", sheet_name, column),
+                                                       lambda column=column: read_df[column])
+    lengths = {len(series) for series in cached.values()}
+    if len(lengths) > 1:
+        # Evicted and re-read columns disagree on length; read the selection together
+        return _pruned_read(_upload_reader(uploaded_file, sheet_name),
+                            upload_sheet_columns(uploaded_file, sheet_name), columns)
+    return pd.concat([cached[column] for column in columns], axis=1).copy()
+
+
+def read_upload_text_columns(uploaded_file, sheet_name, columns):
+    """``read_upload_columns`` with every value as text and blanks as missing, ready for ``st.dataframe``"""
+    df = read_upload_columns(uploaded_file, sheet_name, columns)
+    # Clean the dataframe to avoid PyArrow conversion issues
+    for col in df.columns:
+        df[col] = df[col].astype(str)
+    return df.replace('nan', pd.NA)
+
+
+def read_upload_text_preview(uploaded_file, sheet_name=0, rows=10):
+    """``read_upload_preview`` with every value as text and blanks as empty strings, for display"""
+    preview_df = read_upload_preview(uploaded_file, sheet_name, rows)
+    for col in preview_df.columns:
+        preview_df[col] = preview_df[col].astype(str)
+    return preview_df.replace('nan', '').replace('<NA>', '')
+
+
+def read_upload_csv(uploaded_file):
+    """An uploaded CSV file; a copy the caller may modify"""
+    key = (upload_cache.digest(uploaded_file), "csv")
+    df = upload_cache.get_or_parse(key, lambda: pd.read_csv(io.BytesIO(uploaded_file.getvalue())))
+    return df.copy()